@@ -0,0 +1,123 @@
+# analysis_cache.py
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+
+def content_digest(contents):
+    """Key an upload by the SHA-256 of its raw bytes."""
+    return hashlib.sha256(contents).hexdigest()
+
+
+def estimate_entry_size(df, charts, profile=None, predictions=None):
+    """
+    Rough resident size of a cached analysis, in bytes.
+
+    Kept cheap because it runs on every put: the frame is measured without
+    ``deep`` (object columns count their pointers, not their strings) and the
+    report by its predictions alone, eight bytes each.
+    """
+    size = int(df.memory_usage(index=True).sum()) if df is not None else 0
+    if predictions is not None:
+        size += len(predictions) * 8
+    if charts is not None:
+        size += sum(len(chart) for chart in charts.values())
+    if profile is not None:
+        size += sum(int(column.value_counts.memory_usage()) for column in profile if column.value_counts is not None)
+    return size
+
+
+class CacheEntry:
+    def __init__(self, digest, df, report, charts, size, timings=None, profile=None, predictions=None):
+        self.digest = digest
+        self.df = df
+        self.report = report
+        self.predictions = predictions  # report["prediction"] as a float64 array, sliced by /predictions
+        self.charts = charts  # None until full Plotly figures are requested
+        self.size = size
+        self.timings = timings or {}
+        self.profile = profile
+        self.created_at = time.monotonic()
+        self.cached = False  # whether /charts and /predictions can find it by digest
+
+
+class AnalysisCache:
+    """
+    LRU cache of analysed uploads keyed by content digest.
+
+    Entries are evicted when they are older than ``ttl_seconds``, when more than
+    ``max_entries`` are held, or when the summed entry size exceeds ``max_bytes``.
+    Cached DataFrames are shared between requests and must be treated as read-only.
+    """
+
+    def __init__(self, max_entries=32, ttl_seconds=900, max_bytes=512 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _expired(self, entry):
+        return self.ttl_seconds is not None and time.monotonic() - entry.created_at > self.ttl_seconds
+
+    def _drop(self, digest):
+        entry = self._entries.pop(digest)
+        entry.cached = False
+        self._bytes -= entry.size
+        self.evictions += 1
+
+    def get(self, digest):
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is not None and self._expired(entry):
+                self._drop(digest)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(digest)
+            self.hits += 1
+            return entry
+
+    def put(self, digest, df, report, charts, timings=None, profile=None, predictions=None):
+        size = estimate_entry_size(df, charts, profile, predictions)
+        entry = CacheEntry(digest, df, report, charts, size, timings, profile, predictions)
+        with self._lock:
+            if digest in self._entries:
+                self._bytes -= self._entries.pop(digest).size
+            if entry.size > self.max_bytes:
+                # Too big to ever fit; serve it uncached (``cached`` stays False) rather than flushing everything else.
+                return entry
+            entry.cached = True
+            self._entries[digest] = entry
+            self._bytes += entry.size
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                self._drop(next(iter(self._entries)))
+            return entry
+
+    def clear(self):
+        with self._lock:
+            for entry in self._entries.values():
+                entry.cached = False
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
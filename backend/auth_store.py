@@ -0,0 +1,292 @@
+# auth_store.py
+import asyncio
+import hashlib
+import os
+import queue
+import secrets
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import bcrypt
+
+from workers import WorkerPoolFull
+
+AUTH_DIR = os.path.dirname(os.path.abspath(__file__))
+# "sqlite" shares users between uvicorn workers; "memory" keeps them in this process only
+AUTH_STORE = os.getenv("AUTH_STORE", "sqlite")
+AUTH_DB_PATH = os.getenv("AUTH_DB_PATH", "users.db")
+AUTH_DB_POOL_SIZE = int(os.getenv("AUTH_DB_POOL_SIZE", "4"))
+AUTH_BCRYPT_ROUNDS = int(os.getenv("AUTH_BCRYPT_ROUNDS", "12"))
+# Threads reserved for bcrypt, apart from the server's thread pool, and how many more calls may wait
+AUTH_HASH_WORKERS = int(os.getenv("AUTH_HASH_WORKERS", "2"))
+AUTH_HASH_MAX_PENDING = int(os.getenv("AUTH_HASH_MAX_PENDING", "32"))
+AUTH_TOKEN_TTL_SECONDS = float(os.getenv("AUTH_TOKEN_TTL_SECONDS", "3600"))
+# How long a verified token is trusted from memory before the store is asked again
+AUTH_TOKEN_CACHE_SECONDS = float(os.getenv("AUTH_TOKEN_CACHE_SECONDS", "60"))
+AUTH_TOKEN_CACHE_MAX_ENTRIES = int(os.getenv("AUTH_TOKEN_CACHE_MAX_ENTRIES", "10000"))
+# bcrypt ignores (bcrypt 5 rejects) anything past 72 bytes
+MAX_PASSWORD_BYTES = 72
+
+
+def token_digest(token):
+    """Tokens are stored and cached by digest only, so a leaked table holds nothing replayable."""
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+class MemoryUserStore:
+    """Users and session tokens in this process; for tests and single-worker development."""
+
+    def __init__(self):
+        self._users = {}
+        self._tokens = {}
+        self._lock = threading.Lock()
+
+    def get_password_hash(self, username):
+        with self._lock:
+            return self._users.get(username)
+
+    def create_user(self, username, password_hash):
+        """False when the username is taken."""
+        with self._lock:
+            if username in self._users:
+                return False
+            self._users[username] = password_hash
+            return True
+
+    def save_token(self, digest, username, expires_at):
+        with self._lock:
+            self._tokens[digest] = (username, expires_at)
+
+    def get_token(self, digest):
+        """``(username, expires_at)`` or None."""
+        with self._lock:
+            return self._tokens.get(digest)
+
+    def delete_token(self, digest):
+        with self._lock:
+            self._tokens.pop(digest, None)
+
+    def close(self):
+        pass
+
+
+class SQLiteUserStore:
+    """
+    Users and session tokens in one SQLite file shared by every worker process.
+
+    Connections come from a fixed pool opened on first use; WAL mode lets
+    readers proceed while a registration commits.
+    """
+
+    def __init__(self, path=AUTH_DB_PATH, pool_size=AUTH_DB_POOL_SIZE):
+        self.path = path if path == ":memory:" or os.path.isabs(path) else os.path.join(AUTH_DIR, path)
+        self.pool_size = pool_size
+        self._pool = None
+        self._connections = []
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        connection = sqlite3.connect(self.path, timeout=10, check_same_thread=False, isolation_level=None)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    def _get_pool(self):
+        with self._lock:
+            if self._pool is None:
+                connections = [self._connect() for _ in range(self.pool_size)]
+                connections[0].executescript("""
+                    CREATE TABLE IF NOT EXISTS users (
+                        username TEXT PRIMARY KEY,
+                        password_hash TEXT NOT NULL,
+                        created_at REAL NOT NULL
+                    );
+                    CREATE TABLE IF NOT EXISTS session_tokens (
+                        digest TEXT PRIMARY KEY,
+                        username TEXT NOT NULL,
+                        expires_at REAL NOT NULL
+                    );
+                """)
+                self._pool = queue.Queue()
+                for connection in connections:
+                    self._pool.put(connection)
+                self._connections = connections
+            return self._pool
+
+    @contextmanager
+    def connection(self):
+        pool = self._get_pool()
+        connection = pool.get()
+        try:
+            yield connection
+        finally:
+            pool.put(connection)
+
+    def get_password_hash(self, username):
+        with self.connection() as connection:
+            row = connection.execute("SELECT password_hash FROM users WHERE username = ?", (username,)).fetchone()
+        return row[0] if row else None
+
+    def create_user(self, username, password_hash):
+        """False when the username is taken."""
+        try:
+            with self.connection() as connection:
+                connection.execute("INSERT INTO users (username, password_hash, created_at) VALUES (?, ?, ?)",
+                                   (username, password_hash, time.time()))
+            return True
+        except sqlite3.IntegrityError:
+            return False
+
+    def save_token(self, digest, username, expires_at):
+        with self.connection() as connection:
+            connection.execute("DELETE FROM session_tokens WHERE expires_at < ?", (time.time(),))
+            connection.execute("INSERT INTO session_tokens (digest, username, expires_at) VALUES (?, ?, ?)",
+                               (digest, username, expires_at))
+
+    def get_token(self, digest):
+        """``(username, expires_at)`` or None."""
+        with self.connection() as connection:
+            row = connection.execute("SELECT username, expires_at FROM session_tokens WHERE digest = ?",
+                                     (digest,)).fetchone()
+        return tuple(row) if row else None
+
+    def delete_token(self, digest):
+        with self.connection() as connection:
+            connection.execute("DELETE FROM session_tokens WHERE digest = ?", (digest,))
+
+    def close(self):
+        with self._lock:
+            connections, self._connections, self._pool = self._connections, [], None
+        for connection in connections:
+            connection.close()
+
+
+def store_from_env():
+    if AUTH_STORE == "memory":
+        return MemoryUserStore()
+    if AUTH_STORE == "sqlite":
+        return SQLiteUserStore()
+    raise ValueError(f"AUTH_STORE must be sqlite or memory, not {AUTH_STORE!r}")
+
+
+class PasswordHasher:
+    """
+    bcrypt on a small dedicated thread pool, so a burst of logins neither
+    blocks the event loop nor starves the threads other handlers run on.
+    Calls beyond ``max_pending`` waiting raise ``WorkerPoolFull``.
+    """
+
+    def __init__(self, max_workers=AUTH_HASH_WORKERS, max_pending=AUTH_HASH_MAX_PENDING, rounds=AUTH_BCRYPT_ROUNDS,
+                 retry_after=1):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.rounds = rounds
+        self.retry_after = retry_after
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="bcrypt")
+        self._lock = threading.Lock()
+        self._active = 0
+
+    async def _run(self, fn, *args):
+        with self._lock:
+            if self._active >= self.max_workers + self.max_pending:
+                raise WorkerPoolFull(self.retry_after)
+            self._active += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+        finally:
+            with self._lock:
+                self._active -= 1
+
+    def _hash(self, password):
+        return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt(self.rounds)).decode("ascii")
+
+    @staticmethod
+    def _verify(password, password_hash):
+        try:
+            return bcrypt.checkpw(password.encode("utf-8"), password_hash.encode("ascii"))
+        except ValueError:
+            return False  # malformed stored hash or over-long password
+
+    async def hash(self, password):
+        return await self._run(self._hash, password)
+
+    async def verify(self, password, password_hash):
+        return await self._run(self._verify, password, password_hash)
+
+    def stats(self):
+        with self._lock:
+            return {"max_workers": self.max_workers, "max_pending": self.max_pending, "in_flight": self._active,
+                    "rounds": self.rounds}
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+class SessionTokens:
+    """
+    Opaque bearer tokens issued at login and persisted in the user store.
+
+    Verified tokens are remembered in an in-process LRU for ``cache_seconds``
+    (never past their expiry), so authenticated calls cost a dict lookup
+    rather than a store query, and never a bcrypt check.
+    """
+
+    def __init__(self, store, ttl_seconds=AUTH_TOKEN_TTL_SECONDS, cache_seconds=AUTH_TOKEN_CACHE_SECONDS,
+                 max_entries=AUTH_TOKEN_CACHE_MAX_ENTRIES):
+        self.store = store
+        self.ttl_seconds = ttl_seconds
+        self.cache_seconds = cache_seconds
+        self.max_entries = max_entries
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _remember(self, digest, username, expires_at):
+        with self._lock:
+            self._cache[digest] = (username, min(expires_at, time.time() + self.cache_seconds))
+            self._cache.move_to_end(digest)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+
+    def issue(self, username):
+        token = secrets.token_urlsafe(32)
+        digest = token_digest(token)
+        expires_at = time.time() + self.ttl_seconds
+        self.store.save_token(digest, username, expires_at)
+        self._remember(digest, username, expires_at)
+        return token
+
+    def resolve(self, token):
+        """Username for a live token, or None."""
+        digest = token_digest(token)
+        now = time.time()
+        with self._lock:
+            cached = self._cache.get(digest)
+            if cached is not None and cached[1] > now:
+                self._cache.move_to_end(digest)
+                self.hits += 1
+                return cached[0]
+            self._cache.pop(digest, None)
+            self.misses += 1
+        stored = self.store.get_token(digest)
+        if stored is None or stored[1] <= now:
+            return None
+        self._remember(digest, *stored)
+        return stored[0]
+
+    def revoke(self, token):
+        """Logout. Other workers may honour the token until their cached copy lapses (``cache_seconds``)."""
+        digest = token_digest(token)
+        with self._lock:
+            self._cache.pop(digest, None)
+        self.store.delete_token(digest)
+
+    def stats(self):
+        with self._lock:
+            return {"cached": len(self._cache), "hits": self.hits, "misses": self.misses,
+                    "ttl_seconds": self.ttl_seconds, "cache_seconds": self.cache_seconds}
@@ -0,0 +1,234 @@
+# batch.py
+import io
+import math
+import os
+import posixpath
+import tempfile
+import zipfile
+from dataclasses import dataclass
+
+import pandas as pd
+
+from ingest import detect_format, read_upload
+from sketches import Moments
+
+# Members analysed per batch upload; larger archives are rejected up front
+BATCH_MAX_MEMBERS = int(os.getenv("BATCH_MAX_MEMBERS", "64"))
+# Uncompressed size allowed per archive member, and for all members together, checked before anything is extracted
+BATCH_MAX_MEMBER_BYTES = int(os.getenv("BATCH_MAX_MEMBER_MB", "256")) * 1024 * 1024
+BATCH_MAX_TOTAL_BYTES = int(os.getenv("BATCH_MAX_TOTAL_MB", "1024")) * 1024 * 1024
+# Batch uploads are written here once, so workers are sent a file path and member name instead of the upload
+BATCH_DIR = os.getenv("BATCH_DIR", os.path.join(tempfile.gettempdir(), "marketpulse_batches"))
+
+_MEMBER_EXTENSIONS = (".csv", ".txt", ".parquet", ".arrow", ".feather", ".xlsx", ".xls")
+
+
+class BatchError(ValueError):
+    """The upload cannot be split into members (not an archive or workbook, too many members, too large)."""
+
+
+@dataclass
+class BatchMember:
+    """
+    One unit of batch work: an archive file, or one sheet of a workbook (``sheet`` set).
+
+    ``source`` is the upload as written to disk by ``split_batch`` and ``path``
+    the member inside it when the upload is an archive. A member pickles to a
+    few names, and only ``read`` (in the analysis worker) extracts its data, so
+    the API process never holds every member decompressed at once.
+    """
+
+    name: str
+    source: str
+    sheet: str = None
+    path: str = None
+
+    def data(self):
+        if self.path is None:
+            with open(self.source, "rb") as handle:
+                return handle.read()
+        with zipfile.ZipFile(self.source) as archive:
+            return archive.read(self.path)
+
+    def read(self):
+        data = self.data()
+        if self.sheet is not None:
+            return pd.read_excel(io.BytesIO(data), sheet_name=self.sheet)
+        return read_upload(data)
+
+
+def is_workbook(contents):
+    """xlsx files are zip archives too; tell them apart by the workbook part."""
+    try:
+        with zipfile.ZipFile(io.BytesIO(contents)) as archive:
+            return "xl/workbook.xml" in archive.namelist()
+    except zipfile.BadZipFile:
+        return False
+
+
+def _sheet_members(name, workbook, source, path=None):
+    """One member per sheet; sheets of a workbook inside an archive re-extract it from ``source`` when read."""
+    sheets = pd.ExcelFile(io.BytesIO(workbook)).sheet_names
+    if len(sheets) == 1:
+        return [BatchMember(name or sheets[0], source, path=path)]
+    return [BatchMember(f"{name}:{sheet}" if name else sheet, source, sheet=sheet, path=path) for sheet in sheets]
+
+
+def _data_files(archive):
+    for info in archive.infolist():
+        base = posixpath.basename(info.filename)
+        if info.is_dir() or info.filename.startswith("__MACOSX/") or base.startswith("."):
+            continue
+        if base.lower().endswith(_MEMBER_EXTENSIONS):
+            yield info
+
+
+def _check_archive(contents, max_members, max_member_bytes, max_total_bytes):
+    """Every limit is checked against the central directory before a byte is decompressed."""
+    with zipfile.ZipFile(io.BytesIO(contents)) as archive:
+        infos = list(_data_files(archive))
+    if len(infos) > max_members:
+        raise BatchError(f"The upload has {len(infos)} members; at most {max_members} are analysed per batch")
+    for info in infos:
+        if info.file_size > max_member_bytes:
+            raise BatchError(f"{info.filename} is {info.file_size} bytes uncompressed; "
+                             f"the limit is {max_member_bytes}")
+    total = sum(info.file_size for info in infos)
+    if total > max_total_bytes:
+        raise BatchError(f"The members are {total} bytes uncompressed together; the limit is {max_total_bytes}")
+
+
+def _archive_members(contents, source):
+    members = []
+    with zipfile.ZipFile(io.BytesIO(contents)) as archive:
+        for info in _data_files(archive):
+            with archive.open(info) as handle:
+                head = handle.read(8)
+            if detect_format(head) == "xlsx":
+                # Only a nested workbook is extracted here, to list its sheets; it is not kept
+                data = archive.read(info)
+                if is_workbook(data):
+                    members.extend(_sheet_members(info.filename, data, source, info.filename))
+                    continue
+            members.append(BatchMember(info.filename, source, path=info.filename))
+    return members
+
+
+def _spill(contents, directory):
+    os.makedirs(directory, exist_ok=True)
+    handle, path = tempfile.mkstemp(prefix="batch-", dir=directory)
+    with os.fdopen(handle, "wb") as file:
+        file.write(contents)
+    return path
+
+
+def split_batch(contents, max_members=BATCH_MAX_MEMBERS, max_member_bytes=BATCH_MAX_MEMBER_BYTES,
+                max_total_bytes=BATCH_MAX_TOTAL_BYTES, directory=None):
+    """
+    Members of a batch upload: every data file in a zip archive (workbooks
+    inside it expand to one member per sheet), or every sheet of a workbook.
+
+    The upload is written once to a file in ``directory`` (BATCH_DIR by
+    default) that the members read from; pass them to ``discard_batch`` when
+    the batch is done.
+    """
+    fmt = detect_format(contents[:8])
+    if fmt not in ("xlsx", "xls"):
+        raise BatchError("Batch uploads must be a zip archive or an Excel workbook")
+    try:
+        workbook = fmt == "xls" or is_workbook(contents)
+        if not workbook:
+            _check_archive(contents, max_members, max_member_bytes, max_total_bytes)
+        source = _spill(contents, directory or BATCH_DIR)
+        try:
+            members = _sheet_members("", contents, source) if workbook else _archive_members(contents, source)
+            if not members:
+                raise BatchError("The upload contains no CSV, Parquet, Arrow or Excel data")
+            if len(members) > max_members:
+                raise BatchError(f"The upload has {len(members)} members; at most {max_members} are analysed per batch")
+        except BaseException:
+            os.remove(source)
+            raise
+    except (zipfile.BadZipFile, ImportError) as e:
+        raise BatchError(f"Unreadable archive: {e}") from e
+    return members
+
+
+def discard_batch(members):
+    """Remove the file ``split_batch`` wrote for these members."""
+    for source in {member.source for member in members}:
+        try:
+            os.remove(source)
+        except FileNotFoundError:
+            pass
+
+
+def member_stats(profile):
+    """The per-column figures ``combine_member_stats`` needs, small enough to send back from a worker."""
+    columns = {}
+    for column in profile:
+        stats = {"kind": column.kind, "count": column.count, "null_count": column.null_count,
+                 "nunique": column.nunique}
+        if column.is_numeric:
+            stats.update(mean=column.mean, std=column.std, min=column.minimum, max=column.maximum)
+        columns[column.name] = stats
+    return {"rows": profile.n_rows, "columns": columns}
+
+
+def _moments(stats):
+    moments = Moments()
+    if stats["count"]:
+        moments.count = stats["count"]
+        moments.mean = stats["mean"]
+        moments.m2 = 0.0 if math.isnan(stats["std"]) else stats["std"] ** 2 * (stats["count"] - 1)
+        moments.minimum, moments.maximum = stats["min"], stats["max"]
+    return moments
+
+
+def _finite(value):
+    return None if value is None or math.isnan(value) or math.isinf(value) else value
+
+
+def combine_member_stats(results):
+    """
+    Cross-file summary from ``{member: member_stats(...)}``.
+
+    Numeric columns get the pooled mean, std, min and max over every member
+    that has them (exact, merged from each member's moments) plus each
+    member's own mean; categorical columns get the largest per-member distinct
+    count, a lower bound on the combined one.
+    """
+    total_rows = sum(stats["rows"] for stats in results.values())
+    names = []
+    for stats in results.values():
+        names.extend(name for name in stats["columns"] if name not in names)
+    common = [name for name in names if all(name in stats["columns"] for stats in results.values())]
+    numeric, categorical = {}, {}
+    for name in names:
+        present = {member: stats["columns"][name] for member, stats in results.items() if name in stats["columns"]}
+        if all(column["kind"] == "numeric" for column in present.values()):
+            pooled = Moments()
+            for column in present.values():
+                pooled.merge(_moments(column))
+            numeric[name] = {
+                "count": pooled.count,
+                "mean": _finite(pooled.mean) if pooled.count else None,
+                "std": _finite(pooled.std),
+                "min": _finite(pooled.minimum),
+                "max": _finite(pooled.maximum),
+                "by_member": {member: _finite(column["mean"]) for member, column in present.items()},
+            }
+        else:
+            categorical[name] = {
+                "count": sum(column["count"] for column in present.values()),
+                "nunique_at_least": max(column["nunique"] for column in present.values()),
+                "by_member": {member: column["nunique"] for member, column in present.items()},
+            }
+    return {
+        "members": len(results),
+        "total_rows": total_rows,
+        "rows_by_member": {member: stats["rows"] for member, stats in results.items()},
+        "common_columns": common,
+        "numeric": numeric,
+        "categorical": categorical,
+    }
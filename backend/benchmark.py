@@ -0,0 +1,260 @@
+# benchmark.py
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BASELINE_FILE = "benchmark_baseline.json"
+# A stage only counts as a regression when it is both this much slower and ...
+REGRESSION_TOLERANCE = float(os.getenv("BENCHMARK_TOLERANCE", "0.25"))
+# ... at least this many milliseconds slower, so timer noise on tiny stages is ignored
+REGRESSION_FLOOR_MS = float(os.getenv("BENCHMARK_FLOOR_MS", "5"))
+
+# Consumer-behaviour columns in the order the bundled model expects them
+NUMERIC_SCHEMA = [
+    ("Age", "int", 18, 70),
+    ("Frequency_of_Purchase", "int", 1, 15),
+    ("Brand_Loyalty", "int", 1, 5),
+    ("Product_Rating", "int", 1, 5),
+    ("Time_Spent_on_Product_Research(hours)", "float", 0, 2),
+    ("Return_Rate", "int", 0, 2),
+    ("Customer_Satisfaction", "int", 1, 10),
+    ("Time_to_Decision", "int", 1, 14),
+    ("Price_per_Hour", "lognormal", 3.0, 1.0),
+    ("Research_Effectiveness", "float", 0, 6),
+    ("Purchase_Amount", "lognormal", 4.0, 0.8),
+]
+CATEGORICAL_SCHEMA = [
+    "Gender", "Income_Level", "Marital_Status", "Education_Level", "Occupation", "Location",
+    "Purchase_Category", "Purchase_Channel", "Social_Media_Influence", "Discount_Sensitivity",
+    "Engagement_with_Ads", "Device_Used_for_Shopping", "Payment_Method", "Time_of_Purchase",
+    "Purchase_Intent", "Shipping_Preference",
+]
+
+
+def resolve_baseline_path(path=None):
+    path = path or os.getenv("BENCHMARK_BASELINE", DEFAULT_BASELINE_FILE)
+    return path if os.path.isabs(path) else os.path.join(BENCHMARK_DIR, path)
+
+
+def generate_dataset(rows=10_000, numeric_columns=8, categorical_columns=8, null_rate=0.05, cardinality=20,
+                     seed=0):
+    """
+    Seeded synthetic consumer-behaviour dataset.
+
+    Columns are taken from the consumer schema first and padded with generic
+    ``Numeric_<i>`` / ``Category_<i>`` columns. Category frequencies follow a
+    Zipf-like curve over ``cardinality`` levels, and every column except
+    ``companyName`` gets ``null_rate`` of its values blanked.
+    """
+    rng = np.random.default_rng(seed)
+    columns = {"companyName": pd.Categorical.from_codes(np.zeros(rows, dtype=np.int8), ["BenchCo"])}
+    for i in range(numeric_columns):
+        name, kind, a, b = NUMERIC_SCHEMA[i] if i < len(NUMERIC_SCHEMA) else (f"Numeric_{i}", "float", 0, 100)
+        if kind == "int":
+            values = rng.integers(a, b + 1, size=rows).astype(np.float64)
+        elif kind == "lognormal":
+            values = np.round(rng.lognormal(a, b, size=rows), 2)
+        else:
+            values = np.round(rng.uniform(a, b, size=rows), 3)
+        if null_rate:
+            values[rng.random(rows) < null_rate] = np.nan
+        columns[name] = values
+    weights = 1.0 / np.arange(1, cardinality + 1)
+    weights /= weights.sum()
+    for i in range(categorical_columns):
+        name = CATEGORICAL_SCHEMA[i] if i < len(CATEGORICAL_SCHEMA) else f"Category_{i}"
+        codes = rng.choice(cardinality, size=rows, p=weights).astype(np.int32)
+        if null_rate:
+            codes[rng.random(rows) < null_rate] = -1
+        columns[name] = pd.Categorical.from_codes(codes, [f"{name}_{k}" for k in range(cardinality)])
+    return pd.DataFrame(columns)
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far, or None where the platform cannot tell."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def run_pipeline_once(contents, filename="benchmark.csv", charts=True):
+    """
+    One pass over the analysis stages; returns per-stage milliseconds and how far
+    each stage raised the process's peak RSS (0 when it stayed under an earlier peak).
+    """
+    import main
+    from charts import compact_charts
+    from serialization import dumps
+    from workers import StageTimer
+
+    timer = StageTimer()
+    stage_rss = {}
+
+    @contextmanager
+    def stage(name):
+        before = peak_rss_mb()
+        with timer.stage(name):
+            yield
+        after = peak_rss_mb()
+        stage_rss[name] = round(after - before, 1) if before is not None else None
+
+    with stage("parse"):
+        df = main.load_dataframe(contents, filename)
+    if main.COMPACT_DTYPES:
+        with stage("compact"):
+            main.compact_dtypes(df)
+    with stage("identify_features"):
+        main.identify_features(df)
+    with stage("profile"):
+        profile = main.profile_dataframe(df)
+    with stage("preprocess_columns"):
+        main.preprocess_columns(df, profile)
+    with stage("model_input"):
+        processed = main.model_input(df, profile)
+    with stage("get_model_prediction"):
+        prediction = main.get_model_prediction(processed, main.current_model())
+    with stage("recommendations"):
+        recommendations = main.generate_column_specific_recommendations(df, profile)
+    charts_by_column = None
+    if charts:
+        with stage("charts"):
+            charts_by_column = main.generate_charts_per_column(df, profile)
+    with stage("compact_charts"):
+        compact = compact_charts(profile)
+    with stage("serialize"):
+        body = {
+            "consumer_report": {
+                "column_specific_recommendations": recommendations,
+                "prediction": prediction.tolist() if prediction is not None else "No prediction available",
+            },
+            "charts_by_column": main.raw_charts(charts_by_column) if charts_by_column is not None else compact,
+        }
+        payload = dumps(body)
+    return timer.timings, stage_rss, len(payload)
+
+
+def run_benchmark(rows=10_000, numeric_columns=8, categorical_columns=8, null_rate=0.05, cardinality=20, seed=0,
+                  repeat=3, charts=True):
+    """Median stage timings over ``repeat`` runs on one generated dataset."""
+    config = {"rows": rows, "numeric_columns": numeric_columns, "categorical_columns": categorical_columns,
+              "null_rate": null_rate, "cardinality": cardinality, "seed": seed, "charts": charts}
+    start = time.perf_counter()
+    df = generate_dataset(rows, numeric_columns, categorical_columns, null_rate, cardinality, seed)
+    contents = df.to_csv(index=False).encode("utf-8")
+    generate_seconds = time.perf_counter() - start
+    del df
+    runs, stage_rss, payload_bytes = [], {}, 0
+    for _ in range(repeat):
+        timings, growth, payload_bytes = run_pipeline_once(contents, charts=charts)
+        runs.append(timings)
+        # Later runs mostly stay under the first run's peak, so keep each stage's largest growth
+        for name, mb in growth.items():
+            stage_rss[name] = mb if stage_rss.get(name) is None else max(stage_rss[name], mb or 0.0)
+    stages = {name: round(statistics.median(run[name] for run in runs), 3) for name in runs[0]}
+    return {
+        "scenario": scenario_name(config),
+        "config": config,
+        "csv_bytes": len(contents),
+        "response_bytes": payload_bytes,
+        "generate_seconds": round(generate_seconds, 3),
+        "stages_ms": stages,
+        "total_ms": round(sum(stages.values()), 3),
+        "peak_rss_mb": peak_rss_mb(),
+        "stage_rss_growth_mb": stage_rss,
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+    }
+
+
+def scenario_name(config):
+    return ("rows={rows},num={numeric_columns},cat={categorical_columns},nulls={null_rate},"
+            "card={cardinality},seed={seed},charts={charts}").format(**config)
+
+
+def load_baseline(path=None):
+    path = resolve_baseline_path(path)
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as handle:
+        return json.load(handle)
+
+
+def save_baseline(result, path=None):
+    """Store ``result`` under its scenario name, keeping the other scenarios in the file."""
+    path = resolve_baseline_path(path)
+    baseline = load_baseline(path)
+    baseline[result["scenario"]] = result
+    with open(path, "w", encoding="utf-8") as handle:
+        json.dump(baseline, handle, indent=2, sort_keys=True)
+    return path
+
+
+def compare_to_baseline(result, baseline, tolerance=REGRESSION_TOLERANCE, floor_ms=REGRESSION_FLOOR_MS):
+    """Stages slower than the baseline for the same scenario, as ``{stage: (baseline_ms, current_ms)}``."""
+    reference = baseline.get(result["scenario"])
+    if reference is None:
+        return {}
+    regressions = {}
+    for name, current in result["stages_ms"].items():
+        before = reference["stages_ms"].get(name)
+        if before is None:
+            continue
+        if current > before * (1 + tolerance) and current - before > floor_ms:
+            regressions[name] = (before, current)
+    return regressions
+
+
+def print_result(result, regressions=None):
+    print(f"Scenario {result['scenario']}: {result['csv_bytes'] / 1e6:.1f} MB CSV, "
+          f"peak RSS {result['peak_rss_mb']} MB")
+    for name, ms in result["stages_ms"].items():
+        flag = ""
+        if regressions and name in regressions:
+            flag = f"  REGRESSION (baseline {regressions[name][0]:.1f} ms)"
+        print(f"  {name:<22}{ms:>12.1f} ms{flag}")
+    print(f"  {'total':<22}{result['total_ms']:>12.1f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the upload analysis pipeline on synthetic data.")
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000], help="row counts to run (1000 to 10000000)")
+    parser.add_argument("--numeric-columns", type=int, default=8)
+    parser.add_argument("--categorical-columns", type=int, default=8)
+    parser.add_argument("--null-rate", type=float, default=0.05)
+    parser.add_argument("--cardinality", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--no-charts", action="store_true", help="skip full Plotly chart generation")
+    parser.add_argument("--baseline", default=None, help="baseline file (default: BENCHMARK_BASELINE)")
+    parser.add_argument("--save-baseline", action="store_true", help="record these results as the new baseline")
+    parser.add_argument("--output", default=None, help="also write the raw results as JSON")
+    args = parser.parse_args()
+
+    baseline = load_baseline(args.baseline)
+    results, failed = [], False
+    for rows in args.rows:
+        result = run_benchmark(rows, args.numeric_columns, args.categorical_columns, args.null_rate,
+                               args.cardinality, args.seed, args.repeat, not args.no_charts)
+        regressions = compare_to_baseline(result, baseline)
+        failed = failed or bool(regressions)
+        print_result(result, regressions)
+        results.append(result)
+        if args.save_baseline:
+            print("Saved baseline to", save_baseline(result, args.baseline))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as handle:
+            json.dump(results, handle, indent=2)
+    sys.exit(1 if failed and not args.save_baseline else 0)
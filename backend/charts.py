@@ -0,0 +1,55 @@
+# charts.py
+import os
+
+# Categories sent per bar chart before the rest are folded into "Other"
+CHART_TOP_N = int(os.getenv("CHART_TOP_N", "20"))
+CHART_MODES = ("full", "compact", "lazy")
+
+
+def _json_label(value):
+    return value if isinstance(value, (str, int, float, bool)) else str(value)
+
+
+def histogram_payload(col, bin_edges, bin_counts, null_count=0):
+    """Pre-binned histogram; the client draws bars between consecutive edges."""
+    return {
+        "column": col,
+        "type": "histogram",
+        "title": f"Distribution of {col}",
+        "bin_edges": [] if bin_edges is None else [float(edge) for edge in bin_edges],
+        "counts": [] if bin_counts is None else [int(count) for count in bin_counts],
+        "null_count": int(null_count),
+    }
+
+
+def bar_payload(col, value_counts, top_n=CHART_TOP_N, null_count=0, total=None, other_categories=None):
+    """
+    Top-N category counts with everything else summed into one "Other" bucket.
+
+    ``total`` and ``other_categories`` override the figures derived from
+    ``value_counts`` when it only holds the most frequent values.
+    """
+    top = value_counts.head(top_n)
+    rest = value_counts.iloc[top_n:]
+    return {
+        "column": col,
+        "type": "bar",
+        "title": f"Frequency of {col}",
+        "categories": [_json_label(value) for value in top.index.tolist()],
+        "counts": [int(count) for count in top.tolist()],
+        "other_count": int(rest.sum()) if total is None else int(total - top.sum()),
+        "other_categories": len(rest) if other_categories is None else int(other_categories),
+        "null_count": int(null_count),
+    }
+
+
+def compact_chart(column, top_n=CHART_TOP_N):
+    """Compact chart payload for one ColumnProfile."""
+    if column.is_numeric:
+        return histogram_payload(column.name, column.bin_edges, column.bin_counts, column.null_count)
+    return bar_payload(column.name, column.top_values(), top_n, column.null_count, total=column.count,
+                       other_categories=max(column.nunique - min(len(column.top_values()), top_n), 0))
+
+
+def compact_charts(profile, top_n=CHART_TOP_N):
+    return {column.name: compact_chart(column, top_n) for column in profile}
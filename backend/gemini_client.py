@@ -0,0 +1,304 @@
+# gemini_client.py
+import asyncio
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+from collections import OrderedDict
+
+GEMINI_API_URL = "https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent"
+NO_RECOMMENDATION = "I'm sorry, I wasn't able to generate a recommendation. Please try again."
+NO_RESPONSE = "No response from Gemini AI"
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+class GeminiError(Exception):
+    """The Gemini API could not be reached or kept answering with an error."""
+
+
+def candidate_text(data):
+    """
+    Joined text of the first candidate's parts, or None when there is no candidate.
+
+    A candidate without parts (e.g. a final chunk carrying only ``finishReason``)
+    has no text, so it gives "".
+    """
+    candidates = data.get("candidates")
+    if not (isinstance(candidates, list) and len(candidates) > 0):
+        return None
+    candidate = candidates[0]
+    # First check if there is a "content" key
+    if "content" in candidate:
+        candidate_content = candidate["content"]
+        parts = candidate_content.get("parts")
+    else:
+        parts = candidate.get("parts")
+    if parts is None:
+        return ""
+    if isinstance(parts, list):
+        return " ".join(part.get("text", "") if isinstance(part, dict) else str(part) for part in parts)
+    return str(parts)
+
+
+def extract_candidate_text(data):
+    """Text of the first candidate in a generateContent response body."""
+    text = candidate_text(data)
+    if text is None:
+        return NO_RESPONSE
+    text = text.strip()
+    if not text or text.lower() == "none":
+        return NO_RECOMMENDATION
+    return text
+
+
+def stream_url_for(api_url):
+    """streamGenerateContent counterpart of a generateContent URL."""
+    return api_url.replace(":generateContent", ":streamGenerateContent")
+
+
+def _normalize(text):
+    return re.sub(r"\s+", " ", str(text)).strip()
+
+
+def prompt_cache_key(query, dataset_context, customer_segments):
+    """Cache key for a chatbot question; whitespace, case and segment order do not matter."""
+    normalized = [
+        _normalize(query).lower(),
+        _normalize(dataset_context),
+        sorted(_normalize(segment).lower() for segment in customer_segments or []),
+    ]
+    return hashlib.sha256(json.dumps(normalized).encode("utf-8")).hexdigest()
+
+
+class TTLCache:
+    """Small thread-safe LRU cache whose entries expire after ``ttl_seconds``."""
+
+    def __init__(self, max_entries=256, ttl_seconds=600):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            item = self._entries.get(key)
+            if item is not None and time.monotonic() - item[0] > self.ttl_seconds:
+                del self._entries[key]
+                item = None
+            if item is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+class GeminiClient:
+    """
+    Pooled async client for the Gemini generateContent API.
+
+    Requests share one ``httpx.AsyncClient`` (keep-alive connection pool and
+    timeouts), at most ``max_concurrency`` are in flight, and transport errors
+    or 429/5xx answers are retried with jittered exponential backoff. Answers
+    are cached by key so repeated questions skip the network entirely.
+    """
+
+    def __init__(self, api_url=GEMINI_API_URL, stream_url=None, timeout=30.0, connect_timeout=5.0, max_connections=20,
+                 max_concurrency=8, max_retries=3, backoff_base=0.5, backoff_max=8.0, cache=None):
+        self.api_url = api_url
+        self.stream_url = stream_url or stream_url_for(api_url)
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.max_connections = max_connections
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.cache = cache if cache is not None else TTLCache()
+        self._http = None
+        self._semaphore = None
+        self._loop = None
+        self._streams = 0
+        self._ttft_ms_total = 0.0
+        self.last_ttft_ms = None
+
+    async def _ensure_client(self):
+        # The pool and semaphore belong to the loop that created them
+        loop = asyncio.get_running_loop()
+        if self._http is None or self._loop is not loop:
+            if self._http is not None:
+                await self._close_stale(self._http, self._loop)
+            import httpx  # imported on the first chatbot call, not at server start
+            self._http = httpx.AsyncClient(
+                timeout=httpx.Timeout(self.timeout, connect=self.connect_timeout),
+                limits=httpx.Limits(max_connections=self.max_connections,
+                                    max_keepalive_connections=self.max_connections))
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._loop = loop
+        return self._http
+
+    @staticmethod
+    async def _close_stale(http, loop):
+        """Close a client left behind by another event loop: on that loop while it runs, else here."""
+        if not loop.is_closed() and loop.is_running():
+            asyncio.run_coroutine_threadsafe(http.aclose(), loop)
+            return
+        try:
+            await http.aclose()
+        except Exception as e:  # sockets that died with their loop cannot be closed cleanly
+            print("Could not close the previous Gemini HTTP client:", e)
+
+    def _backoff(self, attempt, response=None):
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after is not None and retry_after.isdigit():
+            return min(float(retry_after), self.backoff_max)
+        delay = min(self.backoff_base * (2 ** attempt), self.backoff_max)
+        return random.uniform(0, delay)  # full jitter
+
+    async def post_json(self, url, payload, headers):
+        """POST with bounded concurrency and retries; returns the successful response."""
+        import httpx
+        http = await self._ensure_client()
+        last_error = None
+        for attempt in range(self.max_retries + 1):
+            response = None
+            try:
+                async with self._semaphore:
+                    response = await http.post(url, json=payload, headers=headers)
+                if response.status_code == 200:
+                    return response
+                last_error = GeminiError(f"Error contacting Gemini AI API: {response.text}")
+                if response.status_code not in RETRYABLE_STATUS:
+                    raise last_error
+            except httpx.TransportError as e:
+                last_error = GeminiError(f"Error contacting Gemini AI API: {e!r}")
+            if attempt < self.max_retries:
+                await asyncio.sleep(self._backoff(attempt, response))
+        raise last_error
+
+    async def generate(self, prompt, api_key, cache_key=None):
+        cache_key = cache_key or hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            return cached
+        payload = {"contents": [{"parts": [{"text": prompt}]}]}
+        headers = {"Content-Type": "application/json", "x-goog-api-key": api_key}
+        response = await self.post_json(self.api_url, payload, headers)
+        text = extract_candidate_text(response.json())
+        if text not in (NO_RECOMMENDATION, NO_RESPONSE):
+            self.cache.put(cache_key, text)
+        return text
+
+    async def _open_stream(self, payload, headers):
+        """Open an SSE response, retrying until the upstream accepts the request."""
+        import httpx
+        http = await self._ensure_client()
+        last_error = None
+        for attempt in range(self.max_retries + 1):
+            response = None
+            try:
+                request = http.build_request("POST", self.stream_url, json=payload, headers=headers,
+                                             params={"alt": "sse"})
+                response = await http.send(request, stream=True)
+                if response.status_code == 200:
+                    return response
+                await response.aread()
+                await response.aclose()
+                last_error = GeminiError(f"Error contacting Gemini AI API: {response.text}")
+                if response.status_code not in RETRYABLE_STATUS:
+                    raise last_error
+            except httpx.TransportError as e:
+                last_error = GeminiError(f"Error contacting Gemini AI API: {e!r}")
+            if attempt < self.max_retries:
+                await asyncio.sleep(self._backoff(attempt, response))
+        raise last_error
+
+    async def stream_generate(self, prompt, api_key, cache_key=None):
+        """
+        Yield answer text as it arrives from streamGenerateContent.
+
+        Each server-sent event is parsed with ``candidate_text``. A cached answer
+        is replayed as one chunk, and a completed stream is cached for next time.
+        """
+        cache_key = cache_key or hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            yield cached
+            return
+        await self._ensure_client()
+        payload = {"contents": [{"parts": [{"text": prompt}]}]}
+        headers = {"Content-Type": "application/json", "x-goog-api-key": api_key}
+        start = time.perf_counter()
+        first_token = True
+        pieces = []
+        async with self._semaphore:
+            response = await self._open_stream(payload, headers)
+            try:
+                async for line in response.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    text = candidate_text(json.loads(line[5:].strip()))
+                    if not text:
+                        continue
+                    if first_token:
+                        self._record_ttft((time.perf_counter() - start) * 1000)
+                        first_token = False
+                    pieces.append(text)
+                    yield text
+            finally:
+                await response.aclose()
+        answer = "".join(pieces).strip()
+        if answer and answer.lower() != "none":
+            self.cache.put(cache_key, answer)
+
+    def _record_ttft(self, elapsed_ms):
+        self._streams += 1
+        self._ttft_ms_total += elapsed_ms
+        self.last_ttft_ms = elapsed_ms
+
+    def stream_stats(self):
+        return {
+            "streams": self._streams,
+            "last_ttft_ms": None if self.last_ttft_ms is None else round(self.last_ttft_ms, 3),
+            "mean_ttft_ms": round(self._ttft_ms_total / self._streams, 3) if self._streams else None,
+        }
+
+    async def aclose(self):
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+
+def client_from_env():
+    return GeminiClient(
+        api_url=os.getenv("GEMINI_API_URL", GEMINI_API_URL),
+        stream_url=os.getenv("GEMINI_STREAM_API_URL"),
+        timeout=float(os.getenv("GEMINI_TIMEOUT_SECONDS", "30")),
+        max_connections=int(os.getenv("GEMINI_MAX_CONNECTIONS", "20")),
+        max_concurrency=int(os.getenv("GEMINI_MAX_CONCURRENCY", "8")),
+        max_retries=int(os.getenv("GEMINI_MAX_RETRIES", "3")),
+        cache=TTLCache(
+            max_entries=int(os.getenv("GEMINI_CACHE_MAX_ENTRIES", "256")),
+            ttl_seconds=float(os.getenv("GEMINI_CACHE_TTL_SECONDS", "600")),
+        ),
+    )
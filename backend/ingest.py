@@ -0,0 +1,312 @@
+# ingest.py
+import io
+import os
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.ipc as pa_ipc
+import pyarrow.parquet as pq
+
+# Rows parsed per chunk when streaming a CSV upload
+STREAM_CHUNK_ROWS = int(os.getenv("STREAM_CHUNK_ROWS", "50000"))
+# Distinct values tracked per column before value counts are truncated to the most frequent
+STREAM_MAX_TRACKED_VALUES = int(os.getenv("STREAM_MAX_TRACKED_VALUES", "10000"))
+# Size of the uniform sample kept per numeric column for the median
+STREAM_MEDIAN_SAMPLE_SIZE = int(os.getenv("STREAM_MEDIAN_SAMPLE_SIZE", "20000"))
+# "arrow" parses CSV uploads with the multithreaded Arrow reader, "pandas" with pd.read_csv
+CSV_ENGINE = os.getenv("INGEST_CSV_ENGINE", "arrow")
+# Shrink dtypes right after parsing (INGEST_COMPACT_DTYPES=0 keeps what the reader produced)
+COMPACT_DTYPES = os.getenv("INGEST_COMPACT_DTYPES", "1") == "1"
+# Text columns whose distinct values are at most this share of their non-null values become categories
+COMPACT_CATEGORY_RATIO = float(os.getenv("INGEST_CATEGORY_RATIO", "0.5"))
+
+UPLOAD_FORMATS = ("csv", "parquet", "arrow", "arrow_stream", "xlsx", "xls")
+_MAGIC = (
+    (b"PAR1", "parquet"),
+    (b"ARROW1", "arrow"),
+    (b"\xff\xff\xff\xff", "arrow_stream"),
+    (b"PK\x03\x04", "xlsx"),
+    (b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1", "xls"),
+)
+
+
+class RunningColumnStats:
+    """
+    Running aggregates for one column of a chunked CSV.
+
+    Counts, sums and value counts are exact. The median comes from a bounded
+    uniform sample and is exact only while the column fits in the sample. Value
+    counts are trimmed to the most frequent ``max_tracked_values`` entries, in
+    which case ``nunique`` is a lower bound and ``truncated`` is set.
+    """
+
+    def __init__(self, name, max_tracked_values=STREAM_MAX_TRACKED_VALUES,
+                 sample_size=STREAM_MEDIAN_SAMPLE_SIZE, seed=0):
+        self.name = name
+        self.numeric = True
+        self.count = 0
+        self.nulls = 0
+        self.total = 0.0
+        self.minimum = None
+        self.maximum = None
+        self.value_counts = pd.Series(dtype="int64")
+        self.truncated = False
+        self.max_tracked_values = max_tracked_values
+        self.sample_size = sample_size
+        self._rng = np.random.default_rng(seed)
+        self._sample = np.empty(0)
+        self._sample_keys = np.empty(0)
+        self.bin_edges = None
+        self.bin_counts = None
+
+    def update(self, series):
+        non_null = series.dropna()
+        self.nulls += len(series) - len(non_null)
+        self.count += len(non_null)
+        if self.numeric and not pd.api.types.is_numeric_dtype(series):
+            # The column turned out to hold text further down the file
+            self.numeric = False
+            self._sample = np.empty(0)
+            self._sample_keys = np.empty(0)
+        if self.numeric and len(non_null):
+            values = non_null.to_numpy(dtype=float)
+            self.total += float(values.sum())
+            low, high = float(values.min()), float(values.max())
+            self.minimum = low if self.minimum is None else min(self.minimum, low)
+            self.maximum = high if self.maximum is None else max(self.maximum, high)
+            self._update_sample(values)
+        self._update_value_counts(non_null)
+
+    def _update_sample(self, values):
+        # Bottom-k by random key: a uniform sample without replacement that merges chunk by chunk
+        keys = np.concatenate([self._sample_keys, self._rng.random(len(values))])
+        sample = np.concatenate([self._sample, values])
+        if len(sample) > self.sample_size:
+            keep = np.argpartition(keys, self.sample_size)[:self.sample_size]
+            keys, sample = keys[keep], sample[keep]
+        self._sample_keys, self._sample = keys, sample
+
+    def _update_value_counts(self, non_null):
+        chunk_counts = non_null.value_counts(sort=False)
+        if self.value_counts.empty:
+            counts = chunk_counts
+        else:
+            counts = self.value_counts.add(chunk_counts, fill_value=0)
+        if len(counts) > self.max_tracked_values:
+            self.truncated = True
+            counts = counts.nlargest(self.max_tracked_values)
+        self.value_counts = counts.astype("int64")
+
+    @property
+    def mean(self):
+        if not self.numeric or self.count == 0:
+            return float("nan")
+        return self.total / self.count
+
+    @property
+    def median(self):
+        if not self.numeric or len(self._sample) == 0:
+            return float("nan")
+        return float(np.median(self._sample))
+
+    @property
+    def median_is_exact(self):
+        return self.count <= self.sample_size
+
+    @property
+    def nunique(self):
+        return len(self.value_counts)
+
+    def top_values(self, n=None):
+        ranked = self.value_counts.sort_values(ascending=False, kind="stable")
+        return ranked if n is None else ranked.head(n)
+
+    def start_histogram(self, nbins):
+        if not self.numeric or self.minimum is None:
+            return
+        low, high = self.minimum, self.maximum
+        if low == high:
+            low, high = low - 0.5, high + 0.5
+        self.bin_edges = np.linspace(low, high, nbins + 1)
+        self.bin_counts = np.zeros(nbins, dtype=np.int64)
+
+    def update_histogram(self, series):
+        if self.bin_edges is None:
+            return
+        values = series.dropna().to_numpy(dtype=float)
+        counts, _ = np.histogram(values, bins=self.bin_edges)
+        self.bin_counts += counts
+
+
+class StreamedDataset:
+    """Result of a streaming pass: per-column aggregates plus the first rows of the file."""
+
+    def __init__(self, columns, head, total_rows):
+        self.columns = columns
+        self.head = head
+        self.total_rows = total_rows
+
+    @property
+    def numeric_cols(self):
+        return [name for name, stats in self.columns.items() if stats.numeric]
+
+    @property
+    def categorical_cols(self):
+        return [name for name, stats in self.columns.items() if not stats.numeric]
+
+
+def iter_csv_chunks(source, chunk_rows=STREAM_CHUNK_ROWS):
+    """Yield DataFrame chunks from a seekable file object holding CSV bytes."""
+    source.seek(0)
+    yield from pd.read_csv(source, chunksize=chunk_rows)
+
+
+def stream_csv_statistics(source, chunk_rows=STREAM_CHUNK_ROWS, on_chunk=None):
+    """
+    Single bounded-memory pass over a CSV file object.
+
+    ``on_chunk`` is called with each chunk after its statistics have been
+    recorded, and may modify the chunk in place.
+    """
+    columns = OrderedDict()
+    head = None
+    total_rows = 0
+    for chunk in iter_csv_chunks(source, chunk_rows):
+        if head is None:
+            head = chunk.head(1).copy()
+            for name in chunk.columns:
+                columns[name] = RunningColumnStats(name)
+        total_rows += len(chunk)
+        for name, stats in columns.items():
+            stats.update(chunk[name])
+        if on_chunk is not None:
+            on_chunk(chunk)
+    if head is None:
+        head = pd.DataFrame()
+    return StreamedDataset(columns, head, total_rows)
+
+
+def stream_csv_histograms(source, dataset, nbins=30, chunk_rows=STREAM_CHUNK_ROWS):
+    """Second pass that bins numeric columns once their ranges are known."""
+    numeric = [dataset.columns[name] for name in dataset.numeric_cols]
+    for stats in numeric:
+        stats.start_histogram(nbins)
+    if not numeric:
+        return dataset
+    for chunk in iter_csv_chunks(source, chunk_rows):
+        for stats in numeric:
+            stats.update_histogram(chunk[stats.name])
+    return dataset
+
+
+def detect_format(head):
+    """Upload format from its leading bytes; anything without a known signature is read as CSV."""
+    for magic, name in _MAGIC:
+        if head.startswith(magic):
+            return name
+    return "csv"
+
+
+def _string_dtype(arrow_type):
+    if pa.types.is_string(arrow_type) or pa.types.is_large_string(arrow_type):
+        return pd.StringDtype("pyarrow")
+    return None
+
+
+def arrow_to_pandas(table):
+    """
+    DataFrame with Arrow-backed strings and NumPy numerics.
+
+    Dates and timestamps become text and decimals floats, so columnar uploads
+    classify the same way as a CSV read by pandas.
+    """
+    for i, field in enumerate(table.schema):
+        if pa.types.is_temporal(field.type):
+            table = table.set_column(i, field.name, table.column(i).cast(pa.string()))
+        elif pa.types.is_decimal(field.type):
+            table = table.set_column(i, field.name, table.column(i).cast(pa.float64()))
+    return table.to_pandas(types_mapper=_string_dtype, split_blocks=True, self_destruct=True)
+
+
+def read_csv_arrow(contents):
+    """
+    Parse CSV bytes with Arrow's multithreaded reader.
+
+    Empty strings count as missing, as in pandas. Columns Arrow would infer as
+    dates or timestamps are re-read as text in a second pass.
+    """
+    convert = pa_csv.ConvertOptions(strings_can_be_null=True)
+    table = pa_csv.read_csv(pa.BufferReader(contents), convert_options=convert)
+    temporal = {field.name: pa.string() for field in table.schema if pa.types.is_temporal(field.type)}
+    if temporal:
+        convert = pa_csv.ConvertOptions(strings_can_be_null=True, column_types=temporal)
+        table = pa_csv.read_csv(pa.BufferReader(contents), convert_options=convert)
+    if len(set(table.column_names)) != len(table.column_names):
+        # pandas de-duplicates repeated headers ("a", "a.1"); keep that behaviour
+        raise pa.ArrowInvalid("duplicate column names")
+    return arrow_to_pandas(table)
+
+
+def read_upload(contents, fmt=None, csv_engine=CSV_ENGINE):
+    """Parse an uploaded file of any supported format, detected from its content unless ``fmt`` is given."""
+    fmt = fmt or detect_format(contents[:8])
+    if fmt == "csv":
+        if csv_engine == "arrow":
+            try:
+                return read_csv_arrow(contents)
+            except pa.ArrowInvalid:
+                pass  # ragged rows, duplicate headers, non-UTF-8 text: let pandas try
+        return pd.read_csv(io.BytesIO(contents))
+    if fmt == "parquet":
+        return arrow_to_pandas(pq.read_table(pa.BufferReader(contents)))
+    if fmt == "arrow":
+        return arrow_to_pandas(pa_ipc.open_file(pa.BufferReader(contents)).read_all())
+    if fmt == "arrow_stream":
+        return arrow_to_pandas(pa_ipc.open_stream(pa.BufferReader(contents)).read_all())
+    if fmt in ("xlsx", "xls"):
+        return pd.read_excel(io.BytesIO(contents))
+    raise ValueError(f"Unsupported upload format {fmt!r}; expected one of {', '.join(UPLOAD_FORMATS)}")
+
+
+def _compact_numeric(series):
+    values = series.to_numpy()
+    if values.dtype.kind in "iu":
+        return pd.to_numeric(series, downcast="integer" if values.dtype.kind == "i" else "unsigned")
+    if values.dtype == np.float64:
+        narrow = values.astype(np.float32)
+        # Only when every value survives the round trip, so statistics and predictions are unchanged
+        with np.errstate(over="ignore"):
+            if np.array_equal(narrow.astype(np.float64), values, equal_nan=True):
+                return pd.Series(narrow, index=series.index, name=series.name)
+    return series
+
+
+def compact_dtypes(df, category_ratio=COMPACT_CATEGORY_RATIO):
+    """
+    Shrink a freshly parsed frame in place and return it.
+
+    Integers get the narrowest width that holds their range. Floats become
+    float32 only when that is lossless. Low-cardinality text columns (distinct
+    values no more than ``category_ratio`` of the non-null count) become
+    ``category``. Mixed-type object columns are left alone.
+    """
+    for col in df.columns:
+        series = df[col]
+        dtype = series.dtype
+        if isinstance(dtype, pd.CategoricalDtype) or pd.api.types.is_bool_dtype(dtype):
+            continue
+        if pd.api.types.is_numeric_dtype(dtype):
+            if isinstance(dtype, np.dtype):
+                df[col] = _compact_numeric(series)
+            continue
+        if pd.api.types.is_object_dtype(dtype) and pd.api.types.infer_dtype(series, skipna=True) != "string":
+            continue
+        if not pd.api.types.is_string_dtype(dtype):
+            continue
+        non_null = series.count()
+        if non_null and series.nunique() <= category_ratio * non_null:
+            df[col] = series.astype("category")
+    return df
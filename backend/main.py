@@ -1,29 +1,80 @@
 # main.py
+import time
+IMPORT_STARTED = time.perf_counter()
 from dotenv import load_dotenv
 load_dotenv()  # Load environment variables from .env file
 import os
-import io
-from fastapi import FastAPI, File, UploadFile, Response, HTTPException
+import json
+import asyncio
+import threading
+from concurrent.futures.process import BrokenProcessPool
+from fastapi import FastAPI, File, UploadFile, Request, Response, HTTPException
 import pandas as pd
-import joblib
-import plotly.express as px
 import numpy as np
-import re
 from fastapi.middleware.cors import CORSMiddleware
-from sklearn.preprocessing import LabelEncoder, StandardScaler
-import pdfkit
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
-import requests
+from analysis_cache import AnalysisCache, content_digest
+from ingest import COMPACT_DTYPES, STREAM_CHUNK_ROWS, compact_dtypes, detect_format, read_upload, stream_csv_statistics, stream_csv_histograms
+from workers import AnalysisWorkerPool, StageTimer, WorkerPoolFull
+from profiler import profile_dataframe
+from model_registry import MODEL_FEATURES, load_model
+from preprocessing import load_preprocessing_artifact
+from charts import CHART_MODES, CHART_TOP_N, bar_payload, compact_chart, compact_charts, histogram_payload
+from gemini_client import NO_RECOMMENDATION, GeminiError, client_from_env, prompt_cache_key
+from report_jobs import ReportJobQueue, WkhtmltopdfRenderer
+from sessions import DatasetSessionStore
+from batch import BatchError, combine_member_stats, discard_batch, member_stats, split_batch
+from serialization import COMPRESS_MIN_BYTES, RawJSON, compress, dumps, negotiate_encoding
+from recommendations import rule_engine
+from predictions import (PREDICTION_FORMATS, PREDICTION_MODES, PREDICTION_PAGE_ROWS, as_array, encode_predictions,
+                         summarize_predictions)
+from sampling import (APPROX_SAMPLE_ABOVE_ROWS, APPROX_SAMPLE_ROWS, SamplingError, check_strata, sample_frame,
+                      scale_profile)
+from routes.auth import password_hasher, router as auth_router, user_store
+from metrics import (HANDLER_ERRORS, REQUEST_SECONDS, RESPONSE_BYTES, STAGE_SECONDS, UPLOAD_BYTES, end_trace,
+                     record_analysis_rate, record_stages, registry, start_trace, trace_stage)
 
 app = FastAPI()
+app.include_router(auth_router)
 
-# Load your trained ML model (if applicable)
-model_path = 'moneypulse_model_v2.xgb'
-try:
-    model = joblib.load(model_path)
-except Exception as e:
-    model = None
-    print("Model load error:", e)
+# The trained model (pinned feature order, warmed up) and the fitted preprocessing artifact are
+# loaded once per process: by the startup hook in the API process, on first use in analysis workers.
+model = None
+model_load_error = None
+preprocessing_artifact = None
+artifacts_loaded = False
+startup_timings = {}
+_artifacts_lock = threading.Lock()
+# /readyz stays 503 when the model fails to load unless READY_WITHOUT_MODEL=1
+READY_WITHOUT_MODEL = os.getenv("READY_WITHOUT_MODEL", "0") == "1"
+
+def load_artifacts():
+    global model, model_load_error, preprocessing_artifact, artifacts_loaded
+    with _artifacts_lock:
+        if artifacts_loaded:
+            return
+        start = time.perf_counter()
+        try:
+            model = load_model()
+            print(f"Loaded model {model.path} in {model.load_seconds:.2f}s (warm-up {model.warmup_ms:.1f} ms)")
+        except Exception as e:
+            model_load_error = str(e)
+            print("Model load error; predictions are disabled:", e)
+        startup_timings["model_seconds"] = round(time.perf_counter() - start, 4)
+        # Fitted medians, vocabularies and scaler statistics for models that take preprocessed features
+        start = time.perf_counter()
+        try:
+            preprocessing_artifact = load_preprocessing_artifact()
+        except Exception as e:
+            print("Preprocessing artifact load error; falling back to per-upload fitting:", e)
+        startup_timings["preprocessing_seconds"] = round(time.perf_counter() - start, 4)
+        artifacts_loaded = True
+
+def current_model():
+    load_artifacts()
+    return model
 
 # Allow CORS from both your local dev and your Vercel front-end
 app.add_middleware(
@@ -35,12 +86,92 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing"],
+)
+
+# Always send the Server-Timing stage breakdown, not only when a request asks with X-Debug-Timing: 1
+TRACE_DEBUG_HEADER = os.getenv("TRACE_DEBUG_HEADER", "0") == "1"
+
+@app.middleware("http")
+async def trace_requests(request, call_next):
+    trace, token = start_trace()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+    finally:
+        end_trace(token)
+        route = request.scope.get("route")
+        REQUEST_SECONDS.observe(time.perf_counter() - trace.started, method=request.method,
+                                route=route.path if route is not None else "unmatched", status=status)
+        trace.observe()
+    if TRACE_DEBUG_HEADER or request.headers.get("x-debug-timing") == "1":
+        response.headers["Server-Timing"] = trace.server_timing()
+    return response
+
+# Uploads are analysed once and reused by /recommend-business and /download-report-pdf
+analysis_cache = AnalysisCache(
+    max_entries=int(os.getenv("ANALYSIS_CACHE_MAX_ENTRIES", "32")),
+    ttl_seconds=float(os.getenv("ANALYSIS_CACHE_TTL_SECONDS", "900")),
+    max_bytes=int(os.getenv("ANALYSIS_CACHE_MAX_MB", "512")) * 1024 * 1024,
+)
+
+# Parsing, preprocessing, inference and charting run in worker processes, not on the event loop
+analysis_pool = AnalysisWorkerPool(
+    max_workers=int(os.getenv("ANALYSIS_WORKERS", str(os.cpu_count() or 1))),
+    max_pending=int(os.getenv("ANALYSIS_MAX_PENDING", "8")),
+    retry_after=int(os.getenv("ANALYSIS_RETRY_AFTER_SECONDS", "5")),
+    initializer=load_artifacts,  # each worker loads the model and artifact as it starts, not on its first job
+)
+
+# One pooled HTTP client per process for all chatbot calls
+gemini_client = client_from_env()
+
+# Datasets that grow by appended uploads, summarised by mergeable sketches
+session_store = DatasetSessionStore()
+
+# PDF reports render in the background; results are kept on disk until they expire
+report_jobs = ReportJobQueue(
+    result_dir=os.getenv("REPORT_RESULT_DIR"),
+    ttl_seconds=float(os.getenv("REPORT_RESULT_TTL_SECONDS", "3600")),
+    max_renderers=int(os.getenv("REPORT_MAX_RENDERERS", "2")),
+    renderer=WkhtmltopdfRenderer(timeout=float(os.getenv("REPORT_RENDER_TIMEOUT_SECONDS", "120"))),
+    max_pending=int(os.getenv("REPORT_MAX_PENDING", "32")),
+    max_age_seconds=float(os.getenv("REPORT_JOB_MAX_AGE_SECONDS", "1800")),
+    purge_interval=float(os.getenv("REPORT_PURGE_INTERVAL_SECONDS", "300")),
 )
 
-# Default thresholds for analysis
-THRESHOLD_AMOUNT = 50
-THRESHOLD_FREQUENCY = 2
-RATING_THRESHOLD = 3.5
+# Loading and worker start-up run in the background so /healthz answers at once;
+# /readyz turns 200 when both are done. Expired report jobs are swept on a timer.
+_artifact_load_task = None
+_worker_start_task = None
+_report_purge_task = None
+
+async def start_analysis_workers():
+    start = time.perf_counter()
+    try:
+        await analysis_pool.start()
+    except Exception as e:
+        print("Analysis workers failed to start:", e)
+        return
+    startup_timings["workers_seconds"] = round(time.perf_counter() - start, 4)
+
+@app.on_event("startup")
+async def start_loading_artifacts():
+    global _artifact_load_task, _worker_start_task, _report_purge_task
+    _artifact_load_task = asyncio.ensure_future(run_in_threadpool(load_artifacts))
+    _worker_start_task = asyncio.ensure_future(start_analysis_workers())
+    _report_purge_task = asyncio.ensure_future(report_jobs.purge_periodically())
+
+@app.on_event("shutdown")
+async def shutdown_background_resources():
+    for task in (_worker_start_task, _report_purge_task):
+        if task is not None:
+            task.cancel()
+    analysis_pool.shutdown()
+    password_hasher.shutdown()
+    user_store.close()
+    await gemini_client.aclose()
 
 def identify_features(uploaded_df):
     numerical_cols = []
@@ -52,19 +183,54 @@ def identify_features(uploaded_df):
             categorical_cols.append(col)
     return numerical_cols, categorical_cols
 
-def preprocess_columns(uploaded_df):
-    numerical_cols, categorical_cols = identify_features(uploaded_df)
-    for col in numerical_cols:
-        uploaded_df[col] = uploaded_df[col].fillna(uploaded_df[col].median())
+def label_encode(series):
+    """LabelEncoder codes for a column with missing values read as 'Unknown'."""
+    from sklearn.preprocessing import LabelEncoder
+    le = LabelEncoder()
+    if isinstance(series.dtype, pd.CategoricalDtype) and pd.api.types.infer_dtype(series.cat.categories) == "string":
+        # Rank the categories instead of sorting every row: same codes and classes_ as fit_transform
+        if series.hasnans:
+            if "Unknown" not in series.cat.categories:
+                series = series.cat.add_categories(["Unknown"])
+            series = series.fillna("Unknown")
+        series = series.cat.remove_unused_categories()
+        categories = np.asarray(series.cat.categories, dtype=object)
+        order = np.argsort(categories)
+        ranks = np.empty(len(categories), dtype=np.int64)
+        ranks[order] = np.arange(len(categories))
+        le.classes_ = categories[order]
+        return ranks[series.cat.codes.to_numpy()], le
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        series = series.astype(object)
+    return le.fit_transform(series.fillna('Unknown')), le
+
+def preprocess_columns(uploaded_df, profile=None):
+    """
+    Median-fill and standardise numeric columns and label-encode the rest.
+
+    Returns a new frame; ``uploaded_df`` is only read, so callers need not copy it.
+    """
+    # A profile of uploaded_df saves re-classifying columns and recomputing medians
+    if profile is None:
+        numerical_cols, categorical_cols = identify_features(uploaded_df)
+        medians = {col: uploaded_df[col].median() for col in numerical_cols}
+    else:
+        numerical_cols, categorical_cols = profile.numeric_cols, profile.categorical_cols
+        medians = profile.numeric_medians()
+    from sklearn.preprocessing import StandardScaler
+    columns = {}
+    scaler = StandardScaler(copy=False)
+    if numerical_cols:
+        # One float64 block is the only copy made of the numeric data
+        block = uploaded_df[numerical_cols].to_numpy(dtype=np.float64, na_value=np.nan)
+        fill = np.array([medians[col] for col in numerical_cols], dtype=np.float64)
+        np.copyto(block, np.broadcast_to(fill, block.shape), where=np.isnan(block))
+        block = scaler.fit_transform(block)
+        columns.update(zip(numerical_cols, block.T))
     label_encoders = {}
     for col in categorical_cols:
-        le = LabelEncoder()
-        uploaded_df[col] = le.fit_transform(uploaded_df[col].fillna('Unknown'))
-        label_encoders[col] = le
-    scaler = StandardScaler()
-    if numerical_cols:
-        uploaded_df[numerical_cols] = scaler.fit_transform(uploaded_df[numerical_cols])
-    return uploaded_df, label_encoders, scaler
+        columns[col], label_encoders[col] = label_encode(uploaded_df[col])
+    return pd.DataFrame({col: columns[col] for col in uploaded_df.columns}, index=uploaded_df.index), label_encoders, scaler
 
 def add_missing_columns(df, required_columns, default_value=0):
     missing_cols = required_columns - set(df.columns)
@@ -72,292 +238,871 @@ def add_missing_columns(df, required_columns, default_value=0):
         df[col] = default_value
     return df
 
+def model_input(df, profile=None):
+    """
+    Frame to score. A model with its own fitted preprocessing gets the raw columns;
+    otherwise the persisted preprocessing artifact is applied, and only without
+    one are encoders and scaler fitted on the upload itself.
+    """
+    if getattr(current_model(), "raw_input", False):
+        return df
+    if preprocessing_artifact is not None:
+        return preprocessing_artifact.transform(df)
+    processed_data, _, _ = preprocess_columns(df, profile)
+    return processed_data
+
 def get_model_prediction(processed_data, model):
-    MODEL_FEATURES = {"Purchase_Amount", "Frequency_of_Purchase", "Price_per_Hour", "Research_Effectiveness"}
-    common_features = set(processed_data.columns).intersection(MODEL_FEATURES)
-    if not common_features or model is None:
+    # Registered models pin their own feature order; anything else is fed MODEL_FEATURES
+    features = list(getattr(model, "feature_names", MODEL_FEATURES))
+    common_features = processed_data.columns.intersection(features)
+    if common_features.empty or model is None:
         print("No matching features for the model or model not loaded; skipping prediction.")
         return None
     try:
-        processed_data = add_missing_columns(processed_data, MODEL_FEATURES, default_value=0)
-        processed_data = processed_data[list(MODEL_FEATURES)]
+        if not hasattr(model, "feature_names"):
+            processed_data = processed_data.reindex(columns=features, fill_value=0)
         prediction = model.predict(processed_data)
         return prediction
     except Exception as e:
         print("Model prediction error:", e)
         return None
 
-def pick_variant(variants, col, mean_val=None):
-    index = abs(hash(col)) % len(variants)
-    if mean_val is not None:
-        return variants[index].format(col=col, mean=mean_val)
-    else:
-        return variants[index].format(col=col)
-
-def generate_column_specific_recommendations(df):
-    recommendations = {}
-    numeric_cols, categorical_cols = identify_features(df)
-    
-    # Keyword groups
-    revenue_keywords = ["amount", "price", "cost", "revenue"]
-    frequency_keywords = ["frequency", "count", "number"]
-    rating_keywords = ["rating", "score"]
-    categorical_relevant = ["category", "segment", "region", "type"]
-    
-    # Variants for recommendations
-    revenue_under = [
-        "The '{col}' metric averages at {mean:.2f}, which is below the ideal range. Focus on boosting revenue by introducing targeted promotions, revising pricing strategies, and offering bundled deals.",
-        "With '{col}' averaging only {mean:.2f}, there's significant growth opportunity. Adjust pricing and launch special discounts.",
-        "The low average of '{col}' ({mean:.2f}) indicates underperformance. Invest in market research and innovate pricing models."
-    ]
-    revenue_over = [
-        "The '{col}' metric is strong at an average of {mean:.2f}. Leverage this success to scale operations and enhance customer experience.",
-        "A healthy '{col}' average of {mean:.2f} provides a solid foundation. Expand market reach and reinvest profits.",
-        "With '{col}' performing well at {mean:.2f}, build on this strength by optimizing customer acquisition and upselling."
-    ]
-    frequency_under = [
-        "The average '{col}' is only {mean:.2f}, suggesting low engagement. Prioritize developing loyalty programs and personalized marketing.",
-        "An average of {mean:.2f} in '{col}' indicates low customer repeat. Create incentives that encourage regular interactions.",
-        "The low frequency ({mean:.2f}) in '{col}' reveals an opportunity to boost repeat transactions. Consider subscriptions or rewards."
-    ]
-    frequency_over = [
-        "The '{col}' metric is strong with an average of {mean:.2f}. Capitalize on this by expanding engagement initiatives.",
-        "A robust average of {mean:.2f} in '{col}' highlights healthy activity. Maintain this trend and explore additional segmentation.",
-        "With '{col}' at {mean:.2f} on average, continue to fine-tune upselling and cross-promotional tactics."
-    ]
-    rating_under = [
-        "The average '{col}' of {mean:.2f} is a signal to improve customer satisfaction. Focus on quality enhancements and responsive support.",
-        "With '{col}' averaging only {mean:.2f}, customer dissatisfaction might be holding you back. Invest in improvements.",
-        "An average rating of {mean:.2f} in '{col}' suggests the need for upgrades. Prioritize customer feedback and product improvements."
-    ]
-    rating_over = [
-        "A solid '{col}' average of {mean:.2f} indicates strong approval. Leverage this positive feedback in your marketing campaigns.",
-        "With '{col}' at {mean:.2f}, quality is clearly a competitive advantage. Maintain your standard while exploring new segments.",
-        "The excellent performance of '{col}' at {mean:.2f} provides a strong foundation for growth. Enhance brand messaging accordingly."
-    ]
-    categorical_high = [
-        "The '{col}' column shows high diversity. Segment these groups to design tailored marketing strategies.",
-        "With many unique values in '{col}', identify and target specific customer segments for personalized offerings."
-    ]
-    categorical_low = [
-        "The '{col}' column is dominated by a few categories. Concentrate on these key segments to optimize offerings.",
-        "A concentrated distribution in '{col}' reveals a clear customer preference. Refine your offerings to drive consistent growth."
-    ]
-    
-    for col in numeric_cols:
-        col_lower = col.lower()
-        series = df[col].dropna()
-        if series.empty:
-            continue
-        mean_val = series.mean()
-        recommendation = None
-        
-        if any(keyword in col_lower for keyword in revenue_keywords):
-            recommendation = pick_variant(revenue_under if mean_val < THRESHOLD_AMOUNT else revenue_over, col, mean_val)
-        elif any(keyword in col_lower for keyword in frequency_keywords):
-            recommendation = pick_variant(frequency_under if mean_val < THRESHOLD_FREQUENCY else frequency_over, col, mean_val)
-        elif any(keyword in col_lower for keyword in rating_keywords):
-            recommendation = pick_variant(rating_under if mean_val < RATING_THRESHOLD else rating_over, col, mean_val)
-        
-        if recommendation:
-            recommendations[col] = recommendation
+def generate_column_specific_recommendations(df, profile=None):
+    if profile is None:
+        profile = profile_dataframe(df)
+    return recommendations_from_stats(profile.numeric_means(), profile.categorical_nunique())
 
-    for col in categorical_cols:
-        col_lower = col.lower()
-        if any(keyword in col_lower for keyword in categorical_relevant):
-            series = df[col].dropna()
-            unique_count = series.nunique()
-            recommendation = pick_variant(categorical_high if unique_count > 10 else categorical_low, col)
-            recommendations[col] = recommendation
+def recommendations_from_stats(numeric_means, categorical_nunique):
+    """Build recommendations from per-column means and distinct counts (NaN means are skipped)."""
+    return rule_engine.recommend(numeric_means, categorical_nunique)
 
-    return recommendations
-
-def generate_consumer_report(df):
-    report = {}
-    report['total_entries'] = len(df)
-    report['total_columns'] = len(df.columns)
-    
-    numeric_cols, categorical_cols = identify_features(df)
-    summary_parts = [f"This dataset contains {len(df)} records across {len(df.columns)} variables."]
-    if numeric_cols:
-        overall_mean = df[numeric_cols].mean().mean()
+def build_general_summary(total_rows, columns, numeric_means, categorical_cols, overall_mean=None):
+    summary_parts = [f"This dataset contains {total_rows} records across {len(columns)} variables."]
+    if numeric_means:
+        if overall_mean is None:
+            overall_mean = pd.Series(numeric_means, dtype=float).mean()
         summary_parts.append(f"Overall average of numeric variables is {overall_mean:.2f}.")
     if categorical_cols:
         summary_parts.append(f"There are {len(categorical_cols)} categorical variables indicating potential customer segments.")
-    basic_summary = " ".join(summary_parts)
-    
+    return " ".join(summary_parts)
+
+def build_extended_context(columns, head_df, basic_summary):
     # Build a concise extended context:
-    columns_str = "Columns: " + ", ".join(df.columns)
+    columns_str = "Columns: " + ", ".join(columns)
     # Only include the first row sample to keep it short
-    sample_str = "Sample Data (first row):\n" + df.head(1).to_string(index=False)
+    sample_str = "Sample Data (first row):\n" + head_df.head(1).to_string(index=False)
     extended_context = f"{columns_str}\n{sample_str}\n{basic_summary}"
     # Optionally truncate if too long:
     max_length = 1000  # adjust as needed
     if len(extended_context) > max_length:
         extended_context = extended_context[:max_length] + "..."
+    return extended_context
+
+def generate_consumer_report(df, timer=None, profile=None, sample=None):
+    """
+    Report for ``df``. When ``df`` is a sample, ``sample`` (a SampleInfo) supplies the
+    file's row count and the sampled means, which print with their confidence intervals.
+    """
+    timer = timer or StageTimer()
+    if profile is None:
+        with timer.stage("profile"):
+            profile = profile_dataframe(df)
+    report = {}
+    report['total_entries'] = len(df) if sample is None else sample.population_rows
+    report['total_columns'] = len(df.columns)
+    
+    numeric_means = profile.numeric_means() if sample is None else sample.estimates
+    overall_mean = None if sample is None else sample.overall_mean()
+    basic_summary = build_general_summary(report['total_entries'], df.columns, numeric_means, profile.categorical_cols,
+                                          overall_mean)
     
     report['general_summary'] = basic_summary
-    report['extended_context'] = extended_context  # This extended context is used for chatbot recommendations
-    col_recs = generate_column_specific_recommendations(df)
+    report['extended_context'] = build_extended_context(df.columns, df, basic_summary)  # This extended context is used for chatbot recommendations
+    with timer.stage("recommendations"):
+        col_recs = recommendations_from_stats(numeric_means, profile.categorical_nunique())
     report['column_specific_recommendations'] = col_recs
     report['business_recommendations'] = [f"{col}: {rec}" for col, rec in col_recs.items()]
     
-    processed_data, _, _ = preprocess_columns(df.copy())
-    prediction = get_model_prediction(processed_data, model)
+    with timer.stage("preprocess"):
+        processed_data = model_input(df, profile)
+    with timer.stage("predict"):
+        prediction = get_model_prediction(processed_data, current_model())
     report['prediction'] = prediction.tolist() if prediction is not None else "No prediction available"
     
     report['company_name'] = df["companyName"].iloc[0] if "companyName" in df.columns else "ConsumerReport"
+    if sample is not None:
+        # Predictions cover the sampled rows only
+        report['approximation'] = sample.to_dict()
     
     return report
 
-def generate_charts_per_column(df):
+def stream_consumer_report(source, chunk_rows=STREAM_CHUNK_ROWS):
+    """
+    Build the consumer report from a CSV file object in bounded memory.
+
+    Statistics come from running aggregates over fixed-size chunks; each chunk is
+    preprocessed and scored on its own, so only the predictions grow with the file.
+    Chunks are only scored when preprocessing is fixed (a model taking raw columns,
+    or the persisted artifact): fitting encoders and scaler per chunk would make
+    the predictions depend on where the chunks happen to break.
+    """
+    predictions = []
+    score_chunks = getattr(current_model(), "raw_input", False) or preprocessing_artifact is not None
+    if not score_chunks:
+        print("No fitted preprocessing for streamed uploads; skipping prediction.")
+
+    def predict_chunk(chunk):
+        processed_data = model_input(chunk)
+        prediction = get_model_prediction(processed_data, current_model())
+        if prediction is not None:
+            predictions.extend(prediction.tolist())
+
+    dataset = stream_csv_statistics(source, chunk_rows=chunk_rows, on_chunk=predict_chunk if score_chunks else None)
+    numeric_means = {col: dataset.columns[col].mean for col in dataset.numeric_cols}
+    categorical_nunique = {col: dataset.columns[col].nunique for col in dataset.categorical_cols}
+    report = report_from_stats(dataset.total_rows, list(dataset.columns), dataset.head, numeric_means,
+                               categorical_nunique, predictions)
+    return report, dataset
+
+def report_from_stats(total_rows, columns, head, numeric_means, categorical_nunique, predictions):
+    """Consumer report from per-column aggregates, for callers that never hold the whole frame."""
+    basic_summary = build_general_summary(total_rows, columns, numeric_means, list(categorical_nunique))
+    report = {}
+    report['total_entries'] = total_rows
+    report['total_columns'] = len(columns)
+    report['general_summary'] = basic_summary
+    report['extended_context'] = build_extended_context(columns, head, basic_summary)
+    col_recs = recommendations_from_stats(numeric_means, categorical_nunique)
+    report['column_specific_recommendations'] = col_recs
+    report['business_recommendations'] = [f"{col}: {rec}" for col, rec in col_recs.items()]
+    report['prediction'] = predictions if predictions else "No prediction available"
+    report['company_name'] = head["companyName"].iloc[0] if "companyName" in head.columns and len(head) else "ConsumerReport"
+    return report
+
+def histogram_figure(col, edges, counts):
+    """Plotly bar figure for pre-binned counts."""
+    import plotly.graph_objects as go
+    if edges is None:
+        return go.Figure(layout={"title": {"text": f"Distribution of {col}"}})
+    fig = go.Figure(go.Bar(x=(edges[:-1] + edges[1:]) / 2, y=counts, width=np.diff(edges), name=col))
+    fig.update_layout(title=f"Distribution of {col}", xaxis_title=col, yaxis_title="count", bargap=0)
+    return fig
+
+def generate_column_chart(df, column):
+    """Full Plotly figure JSON for one profiled column."""
+    import plotly.express as px  # Plotly is only imported once full charts are asked for
+    col = column.name
+    if column.is_numeric and column.scale != 1.0:
+        # A sample's histogram, scaled up to the whole file
+        fig = histogram_figure(col, column.bin_edges, column.bin_counts)
+    elif column.is_numeric:
+        fig = px.histogram(df, x=col, nbins=30, title=f"Distribution of {col}")
+    else:
+        # The profile keeps only the most frequent values; an unsampled frame is counted in full
+        counts = column.top_values() if column.scale != 1.0 else df[col].value_counts()
+        data = counts[counts > 0].reset_index()
+        data.columns = [col, "count"]
+        fig = px.bar(data, x=col, y="count", title=f"Frequency of {col}")
+    return fig.to_json()
+
+def generate_charts_per_column(df, profile=None):
+    if profile is None:
+        profile = profile_dataframe(df)
+    return {column.name: generate_column_chart(df, column) for column in profile}
+
+def generate_charts_from_stats(source, dataset, nbins=30, compact=False):
+    """Chart a streamed dataset from pre-binned histograms and value counts."""
+    import plotly.express as px
+    stream_csv_histograms(source, dataset, nbins=nbins)
+    if compact:
+        return {
+            col: histogram_payload(col, stats.bin_edges, stats.bin_counts, stats.nulls) if stats.numeric
+            else bar_payload(col, stats.top_values(), null_count=stats.nulls)
+            for col, stats in dataset.columns.items()
+        }
     charts = {}
-    for col in df.columns:
-        if pd.api.types.is_numeric_dtype(df[col]):
-            fig = px.histogram(df, x=col, nbins=30, title=f"Distribution of {col}")
+    for col, stats in dataset.columns.items():
+        if stats.numeric:
+            fig = histogram_figure(col, stats.bin_edges, stats.bin_counts)
         else:
-            data = df[col].value_counts().reset_index()
+            data = stats.top_values().reset_index()
             data.columns = [col, "count"]
             fig = px.bar(data, x=col, y="count", title=f"Frequency of {col}")
         charts[col] = fig.to_json()
     return charts
 
+def load_dataframe(contents, filename):
+    # The format comes from the file's magic bytes; the filename is only used in logs
+    df = read_upload(contents)
+    print(f"Parsed {filename} as {detect_format(contents[:8])}")
+    return df
+
+def run_analysis_pipeline(contents, filename, full_charts=True, approx=False, strata=None):
+    """
+    Full upload analysis; runs inside an analysis worker process.
+
+    With ``approx``, uploads over APPROX_SAMPLE_ABOVE_ROWS rows are analysed on
+    an APPROX_SAMPLE_ROWS-row sample, so everything after parsing takes bounded
+    time; the returned frame is then the sample.
+    """
+    timer = StageTimer()
+    with timer.stage("parse"):
+        df = load_dataframe(contents, filename)
+    print("Uploaded dataset shape:", df.shape)
+    sample = None
+    if approx:
+        # Checked whether or not this upload is big enough to be sampled, so the error does not depend on its size
+        check_strata(df.columns, strata)
+    if approx and len(df) > APPROX_SAMPLE_ABOVE_ROWS:
+        with timer.stage("sample"):
+            numeric_cols, _ = identify_features(df)
+            # .copy() so compacting the sample does not write through to the full frame
+            df, sample = sample_frame(df, numeric_cols, APPROX_SAMPLE_ROWS, strata)
+            df = df.copy()
+    if COMPACT_DTYPES:
+        with timer.stage("compact"):
+            compact_dtypes(df)
+    with timer.stage("profile"):
+        profile = profile_dataframe(df)
+        if sample is not None:
+            scale_profile(profile, sample.scale)
+    consumer_report = generate_consumer_report(df, timer, profile, sample)
+    charts_by_column = None
+    if full_charts:
+        with timer.stage("charts"):
+            charts_by_column = generate_charts_per_column(df, profile)
+    return df, profile, consumer_report, charts_by_column, timer.timings
+
+def stream_analysis_pipeline(source, compact_charts=False):
+    timer = StageTimer()
+    with timer.stage("stream_report"):
+        consumer_report, dataset = stream_consumer_report(source)
+    with timer.stage("charts"):
+        charts_by_column = generate_charts_from_stats(source, dataset, compact=compact_charts)
+    return consumer_report, charts_by_column, timer.timings
+
+async def analyze_upload(contents, filename, full_charts=True, approx=False, strata=None):
+    """
+    Parse and analyse an upload, reusing the cached result for identical bytes.
+
+    Full Plotly figures are only built when ``full_charts`` is set; a cached
+    analysis without them gets them added on first request. Approximate
+    analyses are cached apart from exact ones.
+    """
+    digest = await run_in_threadpool(content_digest, contents)
+    if approx:
+        digest = f"{digest}-approx-{strata or ''}"
+    entry = analysis_cache.get(digest)
+    if entry is None:
+        df, profile, consumer_report, charts_by_column, timings = await analysis_pool.run(
+            run_analysis_pipeline, contents, filename, full_charts, approx, strata)
+        print("Analysis stage timings (ms):", timings)
+        record_stages(timings)
+        record_analysis_rate(len(df), timings)
+        # Converted once here so paging /predictions slices an array instead of re-converting the list
+        predictions = await run_in_threadpool(as_array, consumer_report["prediction"])
+        entry = analysis_cache.put(digest, df, consumer_report, charts_by_column, timings, profile, predictions)
+    if full_charts and entry.charts is None:
+        with trace_stage("charts"):
+            charts_by_column = await analysis_pool.run_in_thread(generate_charts_per_column, entry.df, entry.profile)
+        entry = analysis_cache.put(digest, entry.df, entry.report, charts_by_column, entry.timings, entry.profile,
+                                   entry.predictions)
+    return entry
+
+async def read_upload_file(file, route):
+    with trace_stage("upload_read"):
+        contents = await file.read()
+    UPLOAD_BYTES.observe(len(contents), route=route)
+    return contents
+
+async def peek_format(file):
+    head = await file.read(8)
+    await file.seek(0)
+    return detect_format(head)
+
+# Bodies at least this big are compressed in the thread pool rather than on the event loop
+COMPRESS_OFFLOAD_MIN_BYTES = int(os.getenv("RESPONSE_COMPRESS_OFFLOAD_MIN_BYTES", str(64 * 1024)))
+
+async def json_response(content, route, accept_encoding=None):
+    """
+    Serialise with orjson inside the trace, compressing with the best coding
+    ``accept_encoding`` allows; the recorded size is what goes on the wire.
+
+    The body's size is only known once it is serialised, so ``dumps`` always
+    runs in the thread pool; compression of large bodies does too. Neither
+    holds up the event loop for a million-row response.
+    """
+    with trace_stage("serialize"):
+        body = await run_in_threadpool(dumps, content)
+    headers = {"Vary": "Accept-Encoding"}
+    encoding = negotiate_encoding(accept_encoding) if len(body) >= COMPRESS_MIN_BYTES else None
+    if encoding is not None:
+        with trace_stage("compress"):
+            if len(body) >= COMPRESS_OFFLOAD_MIN_BYTES:
+                body = await run_in_threadpool(compress, body, encoding)
+            else:
+                body = compress(body, encoding)
+        headers["Content-Encoding"] = encoding
+    RESPONSE_BYTES.observe(len(body), route=route)
+    return Response(body, media_type="application/json", headers=headers)
+
+def raw_charts(charts_by_column):
+    """Plotly figures are JSON text already; embed them as objects rather than escaped strings."""
+    return {col: RawJSON(figure_json) for col, figure_json in charts_by_column.items()}
+
+def report_predictions(consumer_report, mode):
+    if mode == "full":
+        return consumer_report
+    return {**consumer_report, "prediction": summarize_predictions(consumer_report["prediction"])}
+
+def busy_response(exc):
+    return HTTPException(status_code=503, detail=str(exc), headers={"Retry-After": str(exc.retry_after)})
+
 @app.post("/recommend-business")
-async def recommend_business(file: UploadFile = File(...)):
+async def recommend_business(request: Request, file: UploadFile = File(...), stream: bool = False,
+                             charts: str = "full", approx: bool = False, strata: str = None,
+                             predictions: str = "full"):
+    # charts=full embeds Plotly figures, compact sends pre-binned counts, lazy sends none and
+    # leaves the client to fetch each column from /charts/{analysis_id} (compact inline when
+    # the analysis could not be cached).
+    # approx=true samples large uploads (optionally stratified by one column) and reports confidence intervals.
+    # predictions=summary replaces the per-row predictions with summary statistics; the rows are
+    # then paged or downloaded in binary from /predictions/{analysis_id} (sent in full when the
+    # analysis could not be cached).
+    if charts not in CHART_MODES:
+        raise HTTPException(status_code=422, detail=f"charts must be one of {', '.join(CHART_MODES)}")
+    if predictions not in PREDICTION_MODES:
+        raise HTTPException(status_code=422, detail=f"predictions must be one of {', '.join(PREDICTION_MODES)}")
+    accept_encoding = request.headers.get("accept-encoding")
     try:
-        contents = await file.read()
-        if file.filename.endswith(".csv"):
-            df = pd.read_csv(io.BytesIO(contents))
-        else:
-            df = pd.read_excel(io.BytesIO(contents))
-        print("Uploaded dataset shape:", df.shape)
-        consumer_report = generate_consumer_report(df)
-        charts_by_column = generate_charts_per_column(df)
-        insights = {"total_entries": len(df), "total_columns": len(df.columns)}
-        return {
+        if stream and await peek_format(file) == "csv":
+            # Parse straight from the spooled upload in chunks; the file object stays in this process.
+            # Nothing is cached on this path, so lazy charts are served compact inline.
+            if file.size is not None:
+                UPLOAD_BYTES.observe(file.size, route="/recommend-business")
+            consumer_report, charts_by_column, timings = await analysis_pool.run_in_thread(
+                stream_analysis_pipeline, file.file, charts != "full")
+            record_stages(timings)
+            record_analysis_rate(consumer_report['total_entries'], timings)
+            insights = {"total_entries": consumer_report['total_entries'], "total_columns": consumer_report['total_columns']}
+            return await json_response({
+                "message": "File uploaded and analyzed successfully",
+                "insights": insights,
+                "consumer_report": report_predictions(consumer_report, predictions),
+                "charts_by_column": raw_charts(charts_by_column) if charts == "full" else charts_by_column,
+                "timings": timings
+            }, "/recommend-business", accept_encoding)
+        contents = await read_upload_file(file, "/recommend-business")
+        analysis = await analyze_upload(contents, file.filename, full_charts=charts == "full", approx=approx,
+                                        strata=strata)
+        df = analysis.df
+        insights = {"total_entries": analysis.report['total_entries'], "total_columns": len(df.columns)}
+        # An analysis too big for the cache cannot be fetched again, so neither its id nor a
+        # predictions URL is handed out; summary mode then sends the per-row predictions inline.
+        if not analysis.cached:
+            predictions = "full"
+        response = {
             "message": "File uploaded and analyzed successfully",
             "insights": insights,
-            "consumer_report": consumer_report,
-            "charts_by_column": charts_by_column
+            "consumer_report": report_predictions(analysis.report, predictions),
+            "timings": analysis.timings
         }
+        if analysis.cached:
+            response["analysis_id"] = analysis.digest
+        if predictions == "summary":
+            response["predictions_url"] = f"/predictions/{analysis.digest}"
+        if charts == "full":
+            response["charts_by_column"] = raw_charts(analysis.charts)
+        elif charts == "compact" or not analysis.cached:
+            with trace_stage("compact_charts"):
+                response["charts_by_column"] = compact_charts(analysis.profile)
+        else:
+            response["chart_columns"] = analysis.profile.column_names
+        return await json_response(response, "/recommend-business", accept_encoding)
+    except WorkerPoolFull as e:
+        raise busy_response(e)
+    except BrokenProcessPool:
+        # The worker died under this upload; the pool is restarting behind it
+        HANDLER_ERRORS.inc(handler="recommend_business")
+        raise HTTPException(status_code=503, detail="An analysis worker crashed; retry shortly",
+                            headers={"Retry-After": str(analysis_pool.retry_after)})
+    except SamplingError as e:
+        raise HTTPException(status_code=422, detail=str(e))
     except Exception as e:
         print("Error in /recommend-business:", e)
+        HANDLER_ERRORS.inc(handler="recommend_business")
         return {"error": "An internal error occurred while processing the file."}
 
+def run_batch_member(member):
+    """Analyse one batch member in a worker process; returns only what the NDJSON line and the summary need."""
+    timer = StageTimer()
+    with timer.stage("parse"):
+        df = member.read()
+    if COMPACT_DTYPES:
+        with timer.stage("compact"):
+            compact_dtypes(df)
+    with timer.stage("profile"):
+        profile = profile_dataframe(df)
+    consumer_report = generate_consumer_report(df, timer, profile)
+    with timer.stage("compact_charts"):
+        charts_by_column = compact_charts(profile)
+    return {
+        "member": member.name,
+        "insights": {"total_entries": len(df), "total_columns": len(df.columns)},
+        "consumer_report": consumer_report,
+        "charts_by_column": charts_by_column,
+        "timings": timer.timings,
+    }, member_stats(profile)
+
+def ndjson_line(data):
+    return dumps(data) + b"\n"
+
+@app.post("/recommend-business/batch")
+async def recommend_business_batch(file: UploadFile = File(...)):
+    """
+    Analyse every file of a zip archive, or every sheet of a workbook, in parallel.
+
+    The response is NDJSON: one ``member`` line per member as soon as its
+    analysis finishes (``error`` lines for members that fail), then a final
+    ``summary`` line combining the members' statistics. Members are spread over
+    the analysis workers, at most one worker's worth per member at a time.
+    """
+    contents = await read_upload_file(file, "/recommend-business/batch")
+    try:
+        with trace_stage("batch_split"):
+            members = await run_in_threadpool(split_batch, contents)
+    except BatchError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    del contents
+    # Leave queue room for single uploads: a batch never holds more than one slot per worker
+    slots = asyncio.Semaphore(max(analysis_pool.max_workers, 1))
+
+    async def analyse(member):
+        async with slots:
+            while True:
+                try:
+                    return member, await analysis_pool.run(run_batch_member, member), None
+                except WorkerPoolFull as e:
+                    # Single uploads filled the queue; a batch member waits its turn rather than failing
+                    await asyncio.sleep(e.retry_after)
+                except Exception as e:
+                    return member, None, e
+
+    async def lines():
+        tasks = [asyncio.ensure_future(analyse(member)) for member in members]
+        results = {}
+        start = time.perf_counter()
+        try:
+            yield ndjson_line({"type": "start", "members": [member.name for member in members]})
+            for done in asyncio.as_completed(tasks):
+                member, outcome, error = await done
+                if error is not None:
+                    print(f"Error analysing batch member {member.name}:", error)
+                    HANDLER_ERRORS.inc(handler="recommend_business_batch")
+                    yield ndjson_line({"type": "error", "member": member.name, "error": str(error)})
+                    continue
+                result, stats = outcome
+                results[result["member"]] = stats
+                # The body outlives the request trace, so stages are observed directly
+                for name, elapsed_ms in result["timings"].items():
+                    STAGE_SECONDS.observe(elapsed_ms / 1000, stage=name)
+                record_analysis_rate(result["insights"]["total_entries"], result["timings"])
+                yield ndjson_line({"type": "member", **result})
+            summary = combine_member_stats({member.name: results[member.name] for member in members
+                                            if member.name in results})
+            summary["failed"] = [member.name for member in members if member.name not in results]
+            summary["elapsed_ms"] = round((time.perf_counter() - start) * 1000, 3)
+            yield ndjson_line({"type": "summary", **summary})
+        finally:
+            for task in tasks:
+                task.cancel()
+            discard_batch(members)
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.get("/charts/{analysis_id}")
+async def column_chart(analysis_id: str, column: str, format: str = "compact"):
+    """One column's chart from a cached analysis, built on first request."""
+    entry = analysis_cache.get(analysis_id)
+    if entry is None:
+        raise HTTPException(status_code=404, detail="Analysis not found or expired; upload the file again")
+    if column not in entry.profile.columns:
+        raise HTTPException(status_code=404, detail=f"Unknown column: {column}")
+    if format == "compact":
+        return compact_chart(entry.profile[column])
+    if format != "full":
+        raise HTTPException(status_code=422, detail="format must be compact or full")
+    if entry.charts is not None:
+        figure_json = entry.charts[column]
+    else:
+        try:
+            figure_json = await analysis_pool.run_in_thread(generate_column_chart, entry.df, entry.profile[column])
+        except WorkerPoolFull as e:
+            raise busy_response(e)
+    # Already serialized by Plotly; send as-is rather than re-encoding it as a string
+    return Response(content=figure_json, media_type="application/json")
+
+@app.get("/predictions/{analysis_id}")
+async def prediction_rows(request: Request, analysis_id: str, offset: int = 0, limit: int = PREDICTION_PAGE_ROWS,
+                          format: str = "json"):
+    """
+    Per-row predictions of a cached analysis: a JSON page with a link to the
+    next one, or the requested slice as a NumPy .npy file or an Arrow IPC stream.
+    """
+    check_page_params(offset, limit, format)
+    entry = analysis_cache.get(analysis_id)
+    if entry is None:
+        raise HTTPException(status_code=404, detail="Analysis not found or expired; upload the file again")
+    values = entry.predictions
+    if values is None:
+        raise HTTPException(status_code=404, detail="This analysis has no predictions")
+    return await prediction_page(values[offset:offset + limit], len(values), offset, limit, format,
+                                 f"/predictions/{analysis_id}", "/predictions/{analysis_id}",
+                                 request.headers.get("accept-encoding"))
+
+def check_page_params(offset, limit, format):
+    if format not in PREDICTION_FORMATS:
+        raise HTTPException(status_code=422, detail=f"format must be one of {', '.join(PREDICTION_FORMATS)}")
+    if offset < 0 or limit < 1:
+        raise HTTPException(status_code=422, detail="offset must be >= 0 and limit >= 1")
+
+async def prediction_page(page, total, offset, limit, format, url, route, accept_encoding=None):
+    """One page of per-row predictions: JSON with a link to the next page, or binary with X-Total-Count."""
+    if format != "json":
+        body, media_type = encode_predictions(page, format)
+        return Response(body, media_type=media_type, headers={"X-Total-Count": str(total)})
+    end = offset + len(page)
+    return await json_response({
+        "offset": offset,
+        "total": total,
+        "predictions": page,
+        "next": f"{url}?offset={end}&limit={limit}" if end < total else None,
+    }, route, accept_encoding)
+
+def build_report_html(consumer_report):
+    html_content = (
+        "<html><head><meta charset='utf-8'><title>Consumer Report</title></head><body>"
+        f"<h1>Consumer Shopping Behaviour Report</h1>"
+        f"<p>{consumer_report['general_summary']}</p>"
+        "<h2>Column-Specific Business Recommendations</h2><ul>"
+    )
+    for col, rec in consumer_report['column_specific_recommendations'].items():
+        html_content += f"<li><strong>{col}:</strong> {rec}</li>"
+    html_content += (
+        "</ul>"
+        f"<h2>Prediction</h2><p>{consumer_report['prediction']}</p>"
+        "</body></html>"
+    )
+    return html_content
+
+def submit_report_job(contents, filename):
+    async def produce():
+        consumer_report = (await analyze_upload(contents, filename, full_charts=False)).report
+        return build_report_html(consumer_report), f"{consumer_report['company_name']}_Report.pdf"
+    return report_jobs.submit(produce)
+
+def report_job_status(job):
+    return {
+        **job.to_dict(),
+        "status_url": f"/reports/{job.job_id}",
+        "download_url": f"/reports/{job.job_id}/download",
+    }
+
+@app.post("/reports", status_code=202)
+async def submit_report(file: UploadFile = File(...)):
+    """Queue a PDF report; poll the status URL and fetch the PDF from the download URL."""
+    contents = await read_upload_file(file, "/reports")
+    try:
+        job = submit_report_job(contents, file.filename)
+    except WorkerPoolFull as e:
+        raise busy_response(e)
+    return report_job_status(job)
+
+@app.get("/reports/stats")
+async def report_job_stats():
+    return report_jobs.stats()
+
+@app.get("/reports/{job_id}")
+async def report_status(job_id: str):
+    job = report_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired report job")
+    return report_job_status(job)
+
+@app.get("/reports/{job_id}/download")
+async def download_report(job_id: str):
+    job = report_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired report job")
+    if job.status == "failed":
+        return JSONResponse(status_code=500, content={"error": job.error})
+    if job.status != "done":
+        raise HTTPException(status_code=409, detail=f"Report is not ready (status: {job.status})")
+    return FileResponse(report_jobs.result_path(job_id), media_type="application/pdf",
+                        filename=job.download_name)
+
 @app.post("/download-report-pdf")
 async def download_report_pdf(file: UploadFile = File(...)):
+    # Same job queue as /reports, but the request waits for the PDF
     try:
-        contents = await file.read()
-        if file.filename.endswith(".csv"):
-            df = pd.read_csv(io.BytesIO(contents))
-        else:
-            df = pd.read_excel(io.BytesIO(contents))
-        consumer_report = generate_consumer_report(df)
-        charts_by_column = generate_charts_per_column(df)
-        
-        html_content = (
-            "<html><head><meta charset='utf-8'><title>Consumer Report</title></head><body>"
-            f"<h1>Consumer Shopping Behaviour Report</h1>"
-            f"<p>{consumer_report['general_summary']}</p>"
-            "<h2>Column-Specific Business Recommendations</h2><ul>"
-        )
-        for col, rec in consumer_report['column_specific_recommendations'].items():
-            html_content += f"<li><strong>{col}:</strong> {rec}</li>"
-        html_content += (
-            "</ul>"
-            f"<h2>Prediction</h2><p>{consumer_report['prediction']}</p>"
-            "</body></html>"
-        )
-        
-        wkhtmltopdf_path = "C:\\Program Files\\wkhtmltopdf\\bin\\wkhtmltopdf.exe"
-        config = pdfkit.configuration(wkhtmltopdf=wkhtmltopdf_path)
-        options = {"encoding": "UTF-8", "quiet": "", "disable-smart-shrinking": ""}
-        pdf = pdfkit.from_string(html_content, False, options=options, configuration=config)
-        
-        filename = f"{consumer_report['company_name']}_Report.pdf"
+        contents = await read_upload_file(file, "/download-report-pdf")
+        job = await report_jobs.wait(submit_report_job(contents, file.filename).job_id)
+        if job is None or job.status != "done":
+            raise RuntimeError(job.error if job is not None else "report job expired")
+        with open(report_jobs.result_path(job.job_id), "rb") as handle:
+            pdf = handle.read()
         return Response(content=pdf,
                         media_type="application/pdf",
-                        headers={"Content-Disposition": f"attachment; filename={filename}"})
+                        headers={"Content-Disposition": f"attachment; filename={job.download_name}"})
+    except WorkerPoolFull as e:
+        raise busy_response(e)
     except Exception as e:
         print("Error generating PDF report:", e)
+        HANDLER_ERRORS.inc(handler="download_report_pdf")
         return {"error": "An internal error occurred while generating the PDF."}
 
+def session_report(session):
+    """Report from the session's sketches; predictions appear as their summary, never one value per row."""
+    with session.lock:
+        summary = session.predictions.summary() if session.predictions.count else None
+        return report_from_stats(session.total_rows, list(session.columns), session.head, session.numeric_means(),
+                                 session.categorical_nunique(), summary)
+
+def session_charts(session):
+    charts = {}
+    with session.lock:
+        for col, sketch in session.columns.items():
+            if sketch.numeric:
+                edges, counts = sketch.histogram()
+                charts[col] = histogram_payload(col, edges, counts, sketch.null_count)
+            else:
+                top = sketch.top.top()
+                charts[col] = bar_payload(col, top, null_count=sketch.null_count, total=sketch.count,
+                                          other_categories=max(sketch.nunique - min(len(top), CHART_TOP_N), 0))
+    return charts
+
+def append_to_session(session, contents, filename):
+    """Parse, score and sketch one upload; only the new rows are touched."""
+    timer = StageTimer()
+    with timer.stage("parse"):
+        df = load_dataframe(contents, filename)
+    if COMPACT_DTYPES:
+        with timer.stage("compact"):
+            compact_dtypes(df)
+    with timer.stage("predict"):
+        prediction = get_model_prediction(model_input(df), current_model())
+    with timer.stage("sketch"):
+        with session.lock:
+            session.append(df, prediction.tolist() if prediction is not None else None)
+    return timer.timings
+
+def session_body(session):
+    body = {
+        "session_id": session.session_id,
+        "uploads": session.uploads,
+        "insights": {"total_entries": session.total_rows, "total_columns": len(session.columns)},
+        "consumer_report": session_report(session),
+        "charts_by_column": session_charts(session),
+    }
+    if session.prediction_rows.count:
+        body["predictions_url"] = f"/sessions/{session.session_id}/predictions"
+    return body
+
+async def session_response(session, contents, filename, route, status_code=200, accept_encoding=None):
+    timings = await analysis_pool.run_in_thread(append_to_session, session, contents, filename)
+    record_stages(timings)
+    with trace_stage("report"):
+        body = session_body(session)
+    response = await json_response({**body, "timings": timings}, route, accept_encoding)
+    response.status_code = status_code
+    return response
+
+def get_session_or_404(session_id):
+    session = session_store.get(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Session not found or expired")
+    return session
+
+@app.post("/sessions")
+async def create_session(request: Request, file: UploadFile = File(...)):
+    """Start a dataset session from a first upload; later exports are added with /sessions/{id}/append."""
+    contents = await read_upload_file(file, "/sessions")
+    try:
+        return await session_response(session_store.create(), contents, file.filename, "/sessions", 201,
+                                      request.headers.get("accept-encoding"))
+    except WorkerPoolFull as e:
+        raise busy_response(e)
+
+@app.post("/sessions/{session_id}/append")
+async def append_session(request: Request, session_id: str, file: UploadFile = File(...)):
+    """Fold only the new rows into the session's sketches and return the updated report."""
+    session = get_session_or_404(session_id)
+    contents = await read_upload_file(file, "/sessions/{session_id}/append")
+    try:
+        return await session_response(session, contents, file.filename, "/sessions/{session_id}/append",
+                                      accept_encoding=request.headers.get("accept-encoding"))
+    except WorkerPoolFull as e:
+        raise busy_response(e)
+
+@app.get("/sessions/stats")
+async def session_stats():
+    return session_store.stats()
+
+@app.get("/sessions/{session_id}")
+async def session_status(request: Request, session_id: str):
+    session = get_session_or_404(session_id)
+    return await json_response(session_body(session), "/sessions/{session_id}", request.headers.get("accept-encoding"))
+
+@app.get("/sessions/{session_id}/predictions")
+async def session_prediction_rows(request: Request, session_id: str, offset: int = 0,
+                                  limit: int = PREDICTION_PAGE_ROWS, format: str = "json"):
+    """Per-row predictions of every upload in the session, paged like /predictions/{analysis_id}."""
+    check_page_params(offset, limit, format)
+    session = get_session_or_404(session_id)
+    with session.lock:
+        total = session.prediction_rows.count
+    if total == 0:
+        raise HTTPException(status_code=404, detail="This session has no predictions")
+    try:
+        # Appends only extend the file, so the first ``total`` rows can be read without the lock
+        page = await run_in_threadpool(session.prediction_rows.read, offset, min(limit, max(total - offset, 0)))
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Session not found or expired")
+    return await prediction_page(page, total, offset, limit, format, f"/sessions/{session_id}/predictions",
+                                 "/sessions/{session_id}/predictions", request.headers.get("accept-encoding"))
+
+@app.delete("/sessions/{session_id}")
+async def delete_session(session_id: str):
+    if not session_store.delete(session_id):
+        raise HTTPException(status_code=404, detail="Session not found or expired")
+    return {"deleted": session_id}
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    return Response(registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/analysis-cache/stats")
+async def analysis_cache_stats():
+    return analysis_cache.stats()
+
+@app.get("/model/stats")
+async def model_stats():
+    if model is None:
+        return {"loaded": False, "loading": not artifacts_loaded, "error": model_load_error}
+    return {"loaded": True, **model.stats()}
+
+@app.get("/healthz")
+async def healthz():
+    """Liveness: the process is up and its event loop answers, loaded or not."""
+    return {"status": "ok", "import_seconds": IMPORT_SECONDS,
+            "uptime_seconds": round(time.perf_counter() - IMPORT_STARTED, 3)}
+
+@app.get("/readyz")
+async def readyz():
+    """Readiness: 200 once the model and preprocessing artifact are loaded and the analysis workers are up."""
+    ready = artifacts_loaded and (model is not None or READY_WITHOUT_MODEL) and analysis_pool.ready
+    return JSONResponse(status_code=200 if ready else 503, content={
+        "ready": ready,
+        "import_seconds": IMPORT_SECONDS,
+        "artifacts_loaded": artifacts_loaded,
+        "workers_ready": analysis_pool.ready,
+        "model_loaded": model is not None,
+        "model_error": model_load_error,
+        "preprocessing_artifact": preprocessing_artifact is not None,
+        **startup_timings,
+    })
+
+@app.get("/workers/stats")
+async def analysis_worker_stats():
+    return analysis_pool.stats()
+
+@app.get("/gemini-chatbot/cache/stats")
+async def gemini_cache_stats():
+    return gemini_client.cache.stats()
+
 # Define a request model for the chatbot endpoint.
 class ChatbotRequest(BaseModel):
     query: str
     datasetContext: str  # This will receive the extended context
     customerSegments: list
 
-def call_gemini_ai(prompt):
+async def call_gemini_ai(prompt, cache_key=None):
     gemini_api_key = os.getenv("GEMINI_API_KEY")
     if not gemini_api_key:
         raise HTTPException(status_code=500, detail="Gemini API key not configured")
-    
-    headers = {"Content-Type": "application/json"}
-    gemini_api_url_base = os.getenv("GEMINI_API_URL", "https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent")
-    gemini_api_url = f"{gemini_api_url_base}?key={gemini_api_key}"
-    
-    payload = {
-        "contents": [
-            {"parts": [{"text": prompt}]}
-        ]
-    }
-    
-    print("Calling Gemini API at:", gemini_api_url)
-    print("Payload:", payload)
-    
-    response = requests.post(gemini_api_url, headers=headers, json=payload)
-    print("Gemini API response:", response.text)
-    
-    if response.status_code == 200:
-        data = response.json()
-        candidates = data.get("candidates")
-        if isinstance(candidates, list) and len(candidates) > 0:
-            candidate = candidates[0]
-            # First check if there is a "content" key
-            if "content" in candidate:
-                candidate_content = candidate["content"]
-                parts = candidate_content.get("parts")
-            else:
-                parts = candidate.get("parts")
-            extracted_text = ""
-            if isinstance(parts, list):
-                for part in parts:
-                    if isinstance(part, dict):
-                        extracted_text += part.get("text", "") + " "
-                    else:
-                        extracted_text += str(part) + " "
-                extracted_text = extracted_text.strip()
-                if not extracted_text or extracted_text.lower() == "none":
-                    return "I'm sorry, I wasn't able to generate a recommendation. Please try again."
-                return extracted_text
-            else:
-                text = str(parts)
-                if not text or text.lower() == "none":
-                    return "I'm sorry, I wasn't able to generate a recommendation. Please try again."
-                return text
-        else:
-            return "No response from Gemini AI"
-    else:
-        raise HTTPException(status_code=500, detail=f"Error contacting Gemini AI API: {response.text}")
+    try:
+        with trace_stage("gemini"):
+            return await gemini_client.generate(prompt, gemini_api_key, cache_key)
+    except GeminiError as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/gemini-chatbot")
-async def gemini_chatbot_endpoint(chat_request: ChatbotRequest):
+def build_chatbot_prompt(chat_request):
     # Build the prompt using the extended dataset context for better detail.
-    constext = chat_request.datasetContext;
-    prompt = (
+    return (
         f"Based on the detailed dataset information provided below, answer the user query with actionable business recommendations.\n\n"
         f"Dataset Details:\n{chat_request.datasetContext}\n\n"
         f"Key Customer Segments: {', '.join(chat_request.customerSegments) if chat_request.customerSegments else 'Not provided'}\n\n"
         f"User Query: {chat_request.query}\n\n"
         "Your answer should provide specific, step-by-step recommendations for increasing revenue, expanding operations, launching promotions, and improving sales."
     )
+
+def chatbot_cache_key(chat_request):
+    return prompt_cache_key(chat_request.query, chat_request.datasetContext, chat_request.customerSegments)
+
+@app.post("/gemini-chatbot")
+async def gemini_chatbot_endpoint(chat_request: ChatbotRequest):
+    prompt = build_chatbot_prompt(chat_request)
     try:
-        gemini_response = call_gemini_ai(prompt)
+        gemini_response = await call_gemini_ai(prompt, chatbot_cache_key(chat_request))
         return {"response": gemini_response}
     except Exception as e:
         return {"response": f"Error: {str(e)}"}
 
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.post("/gemini-chatbot/stream")
+async def gemini_chatbot_stream_endpoint(chat_request: ChatbotRequest):
+    """
+    Server-sent events: ``token`` events carry text as Gemini produces it, then a
+    ``done`` event reports time-to-first-token and total time (or ``error``).
+    """
+    gemini_api_key = os.getenv("GEMINI_API_KEY")
+    if not gemini_api_key:
+        raise HTTPException(status_code=500, detail="Gemini API key not configured")
+    prompt = build_chatbot_prompt(chat_request)
+    cache_key = chatbot_cache_key(chat_request)
+
+    async def events():
+        start = time.perf_counter()
+        ttft_ms = None
+        try:
+            async for text in gemini_client.stream_generate(prompt, gemini_api_key, cache_key):
+                if ttft_ms is None:
+                    ttft_ms = (time.perf_counter() - start) * 1000
+                yield sse_event("token", {"text": text})
+            if ttft_ms is None:
+                yield sse_event("token", {"text": NO_RECOMMENDATION})
+            total_ms = (time.perf_counter() - start) * 1000
+            # The stream outlives the request trace, so it is observed directly
+            STAGE_SECONDS.observe(total_ms / 1000, stage="gemini_stream")
+            if ttft_ms is not None:
+                STAGE_SECONDS.observe(ttft_ms / 1000, stage="gemini_stream_ttft")
+            yield sse_event("done", {"ttft_ms": None if ttft_ms is None else round(ttft_ms, 3),
+                                     "total_ms": round(total_ms, 3)})
+        except Exception as e:
+            yield sse_event("error", {"error": str(e)})
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.get("/gemini-chatbot/stream/stats")
+async def gemini_stream_stats():
+    return gemini_client.stream_stats()
+
+IMPORT_SECONDS = round(time.perf_counter() - IMPORT_STARTED, 4)
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="127.0.0.1", port=8000)
@@ -0,0 +1,212 @@
+# metrics.py
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Seconds; covers sub-millisecond stages up to multi-minute uploads
+DURATION_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+SIZE_BUCKETS = tuple(1024 * 4 ** i for i in range(12))  # 1 KiB .. 4 GiB
+RATE_BUCKETS = (1e2, 1e3, 1e4, 5e4, 1e5, 5e5, 1e6, 5e6, 1e7)
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+def _format_value(value):
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Counter:
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus text format."""
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DURATION_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def snapshot(self, **labels):
+        """``(count, sum)`` for one label set."""
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            return (0, 0.0) if series is None else (series[2], series[1])
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += bucket_count
+                    le = "+Inf" if bound == float("inf") else _format_value(bound)
+                    lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, [('le', le)])} {cumulative}")
+                labels = _format_labels(self.labelnames, key)
+                lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+                lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Process-local metrics rendered for a Prometheus scrape.
+
+    Each uvicorn worker keeps its own registry, so scrape every worker (or run
+    one per pod). Analysis stages timed inside worker processes are reported
+    back with the result and recorded here by the API process.
+    """
+
+    def __init__(self):
+        self._metrics = []
+
+    def counter(self, name, help_text, labelnames=()):
+        metric = Counter(name, help_text, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, help_text, labelnames=(), buckets=DURATION_BUCKETS):
+        metric = Histogram(name, help_text, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+REQUEST_SECONDS = registry.histogram(
+    "marketpulse_request_duration_seconds", "HTTP request latency by route.", ("method", "route", "status"))
+STAGE_SECONDS = registry.histogram(
+    "marketpulse_stage_duration_seconds", "Time spent in each request stage.", ("stage",))
+UPLOAD_BYTES = registry.histogram(
+    "marketpulse_upload_bytes", "Size of uploaded files.", ("route",), SIZE_BUCKETS)
+RESPONSE_BYTES = registry.histogram(
+    "marketpulse_response_bytes", "Size of serialised response bodies.", ("route",), SIZE_BUCKETS)
+ANALYSIS_ROWS_PER_SECOND = registry.histogram(
+    "marketpulse_analysis_rows_per_second", "Rows analysed per second of analysis time.", (), RATE_BUCKETS)
+HANDLER_ERRORS = registry.counter(
+    "marketpulse_handler_errors_total", "Errors caught and reported by endpoint handlers.", ("handler",))
+
+_current_trace = ContextVar("request_trace", default=None)
+
+
+class RequestTrace:
+    """Stage timings (milliseconds) collected while one request is handled."""
+
+    def __init__(self):
+        self.stages = {}
+        self.started = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, (time.perf_counter() - start) * 1000)
+
+    def add(self, name, elapsed_ms):
+        self.stages[name] = round(self.stages.get(name, 0.0) + elapsed_ms, 3)
+
+    def add_stages(self, timings):
+        for name, elapsed_ms in timings.items():
+            self.add(name, elapsed_ms)
+
+    def server_timing(self):
+        """``Server-Timing`` header value, e.g. ``parse;dur=12.5, predict;dur=3.1, total;dur=20.4``."""
+        total = (time.perf_counter() - self.started) * 1000
+        entries = [f"{name};dur={elapsed_ms:.3f}" for name, elapsed_ms in self.stages.items()]
+        entries.append(f"total;dur={total:.3f}")
+        return ", ".join(entries)
+
+    def observe(self):
+        for name, elapsed_ms in self.stages.items():
+            STAGE_SECONDS.observe(elapsed_ms / 1000, stage=name)
+
+
+def start_trace():
+    trace = RequestTrace()
+    return trace, _current_trace.set(trace)
+
+
+def end_trace(token):
+    _current_trace.reset(token)
+
+
+def current_trace():
+    return _current_trace.get()
+
+
+@contextmanager
+def trace_stage(name):
+    """Time a block into the current request's trace; outside a request it is observed directly."""
+    trace = current_trace()
+    if trace is not None:
+        with trace.stage(name):
+            yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - start, stage=name)
+
+
+def record_stages(timings):
+    """Merge stage timings reported by a worker process into the current trace."""
+    trace = current_trace()
+    if trace is not None:
+        trace.add_stages(timings)
+    else:
+        for name, elapsed_ms in timings.items():
+            STAGE_SECONDS.observe(elapsed_ms / 1000, stage=name)
+
+
+def record_analysis_rate(rows, timings):
+    elapsed_ms = sum(timings.values())
+    if rows and elapsed_ms > 0:
+        ANALYSIS_ROWS_PER_SECOND.observe(rows / (elapsed_ms / 1000))
@@ -0,0 +1,187 @@
+# model_registry.py
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+MODEL_DIR = os.path.dirname(os.path.abspath(__file__))
+# moneypulse_model_v2.xgb is a byte-identical copy of this joblib pickle
+DEFAULT_MODEL_FILE = "moneypulse_model_v2.joblib"
+# Rows scored per booster call
+MODEL_BATCH_SIZE = int(os.getenv("MODEL_BATCH_SIZE", "65536"))
+# Input features for models that do not record their own, in a fixed order
+MODEL_FEATURES = ("Purchase_Amount", "Frequency_of_Purchase", "Price_per_Hour", "Research_Effectiveness")
+
+PICKLE_MAGIC = b"\x80"
+
+
+def resolve_model_path(path=None):
+    """MODEL_PATH or the bundled model, relative paths taken from this module's directory."""
+    path = path or os.getenv("MODEL_PATH", DEFAULT_MODEL_FILE)
+    return path if os.path.isabs(path) else os.path.join(MODEL_DIR, path)
+
+
+class RegisteredModel:
+    """
+    An XGBoost booster with a pinned feature order and optional fitted input transformer.
+
+    ``predict`` reindexes the frame to ``feature_names`` (filling absent columns
+    with ``feature_defaults``), runs the transformer if there is one, and scores
+    fixed-size batches with ``inplace_predict`` on float32 matrices. Sparse
+    transformer output stays CSR so absent one-hot entries keep XGBoost's
+    missing-value semantics.
+    """
+
+    def __init__(self, booster, feature_names, transformer=None, feature_defaults=None,
+                 categorical_features=(), iteration_range=(0, 0), path=None):
+        self.booster = booster
+        self.feature_names = tuple(feature_names)
+        self.transformer = transformer
+        self.feature_defaults = feature_defaults or {}
+        self.categorical_features = tuple(categorical_features)
+        self.iteration_range = iteration_range
+        self.path = path
+        self.load_seconds = 0.0
+        self.warmup_ms = None
+        self._lock = threading.Lock()
+        self._batches = 0
+        self._rows = 0
+        self._batch_ms_total = 0.0
+        self._last_batch_ms = None
+
+    @property
+    def raw_input(self):
+        """True when the model carries its own fitted preprocessing and wants raw upload columns."""
+        return self.transformer is not None
+
+    def _prepare(self, frame):
+        missing = [col for col in self.feature_names if col not in frame.columns]
+        frame = frame.reindex(columns=list(self.feature_names))
+        for col in missing:
+            frame[col] = self.feature_defaults.get(col, 0)
+        for col in self.categorical_features:
+            if not pd.api.types.is_object_dtype(frame[col]):
+                frame[col] = frame[col].astype(str)
+        return frame
+
+    def _to_matrix(self, batch):
+        import scipy.sparse as sp
+        if self.transformer is not None:
+            # Compacted float32 columns are scaled in float64, as the transformer was fitted
+            narrow = {col: np.float64 for col, dtype in batch.dtypes.items() if dtype == np.float32}
+            batch = self.transformer.transform(batch.astype(narrow) if narrow else batch)
+        else:
+            batch = batch.to_numpy(dtype=np.float32, na_value=np.nan)
+        if sp.issparse(batch):
+            return sp.csr_matrix(batch, dtype=np.float32)
+        return np.ascontiguousarray(batch, dtype=np.float32)
+
+    def predict(self, frame, batch_size=MODEL_BATCH_SIZE):
+        frame = self._prepare(frame)
+        outputs = []
+        for start in range(0, len(frame), batch_size):
+            batch_start = time.perf_counter()
+            matrix = self._to_matrix(frame.iloc[start:start + batch_size])
+            outputs.append(self.booster.inplace_predict(matrix, iteration_range=self.iteration_range))
+            self._record_batch(matrix.shape[0], (time.perf_counter() - batch_start) * 1000)
+        if not outputs:
+            return np.empty(0, dtype=np.float32)
+        return np.concatenate(outputs)
+
+    def _record_batch(self, rows, elapsed_ms):
+        with self._lock:
+            self._batches += 1
+            self._rows += rows
+            self._batch_ms_total += elapsed_ms
+            self._last_batch_ms = elapsed_ms
+
+    def warm_up(self):
+        """Score one default row so the first request doesn't pay for lazy initialisation."""
+        row = pd.DataFrame({col: [self.feature_defaults.get(col, 0)] for col in self.feature_names})
+        start = time.perf_counter()
+        self.predict(row)
+        self.warmup_ms = (time.perf_counter() - start) * 1000
+        return self.warmup_ms
+
+    def stats(self):
+        with self._lock:
+            return {
+                "path": self.path,
+                "features": len(self.feature_names),
+                "raw_input": self.raw_input,
+                "load_seconds": round(self.load_seconds, 4),
+                "warmup_ms": None if self.warmup_ms is None else round(self.warmup_ms, 3),
+                "batches": self._batches,
+                "rows": self._rows,
+                "last_batch_ms": None if self._last_batch_ms is None else round(self._last_batch_ms, 3),
+                "mean_batch_ms": round(self._batch_ms_total / self._batches, 3) if self._batches else None,
+            }
+
+
+def _column_transformer_inputs(transformer, feature_names):
+    """Categorical columns and neutral fill values from a fitted ColumnTransformer."""
+    defaults, categorical = {}, []
+    for _, step, columns in getattr(transformer, "transformers_", []):
+        if isinstance(step, str):
+            continue
+        columns = [feature_names[c] if isinstance(c, (int, np.integer)) else c for c in columns]
+        if hasattr(step, "categories_"):
+            categorical.extend(columns)
+            defaults.update({col: "Unknown" for col in columns})
+        elif hasattr(step, "mean_"):
+            # The training mean scales to zero, i.e. no signal
+            defaults.update({col: float(mean) for col, mean in zip(columns, step.mean_)})
+    return defaults, categorical
+
+
+def _iteration_range(estimator):
+    try:
+        return (0, int(estimator.best_iteration) + 1)
+    except (AttributeError, TypeError):
+        return (0, 0)
+
+
+def _from_artifact(artifact, path):
+    import xgboost as xgb
+    if isinstance(artifact, xgb.Booster):
+        return RegisteredModel(artifact, artifact.feature_names or MODEL_FEATURES, path=path)
+    if isinstance(artifact, xgb.XGBModel):
+        booster = artifact.get_booster()
+        names = booster.feature_names or getattr(artifact, "feature_names_in_", None)
+        return RegisteredModel(booster, MODEL_FEATURES if names is None else names,
+                               iteration_range=_iteration_range(artifact), path=path)
+    steps = getattr(artifact, "steps", None)
+    if steps and isinstance(steps[-1][1], xgb.XGBModel):
+        feature_names = list(artifact.feature_names_in_)
+        transformer = artifact[:-1]
+        defaults, categorical = {}, []
+        for _, step in steps[:-1]:
+            step_defaults, step_categorical = _column_transformer_inputs(step, feature_names)
+            defaults.update(step_defaults)
+            categorical.extend(step_categorical)
+        estimator = steps[-1][1]
+        return RegisteredModel(estimator.get_booster(), feature_names, transformer=transformer,
+                               feature_defaults=defaults, categorical_features=categorical,
+                               iteration_range=_iteration_range(estimator), path=path)
+    raise TypeError(f"Unsupported model artifact {type(artifact).__name__} in {path}")
+
+
+def load_model(path=None, warm_up=True):
+    """Load a joblib-pickled XGBoost model or pipeline, or a native booster file, and warm it up."""
+    # joblib, scikit-learn and xgboost are imported here rather than when the server module loads
+    import joblib
+    import xgboost as xgb
+    path = resolve_model_path(path)
+    start = time.perf_counter()
+    with open(path, "rb") as handle:
+        is_pickle = handle.read(1) == PICKLE_MAGIC
+    if is_pickle:
+        registered = _from_artifact(joblib.load(path), path)
+    else:
+        registered = _from_artifact(xgb.Booster(model_file=path), path)
+    registered.load_seconds = time.perf_counter() - start
+    if warm_up:
+        registered.warm_up()
+    return registered
@@ -0,0 +1,131 @@
+# predictions.py
+import io
+import os
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.ipc as pa_ipc
+
+from sketches import Moments, QuantileSketch
+
+PREDICTION_MODES = ("full", "summary")
+PREDICTION_FORMATS = ("json", "npy", "arrow")
+# Rows per page of GET /predictions/{analysis_id}
+PREDICTION_PAGE_ROWS = int(os.getenv("PREDICTION_PAGE_ROWS", "10000"))
+# Predictions with at most this many distinct values are summarised as class counts as well
+PREDICTION_MAX_CLASSES = 20
+_QUANTILES = (0.05, 0.25, 0.5, 0.75, 0.95)
+
+
+def as_array(predictions):
+    """Predictions as a float64 array, or None when the report has none."""
+    if predictions is None or isinstance(predictions, str):
+        return None
+    return np.asarray(predictions, dtype=np.float64)
+
+
+def summarize_predictions(predictions):
+    """Count, moments, quantiles and (for few distinct values) class counts instead of one value per row."""
+    values = as_array(predictions)
+    if values is None or len(values) == 0:
+        return {"count": 0}
+    valid = values[~np.isnan(values)]
+    summary = {"count": int(len(values)), "missing": int(len(values) - len(valid))}
+    if len(valid) == 0:
+        return summary
+    quantiles = np.quantile(valid, _QUANTILES)
+    summary.update(
+        mean=float(valid.mean()),
+        std=float(valid.std(ddof=1)) if len(valid) > 1 else None,
+        min=float(valid.min()),
+        max=float(valid.max()),
+        quantiles={f"p{int(q * 100):02d}": float(value) for q, value in zip(_QUANTILES, quantiles)},
+    )
+    classes, counts = np.unique(valid, return_counts=True)
+    if len(classes) <= PREDICTION_MAX_CLASSES:
+        summary["class_counts"] = {_label(value): int(count) for value, count in zip(classes, counts)}
+    return summary
+
+
+class PredictionSketch:
+    """
+    The ``summarize_predictions`` fields for predictions that arrive in batches,
+    kept as moments, a quantile sketch and (while there are few distinct values)
+    class counts, so memory does not grow with the rows scored. Quantiles are
+    approximate once the sketch has compacted.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.missing = 0
+        self.moments = Moments()
+        self.quantiles = QuantileSketch()
+        self.classes = {}  # None once there are more than PREDICTION_MAX_CLASSES values
+
+    def update(self, predictions):
+        values = as_array(predictions)
+        if values is None or len(values) == 0:
+            return self
+        valid = values[~np.isnan(values)]
+        self.count += len(values)
+        self.missing += len(values) - len(valid)
+        self.moments.update(valid)
+        self.quantiles.update(valid)
+        if self.classes is not None:
+            classes, counts = np.unique(valid, return_counts=True)
+            self._add_classes(zip(classes.tolist(), counts.tolist()))
+        return self
+
+    def merge(self, other):
+        self.count += other.count
+        self.missing += other.missing
+        self.moments.merge(other.moments)
+        self.quantiles.merge(other.quantiles)
+        if self.classes is not None:
+            if other.classes is None:
+                self.classes = None
+            else:
+                self._add_classes(other.classes.items())
+        return self
+
+    def _add_classes(self, counts):
+        for value, count in counts:
+            self.classes[value] = self.classes.get(value, 0) + count
+        if len(self.classes) > PREDICTION_MAX_CLASSES:
+            self.classes = None
+
+    def summary(self):
+        if self.count == 0:
+            return {"count": 0}
+        summary = {"count": self.count, "missing": self.missing}
+        if self.moments.count == 0:
+            return summary
+        summary.update(
+            mean=self.moments.mean,
+            std=self.moments.std if self.moments.count > 1 else None,
+            min=self.moments.minimum,
+            max=self.moments.maximum,
+            quantiles={f"p{int(q * 100):02d}": self.quantiles.quantile(q) for q in _QUANTILES},
+        )
+        if self.classes is not None:
+            summary["class_counts"] = {_label(value): count for value, count in sorted(self.classes.items())}
+        return summary
+
+
+def _label(value):
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def encode_predictions(values, fmt):
+    """``(body, media_type)`` for a slice of predictions in a binary format."""
+    if fmt == "npy":
+        buffer = io.BytesIO()
+        np.save(buffer, values, allow_pickle=False)
+        return buffer.getvalue(), "application/x-npy"
+    if fmt == "arrow":
+        table = pa.table({"prediction": pa.array(values, type=pa.float64())})
+        sink = pa.BufferOutputStream()
+        with pa_ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes(), "application/vnd.apache.arrow.stream"
+    raise ValueError(f"format must be one of {', '.join(PREDICTION_FORMATS)}")
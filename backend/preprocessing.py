@@ -0,0 +1,132 @@
+# preprocessing.py
+import argparse
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+ARTIFACT_VERSION = 1
+UNKNOWN_CATEGORY = "Unknown"
+PREPROCESSING_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_PREPROCESSING_FILE = f"moneypulse_preprocessing_v{ARTIFACT_VERSION}.json"
+
+
+def resolve_preprocessing_path(path=None):
+    path = path or os.getenv("PREPROCESSING_PATH", DEFAULT_PREPROCESSING_FILE)
+    return path if os.path.isabs(path) else os.path.join(PREPROCESSING_DIR, path)
+
+
+def _as_text(series):
+    """Values as strings (missing kept missing) so vocabularies survive the JSON round trip."""
+    if pd.api.types.infer_dtype(series, skipna=True) in ("string", "empty"):
+        return series
+    return series.astype(str).where(series.notna())
+
+
+class PreprocessingArtifact:
+    """
+    Fitted medians, category vocabularies and scaler statistics, applied without refitting.
+
+    ``transform`` builds the output from column arrays instead of copying the
+    input frame: numeric columns are median-filled and standardised as one 2-D
+    block, categorical columns become integer codes into their vocabulary, with
+    missing and unseen values mapped to the ``"Unknown"`` code.
+    """
+
+    def __init__(self, numeric_cols, categorical_cols, medians, means, scales, vocabularies,
+                 version=ARTIFACT_VERSION):
+        self.numeric_cols = list(numeric_cols)
+        self.categorical_cols = list(categorical_cols)
+        self.medians = np.asarray(medians, dtype=np.float64)
+        self.means = np.asarray(means, dtype=np.float64)
+        self.scales = np.asarray(scales, dtype=np.float64)
+        self.vocabularies = {col: list(vocab) for col, vocab in vocabularies.items()}
+        self.version = version
+        self._categories = {col: pd.Index(vocab) for col, vocab in self.vocabularies.items()}
+
+    @classmethod
+    def fit(cls, df, profile=None):
+        """Fit on a reference frame; a ColumnProfile of ``df`` supplies the column split and medians."""
+        if profile is None:
+            from profiler import profile_dataframe
+            profile = profile_dataframe(df)
+        numeric_cols = profile.numeric_cols
+        medians = np.array([profile[col].median for col in numeric_cols], dtype=np.float64)
+        medians = np.where(np.isnan(medians), 0.0, medians)
+        block = df[numeric_cols].to_numpy(dtype=np.float64, na_value=np.nan)
+        block = np.where(np.isnan(block), medians, block)
+        means = block.mean(axis=0) if len(block) else np.zeros(len(numeric_cols))
+        scales = block.std(axis=0) if len(block) else np.ones(len(numeric_cols))
+        scales = np.where(scales == 0, 1.0, scales)
+        vocabularies = {}
+        for col in profile.categorical_cols:
+            seen = set(_as_text(df[col]).dropna().unique())
+            seen.add(UNKNOWN_CATEGORY)
+            vocabularies[col] = sorted(seen)
+        return cls(numeric_cols, profile.categorical_cols, medians, means, scales, vocabularies)
+
+    def unknown_code(self, col):
+        return self._categories[col].get_loc(UNKNOWN_CATEGORY)
+
+    def transform(self, df):
+        columns = {}
+        if self.numeric_cols:
+            block = df.reindex(columns=self.numeric_cols).to_numpy(dtype=np.float64, na_value=np.nan)
+            np.copyto(block, self.medians, where=np.isnan(block))
+            block -= self.means
+            block /= self.scales
+            columns.update(zip(self.numeric_cols, block.T))
+        for col in self.categorical_cols:
+            if col in df.columns:
+                codes = pd.Categorical(_as_text(df[col]), categories=self._categories[col]).codes.astype(np.int64)
+                codes[codes < 0] = self.unknown_code(col)
+            else:
+                codes = np.full(len(df), self.unknown_code(col), dtype=np.int64)
+            columns[col] = codes
+        ordered = [col for col in df.columns if col in columns]
+        ordered += [col for col in self.numeric_cols + self.categorical_cols if col not in df.columns]
+        return pd.DataFrame({col: columns[col] for col in ordered}, index=df.index)
+
+    def to_dict(self):
+        return {
+            "version": self.version,
+            "numeric_cols": self.numeric_cols,
+            "categorical_cols": self.categorical_cols,
+            "medians": self.medians.tolist(),
+            "means": self.means.tolist(),
+            "scales": self.scales.tolist(),
+            "vocabularies": self.vocabularies,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        if data.get("version") != ARTIFACT_VERSION:
+            raise ValueError(f"Preprocessing artifact version {data.get('version')} != {ARTIFACT_VERSION}")
+        return cls(data["numeric_cols"], data["categorical_cols"], data["medians"], data["means"],
+                   data["scales"], data["vocabularies"], data["version"])
+
+    def save(self, path=None):
+        path = resolve_preprocessing_path(path)
+        with open(path, "w", encoding="utf-8") as handle:
+            json.dump(self.to_dict(), handle)
+        return path
+
+
+def load_preprocessing_artifact(path=None):
+    """The persisted artifact, or None when none has been fitted yet."""
+    path = resolve_preprocessing_path(path)
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as handle:
+        return PreprocessingArtifact.from_dict(json.load(handle))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fit and save the preprocessing artifact from a reference dataset.")
+    parser.add_argument("reference", help="CSV or Excel file with representative training data")
+    parser.add_argument("--output", default=None, help="artifact path (default: PREPROCESSING_PATH)")
+    args = parser.parse_args()
+    reader = pd.read_csv if args.reference.endswith(".csv") else pd.read_excel
+    artifact = PreprocessingArtifact.fit(reader(args.reference))
+    print("Saved preprocessing artifact to", artifact.save(args.output))
@@ -0,0 +1,195 @@
+# profiler.py
+import os
+from collections import OrderedDict
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+# Number of histogram bins kept per numeric column (matches the charts)
+PROFILE_HISTOGRAM_BINS = 30
+# Most frequent values kept per categorical column (at least CHART_TOP_N, so bar charts can be drawn from them)
+PROFILE_TOP_VALUES = int(os.getenv("PROFILE_TOP_VALUES", "100"))
+
+
+@dataclass
+class ColumnProfile:
+    """Every per-column statistic the report, recommendations, preprocessing and charts read."""
+
+    name: str
+    kind: str  # "numeric" or "categorical"
+    dtype: str
+    count: int
+    null_count: int
+    nunique: int
+    mean: float = float("nan")
+    median: float = float("nan")
+    std: float = float("nan")
+    minimum: float = float("nan")
+    maximum: float = float("nan")
+    bin_edges: np.ndarray = None
+    bin_counts: np.ndarray = None
+    value_counts: pd.Series = field(default=None, repr=False)  # the most frequent values only; see nunique
+    scale: float = 1.0  # population rows per profiled row when profiling a sample
+
+    @property
+    def is_numeric(self):
+        return self.kind == "numeric"
+
+    def top_values(self, k=None):
+        if self.value_counts is None:
+            return pd.Series(dtype="int64")
+        return self.value_counts if k is None else self.value_counts.head(k)
+
+    @property
+    def other_count(self):
+        """Non-null values outside ``value_counts``."""
+        return self.count - int(self.value_counts.sum()) if self.value_counts is not None else 0
+
+
+class DatasetProfile:
+    def __init__(self, n_rows, columns):
+        self.n_rows = n_rows
+        self.columns = columns
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def __iter__(self):
+        return iter(self.columns.values())
+
+    @property
+    def column_names(self):
+        return list(self.columns)
+
+    @property
+    def numeric_cols(self):
+        return [name for name, column in self.columns.items() if column.is_numeric]
+
+    @property
+    def categorical_cols(self):
+        return [name for name, column in self.columns.items() if not column.is_numeric]
+
+    def numeric_means(self):
+        return {name: self.columns[name].mean for name in self.numeric_cols}
+
+    def numeric_medians(self):
+        return {name: self.columns[name].median for name in self.numeric_cols}
+
+    def categorical_nunique(self):
+        return {name: self.columns[name].nunique for name in self.categorical_cols}
+
+
+def _sorted_valid_mask(counts, n_rows):
+    """Mask of the non-NaN prefix of each column after sorting."""
+    return np.arange(n_rows)[:, None] < counts[None, :]
+
+
+def _numeric_block_stats(values, nbins):
+    """
+    Column-wise statistics for a 2-D float array with NaNs for missing values.
+
+    One sort per column yields median, min, max and distinct counts; a single
+    ``bincount`` over offset bin indices fills every column's histogram at once.
+    Work arrays are reused in place so peak memory stays near three copies of
+    the numeric block.
+    """
+    n_rows, n_cols = values.shape
+    columns = np.arange(n_cols)
+    valid = ~np.isnan(values)
+    counts = valid.sum(axis=0)
+    has_values = counts > 0
+
+    filled = np.where(valid, values, 0.0)
+    means = np.where(has_values, filled.sum(axis=0) / np.maximum(counts, 1), np.nan)
+    squared = filled - np.where(has_values, means, 0.0)
+    squared[~valid] = 0.0
+    np.square(squared, out=squared)
+    stds = np.sqrt(np.where(counts > 1, squared.sum(axis=0) / np.maximum(counts - 1, 1), np.nan))
+    del squared
+
+    if n_rows:
+        ordered = np.sort(values, axis=0)  # NaNs sort last
+        low_idx = np.maximum((counts - 1) // 2, 0)
+        high_idx = np.minimum(counts // 2, n_rows - 1)
+        medians = np.where(has_values, (ordered[low_idx, columns] + ordered[high_idx, columns]) / 2, np.nan)
+        minimums = np.where(has_values, ordered[0, columns], np.nan)
+        maximums = np.where(has_values, ordered[np.maximum(counts - 1, 0), columns], np.nan)
+        changes = (ordered[1:] != ordered[:-1]) & _sorted_valid_mask(counts, n_rows)[1:]
+        nunique = np.where(has_values, changes.sum(axis=0) + 1, 0)
+        del ordered, changes
+    else:
+        medians = minimums = maximums = np.full(n_cols, np.nan)
+        nunique = np.zeros(n_cols, dtype=np.int64)
+
+    low = np.where(has_values, minimums, 0.0)
+    high = np.where(has_values, maximums, 1.0)
+    flat = high == low
+    low = np.where(flat, low - 0.5, low)
+    high = np.where(flat, high + 0.5, high)
+    edges = low + (high - low) * np.linspace(0.0, 1.0, nbins + 1)[:, None]
+
+    filled -= low
+    filled *= nbins / (high - low)
+    bins = filled.astype(np.int64)
+    del filled
+    np.clip(bins, 0, nbins - 1, out=bins)
+    bins += columns * nbins
+    hist = np.bincount(bins[valid], minlength=n_cols * nbins).reshape(n_cols, nbins)
+
+    return {
+        "count": counts, "mean": means, "median": medians, "std": stds,
+        "min": minimums, "max": maximums, "nunique": nunique,
+        "edges": edges.T, "hist": hist, "has_values": has_values,
+    }
+
+
+def profile_dataframe(df, nbins=PROFILE_HISTOGRAM_BINS, top_values=PROFILE_TOP_VALUES):
+    """Profile every column of ``df`` in one vectorized pass per dtype class."""
+    numeric_cols = [col for col, dtype in df.dtypes.items() if pd.api.types.is_numeric_dtype(dtype)]
+    numeric_set = set(numeric_cols)
+    n_rows = len(df)
+
+    numeric_stats = None
+    if numeric_cols:
+        values = df[numeric_cols].to_numpy(dtype=np.float64, na_value=np.nan)
+        numeric_stats = _numeric_block_stats(values, nbins)
+    numeric_position = {col: i for i, col in enumerate(numeric_cols)}
+
+    columns = OrderedDict()
+    for col in df.columns:
+        dtype = str(df[col].dtype)
+        if col in numeric_set:
+            i = numeric_position[col]
+            count = int(numeric_stats["count"][i])
+            has_values = bool(numeric_stats["has_values"][i])
+            columns[col] = ColumnProfile(
+                name=col,
+                kind="numeric",
+                dtype=dtype,
+                count=count,
+                null_count=n_rows - count,
+                nunique=int(numeric_stats["nunique"][i]),
+                mean=float(numeric_stats["mean"][i]),
+                median=float(numeric_stats["median"][i]),
+                std=float(numeric_stats["std"][i]),
+                minimum=float(numeric_stats["min"][i]),
+                maximum=float(numeric_stats["max"][i]),
+                bin_edges=numeric_stats["edges"][i] if has_values else None,
+                bin_counts=numeric_stats["hist"][i] if has_values else None,
+            )
+        else:
+            value_counts = df[col].value_counts()
+            if isinstance(df[col].dtype, pd.CategoricalDtype):
+                value_counts = value_counts[value_counts > 0]  # unused categories are listed with 0
+            count = int(value_counts.sum())
+            columns[col] = ColumnProfile(
+                name=col,
+                kind="categorical",
+                dtype=dtype,
+                count=count,
+                null_count=n_rows - count,
+                nunique=len(value_counts),
+                value_counts=value_counts.head(top_values),
+            )
+    return DatasetProfile(n_rows, columns)
@@ -0,0 +1,149 @@
+# recommendations.py
+import os
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+# Thresholds separating the "below" from the "above" advice of each rule
+REVENUE_THRESHOLD = float(os.getenv("RECOMMEND_REVENUE_THRESHOLD", "50"))
+FREQUENCY_THRESHOLD = float(os.getenv("RECOMMEND_FREQUENCY_THRESHOLD", "2"))
+RATING_THRESHOLD = float(os.getenv("RECOMMEND_RATING_THRESHOLD", "3.5"))
+# Categorical columns with more distinct values than this count as diverse
+DIVERSITY_THRESHOLD = float(os.getenv("RECOMMEND_DIVERSITY_THRESHOLD", "10"))
+# Distinct column-name lists whose classification is remembered
+CLASSIFY_CACHE_SIZE = int(os.getenv("RECOMMEND_CLASSIFY_CACHE_SIZE", "256"))
+
+
+@dataclass(frozen=True)
+class Rule:
+    """
+    Advice for columns whose lower-cased name contains one of ``keywords``:
+    ``below`` when the statistic is under ``threshold`` (not above it, for
+    categorical rules), ``above`` otherwise.
+    """
+
+    name: str
+    kind: str  # "numeric" rules read the mean, "categorical" rules the distinct count
+    keywords: tuple
+    threshold: float
+    below: tuple
+    above: tuple
+    strict_above: bool = False  # categorical diversity is "more than", numeric levels "at least"
+
+    @property
+    def pattern(self):
+        return re.compile("|".join(re.escape(keyword) for keyword in self.keywords))
+
+    def is_below(self, values):
+        return values <= self.threshold if self.strict_above else values < self.threshold
+
+
+RULES = (
+    Rule("revenue", "numeric", ("amount", "price", "cost", "revenue"), REVENUE_THRESHOLD, below=(
+        "The '{col}' metric averages at {mean:.2f}, which is below the ideal range. Focus on boosting revenue by introducing targeted promotions, revising pricing strategies, and offering bundled deals.",
+        "With '{col}' averaging only {mean:.2f}, there's significant growth opportunity. Adjust pricing and launch special discounts.",
+        "The low average of '{col}' ({mean:.2f}) indicates underperformance. Invest in market research and innovate pricing models.",
+    ), above=(
+        "The '{col}' metric is strong at an average of {mean:.2f}. Leverage this success to scale operations and enhance customer experience.",
+        "A healthy '{col}' average of {mean:.2f} provides a solid foundation. Expand market reach and reinvest profits.",
+        "With '{col}' performing well at {mean:.2f}, build on this strength by optimizing customer acquisition and upselling.",
+    )),
+    Rule("frequency", "numeric", ("frequency", "count", "number"), FREQUENCY_THRESHOLD, below=(
+        "The average '{col}' is only {mean:.2f}, suggesting low engagement. Prioritize developing loyalty programs and personalized marketing.",
+        "An average of {mean:.2f} in '{col}' indicates low customer repeat. Create incentives that encourage regular interactions.",
+        "The low frequency ({mean:.2f}) in '{col}' reveals an opportunity to boost repeat transactions. Consider subscriptions or rewards.",
+    ), above=(
+        "The '{col}' metric is strong with an average of {mean:.2f}. Capitalize on this by expanding engagement initiatives.",
+        "A robust average of {mean:.2f} in '{col}' highlights healthy activity. Maintain this trend and explore additional segmentation.",
+        "With '{col}' at {mean:.2f} on average, continue to fine-tune upselling and cross-promotional tactics.",
+    )),
+    Rule("rating", "numeric", ("rating", "score"), RATING_THRESHOLD, below=(
+        "The average '{col}' of {mean:.2f} is a signal to improve customer satisfaction. Focus on quality enhancements and responsive support.",
+        "With '{col}' averaging only {mean:.2f}, customer dissatisfaction might be holding you back. Invest in improvements.",
+        "An average rating of {mean:.2f} in '{col}' suggests the need for upgrades. Prioritize customer feedback and product improvements.",
+    ), above=(
+        "A solid '{col}' average of {mean:.2f} indicates strong approval. Leverage this positive feedback in your marketing campaigns.",
+        "With '{col}' at {mean:.2f}, quality is clearly a competitive advantage. Maintain your standard while exploring new segments.",
+        "The excellent performance of '{col}' at {mean:.2f} provides a strong foundation for growth. Enhance brand messaging accordingly.",
+    )),
+    Rule("segment", "categorical", ("category", "segment", "region", "type"), DIVERSITY_THRESHOLD, below=(
+        "The '{col}' column is dominated by a few categories. Concentrate on these key segments to optimize offerings.",
+        "A concentrated distribution in '{col}' reveals a clear customer preference. Refine your offerings to drive consistent growth.",
+    ), above=(
+        "The '{col}' column shows high diversity. Segment these groups to design tailored marketing strategies.",
+        "With many unique values in '{col}', identify and target specific customer segments for personalized offerings.",
+    ), strict_above=True),
+)
+
+
+def stable_hashes(names):
+    """One 64-bit hash per name, the same in every process (``hash(str)`` changes with PYTHONHASHSEED)."""
+    return pd.util.hash_array(np.asarray(names, dtype=object), categorize=False)
+
+
+def matching_rows(pattern, text, starts):
+    """Rows of the newline-joined names in which ``pattern`` occurs, from one scan of the whole text."""
+    offsets = np.fromiter((match.start() for match in pattern.finditer(text)), dtype=np.int64)
+    return np.unique(np.searchsorted(starts, offsets, side="right") - 1)
+
+
+class RuleEngine:
+    """
+    Column recommendations from a rule table.
+
+    Each rule's keywords compile to one regex. Column names are classified by
+    one regex scan per rule over all names at once, first matching rule wins,
+    and the result is cached per list of names, so repeat uploads with the
+    same schema skip matching entirely. Variants are picked by a stable hash of the
+    column name, so the text depends only on the name and the statistic.
+    """
+
+    def __init__(self, rules=RULES, cache_size=CLASSIFY_CACHE_SIZE):
+        self.rules = tuple(rules)
+        self._patterns = [rule.pattern for rule in self.rules]
+        self.classify = lru_cache(maxsize=cache_size)(self._classify)
+
+    def _classify(self, names, kind):
+        """``(rule_index, name_hash)`` arrays for a tuple of names; index -1 where no rule of ``kind`` matches."""
+        names = [str(name) for name in names]  # Excel headers can be numbers
+        lowered = [name.lower() for name in names]
+        text = "\n".join(lowered)
+        # Offsets come from the name lengths, so a newline inside a name cannot shift the rows
+        starts = np.concatenate([[0], np.cumsum([len(name) + 1 for name in lowered])[:-1]])
+        assigned = np.full(len(names), -1, dtype=np.int64)
+        for index, (rule, pattern) in enumerate(zip(self.rules, self._patterns)):
+            if rule.kind != kind:
+                continue
+            rows = matching_rows(pattern, text, starts)
+            assigned[rows[assigned[rows] < 0]] = index
+        return assigned, stable_hashes(names)
+
+    def _apply(self, stats, kind):
+        names = tuple(stats)
+        if not names:
+            return {}
+        assigned, hashes = self.classify(names, kind)
+        values = np.array([float(value) for value in stats.values()], dtype=np.float64)
+        matched = (assigned >= 0) & ~np.isnan(values)
+        texts = {}
+        for index in np.unique(assigned[matched]):
+            rule = self.rules[index]
+            positions = np.flatnonzero(matched & (assigned == index))
+            for position, is_below in zip(positions, rule.is_below(values[positions])):
+                variants = rule.below if is_below else rule.above
+                col = names[position]
+                # Format the caller's value so sampled means keep their ± interval
+                texts[position] = variants[hashes[position] % len(variants)].format(col=col, mean=stats[col])
+        return {names[position]: texts[position] for position in sorted(texts)}
+
+    def recommend(self, numeric_means, categorical_nunique):
+        """Recommendations keyed by column, numeric columns first, each group in the given order."""
+        recommendations = self._apply(numeric_means, "numeric")
+        recommendations.update(self._apply(categorical_nunique, "categorical"))
+        return recommendations
+
+
+rule_engine = RuleEngine()
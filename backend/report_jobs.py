@@ -0,0 +1,242 @@
+# report_jobs.py
+import asyncio
+import contextvars
+import json
+import os
+import shutil
+import tempfile
+import time
+import uuid
+
+from workers import WorkerPoolFull
+
+REPORT_STATUSES = ("queued", "analyzing", "rendering", "done", "failed")
+WINDOWS_WKHTMLTOPDF = "C:\\Program Files\\wkhtmltopdf\\bin\\wkhtmltopdf.exe"
+
+
+def resolve_renderer_binary(binary=None):
+    """WKHTMLTOPDF_PATH, else wkhtmltopdf on PATH, else the default Windows install location."""
+    binary = binary or os.getenv("WKHTMLTOPDF_PATH")
+    if binary:
+        return binary
+    found = shutil.which("wkhtmltopdf")
+    if found:
+        return found
+    return WINDOWS_WKHTMLTOPDF if os.path.exists(WINDOWS_WKHTMLTOPDF) else "wkhtmltopdf"
+
+
+class RendererError(Exception):
+    pass
+
+
+class WkhtmltopdfRenderer:
+    """Renders HTML from stdin straight to a PDF file with an async subprocess."""
+
+    def __init__(self, binary=None, args=("--encoding", "UTF-8", "--quiet", "--disable-smart-shrinking"),
+                 timeout=120.0):
+        self.binary = resolve_renderer_binary(binary)
+        self.args = tuple(args)
+        self.timeout = timeout
+
+    async def render(self, html_content, output_path):
+        try:
+            process = await asyncio.create_subprocess_exec(
+                self.binary, *self.args, "-", output_path,
+                stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.PIPE,
+            )
+        except FileNotFoundError:
+            raise RendererError(f"PDF renderer not found: {self.binary} (set WKHTMLTOPDF_PATH)")
+        try:
+            _, stderr = await asyncio.wait_for(process.communicate(html_content.encode("utf-8")), self.timeout)
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
+            raise RendererError(f"PDF renderer timed out after {self.timeout}s")
+        if process.returncode != 0 or not os.path.exists(output_path):
+            raise RendererError(f"PDF renderer exited with {process.returncode}: {stderr.decode(errors='replace')[:500]}")
+
+
+class ReportJob:
+    def __init__(self, job_id, status="queued", progress=0, error=None, download_name=None,
+                 created_at=None, finished_at=None):
+        self.job_id = job_id
+        self.status = status
+        self.progress = progress
+        self.error = error
+        self.download_name = download_name
+        self.created_at = created_at if created_at is not None else time.time()
+        self.finished_at = finished_at
+
+    @property
+    def finished(self):
+        return self.status in ("done", "failed")
+
+    def to_dict(self):
+        return {
+            "job_id": self.job_id,
+            "status": self.status,
+            "progress": self.progress,
+            "error": self.error,
+            "download_name": self.download_name,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class ReportJobQueue:
+    """
+    Asynchronous PDF report jobs with an on-disk result store.
+
+    ``submit`` returns at once; the job analyses the upload, then waits for one
+    of ``max_renderers`` renderer slots. Job status and finished PDFs live in
+    ``result_dir`` so any API worker sharing the directory can answer status and
+    download requests. Finished jobs and their files expire after ``ttl_seconds``;
+    jobs still unfinished ``max_age_seconds`` after submission (stuck, or orphaned
+    by a worker that died) are cancelled and removed. At most ``max_pending``
+    jobs run per process; ``submit`` raises ``WorkerPoolFull`` beyond that.
+    ``purge_periodically`` sweeps the directory every ``purge_interval`` seconds.
+    """
+
+    def __init__(self, result_dir=None, ttl_seconds=3600, max_renderers=2, renderer=None, max_pending=32,
+                 max_age_seconds=1800, purge_interval=300, retry_after=5):
+        self.result_dir = result_dir or os.path.join(tempfile.gettempdir(), "marketpulse_reports")
+        self.ttl_seconds = ttl_seconds
+        self.max_renderers = max_renderers
+        self.renderer = renderer or WkhtmltopdfRenderer()
+        self.max_pending = max_pending
+        self.max_age_seconds = max_age_seconds
+        self.purge_interval = purge_interval
+        self.retry_after = retry_after
+        self.rejected = 0
+        self._semaphore = None
+        self._loop = None
+        self._tasks = {}
+        os.makedirs(self.result_dir, exist_ok=True)
+
+    def _status_path(self, job_id):
+        return os.path.join(self.result_dir, f"{job_id}.json")
+
+    def result_path(self, job_id):
+        return os.path.join(self.result_dir, f"{job_id}.pdf")
+
+    def _save(self, job):
+        path = self._status_path(job.job_id)
+        with open(path + ".tmp", "w", encoding="utf-8") as handle:
+            json.dump(job.to_dict(), handle)
+        os.replace(path + ".tmp", path)
+
+    def _update(self, job, status, progress, **fields):
+        job.status = status
+        job.progress = progress
+        for name, value in fields.items():
+            setattr(job, name, value)
+        if job.finished:
+            job.finished_at = time.time()
+        self._save(job)
+
+    def _renderer_slots(self):
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None or self._loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.max_renderers)
+            self._loop = loop
+        return self._semaphore
+
+    def get(self, job_id):
+        try:
+            uuid.UUID(job_id)
+            with open(self._status_path(job_id), encoding="utf-8") as handle:
+                job = ReportJob(**json.load(handle))
+        except (ValueError, OSError):
+            return None
+        if self._expired(job):
+            self._remove(job_id)
+            return None
+        return job
+
+    def _expired(self, job):
+        now = time.time()
+        if job.finished:
+            return now - job.finished_at > self.ttl_seconds
+        return now - job.created_at > self.max_age_seconds
+
+    def _remove(self, job_id):
+        task = self._tasks.pop(job_id, None)
+        if task is not None and not task.done():
+            # purge_expired runs on a thread; the task belongs to the event loop
+            task.get_loop().call_soon_threadsafe(task.cancel)
+        for path in (self._status_path(job_id), self.result_path(job_id), self.result_path(job_id) + ".partial"):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def purge_expired(self):
+        removed = 0
+        for name in os.listdir(self.result_dir):
+            if name.endswith(".json") and self.get(name[:-5]) is None:
+                removed += 1
+        return removed
+
+    async def purge_periodically(self):
+        """Remove expired jobs every ``purge_interval`` seconds until cancelled."""
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.purge_interval)
+            try:
+                removed = await loop.run_in_executor(None, self.purge_expired)
+            except OSError as e:
+                print("Report job purge failed:", e)
+                continue
+            if removed:
+                print(f"Purged {removed} expired report jobs")
+
+    def submit(self, produce):
+        """
+        Start a job. ``produce`` is an async callable returning ``(html_content, download_name)``.
+        """
+        if len(self._tasks) >= self.max_pending:
+            self.rejected += 1
+            raise WorkerPoolFull(self.retry_after)
+        job = ReportJob(str(uuid.uuid4()))
+        self._save(job)
+        # A fresh context: the job outlives the request that submitted it and must not write into its trace
+        task = asyncio.get_running_loop().create_task(self._run(job, produce), context=contextvars.Context())
+        self._tasks[job.job_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(job.job_id, None))
+        return job
+
+    async def wait(self, job_id):
+        task = self._tasks.get(job_id)
+        if task is not None:
+            try:
+                await asyncio.shield(task)
+            except asyncio.CancelledError:
+                if not task.cancelled():
+                    raise  # the waiter was cancelled, not the job
+        return self.get(job_id)
+
+    async def _run(self, job, produce):
+        try:
+            self._update(job, "analyzing", 10)
+            html_content, download_name = await produce()
+            self._update(job, "rendering", 50, download_name=download_name)
+            async with self._renderer_slots():
+                self._update(job, "rendering", 60)
+                partial = self.result_path(job.job_id) + ".partial"
+                await self.renderer.render(html_content, partial)
+                os.replace(partial, self.result_path(job.job_id))
+            self._update(job, "done", 100)
+        except Exception as e:
+            print(f"Report job {job.job_id} failed:", e)
+            self._update(job, "failed", job.progress, error=str(e))
+
+    def stats(self):
+        return {
+            "running": len(self._tasks),
+            "max_pending": self.max_pending,
+            "rejected": self.rejected,
+            "max_renderers": self.max_renderers,
+            "ttl_seconds": self.ttl_seconds,
+            "max_age_seconds": self.max_age_seconds,
+            "renderer": self.renderer.binary,
+        }
@@ -1,13 +1,20 @@
 from fastapi import APIRouter, HTTPException, Depends
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from pydantic import BaseModel
-from passlib.context import CryptContext
+from starlette.concurrency import run_in_threadpool
+
+from auth_store import MAX_PASSWORD_BYTES, PasswordHasher, SessionTokens, store_from_env
+from workers import WorkerPoolFull
 
 router = APIRouter()
 
-# Hashing passwords
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Users and session tokens live in a store every worker shares (SQLite by default)
+user_store = store_from_env()
+# bcrypt runs on its own bounded thread pool, off the event loop
+password_hasher = PasswordHasher()
+session_tokens = SessionTokens(user_store)
 
-fake_users_db = {}  # Replace with a real database later
+bearer_scheme = HTTPBearer(auto_error=False)
 
 class UserRegister(BaseModel):
     username: str
@@ -17,22 +24,59 @@ class UserLogin(BaseModel):
     username: str
     password: str
 
+def busy(exc):
+    return HTTPException(status_code=503, detail="Authentication is busy; retry shortly",
+                         headers={"Retry-After": str(exc.retry_after)})
+
+def current_user(credentials: HTTPAuthorizationCredentials = Depends(bearer_scheme)):
+    """Dependency for authenticated endpoints: the username behind a live bearer token."""
+    username = session_tokens.resolve(credentials.credentials) if credentials is not None else None
+    if username is None:
+        raise HTTPException(status_code=401, detail="Not authenticated", headers={"WWW-Authenticate": "Bearer"})
+    return username
+
 @router.post("/register")
-def register(user: UserRegister):
-    if user.username in fake_users_db:
+async def register(user: UserRegister):
+    if len(user.password.encode("utf-8")) > MAX_PASSWORD_BYTES:
+        raise HTTPException(status_code=400, detail=f"Password must be at most {MAX_PASSWORD_BYTES} bytes")
+    if await run_in_threadpool(user_store.get_password_hash, user.username) is not None:
+        raise HTTPException(status_code=400, detail="Username already exists")
+    try:
+        hashed_password = await password_hasher.hash(user.password)
+    except WorkerPoolFull as e:
+        raise busy(e)
+    # A concurrent registration may have taken the name while we hashed
+    if not await run_in_threadpool(user_store.create_user, user.username, hashed_password):
         raise HTTPException(status_code=400, detail="Username already exists")
-    
-    hashed_password = pwd_context.hash(user.password)
-    fake_users_db[user.username] = hashed_password
     return {"message": "User registered successfully"}
 
 @router.post("/login")
-def login(user: UserLogin):
-    if user.username not in fake_users_db:
+async def login(user: UserLogin):
+    hashed_password = await run_in_threadpool(user_store.get_password_hash, user.username)
+    if hashed_password is None:
         raise HTTPException(status_code=400, detail="Invalid username")
 
-    hashed_password = fake_users_db[user.username]
-    if not pwd_context.verify(user.password, hashed_password):
+    try:
+        verified = await password_hasher.verify(user.password, hashed_password)
+    except WorkerPoolFull as e:
+        raise busy(e)
+    if not verified:
         raise HTTPException(status_code=400, detail="Incorrect password")
 
-    return {"message": "Login successful"}
+    token = await run_in_threadpool(session_tokens.issue, user.username)
+    return {"message": "Login successful", "access_token": token, "token_type": "bearer",
+            "expires_in": int(session_tokens.ttl_seconds)}
+
+@router.post("/logout")
+def logout(credentials: HTTPAuthorizationCredentials = Depends(bearer_scheme),
+           username: str = Depends(current_user)):
+    session_tokens.revoke(credentials.credentials)
+    return {"message": "Logged out"}
+
+@router.get("/me")
+def me(username: str = Depends(current_user)):
+    return {"username": username}
+
+@router.get("/auth/stats")
+def auth_stats():
+    return {"hasher": password_hasher.stats(), "tokens": session_tokens.stats()}
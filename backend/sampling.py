@@ -0,0 +1,168 @@
+# sampling.py
+import math
+import os
+from dataclasses import dataclass, field
+from statistics import NormalDist
+
+import numpy as np
+import pandas as pd
+
+# Approximate mode only samples uploads with more rows than this
+APPROX_SAMPLE_ABOVE_ROWS = int(os.getenv("APPROX_SAMPLE_ABOVE_ROWS", "1000000"))
+# Rows kept in the sample, which bounds the cost of everything after parsing
+APPROX_SAMPLE_ROWS = int(os.getenv("APPROX_SAMPLE_ROWS", "200000"))
+APPROX_CONFIDENCE = float(os.getenv("APPROX_CONFIDENCE", "0.95"))
+
+
+class SamplingError(ValueError):
+    """Sampling options that do not fit the upload, such as an unknown strata column."""
+
+
+def check_strata(columns, strata):
+    if strata is not None and strata not in columns:
+        raise SamplingError(f"strata column {strata!r} is not in the upload")
+
+
+class Estimate(float):
+    """
+    A sampled mean that compares and sums like a float but formats with its
+    confidence interval, e.g. ``f"{m:.2f}"`` gives ``"41.20 ± 0.35"``.
+    """
+
+    def __new__(cls, value, half_width):
+        estimate = super().__new__(cls, value)
+        estimate.half_width = float(half_width)
+        return estimate
+
+    def __format__(self, spec):
+        if math.isnan(self.half_width):
+            return format(float(self), spec)
+        return f"{format(float(self), spec)} ± {format(self.half_width, spec)}"
+
+    def interval(self):
+        return [float(self) - self.half_width, float(self) + self.half_width]
+
+
+@dataclass
+class SampleInfo:
+    population_rows: int
+    sample_rows: int
+    method: str  # "uniform" or "stratified"
+    confidence: float
+    strata: str = None
+    estimates: dict = field(default_factory=dict)
+
+    @property
+    def scale(self):
+        """Population rows represented by each sampled row."""
+        return self.population_rows / self.sample_rows if self.sample_rows else 1.0
+
+    def overall_mean(self):
+        """Average of the column means; independent column errors add in quadrature."""
+        valid = [estimate for estimate in self.estimates.values() if not math.isnan(estimate)]
+        if not valid:
+            return Estimate(float("nan"), float("nan"))
+        half = math.sqrt(sum(e.half_width ** 2 for e in valid if not math.isnan(e.half_width))) / len(valid)
+        return Estimate(sum(valid) / len(valid), half)
+
+    def to_dict(self):
+        return {
+            "population_rows": self.population_rows,
+            "sample_rows": self.sample_rows,
+            "method": self.method,
+            "strata": self.strata,
+            "confidence": self.confidence,
+            "mean_intervals": {col: None if math.isnan(e) else e.interval() for col, e in self.estimates.items()},
+        }
+
+
+def _z(confidence):
+    return NormalDist().inv_cdf(0.5 + confidence / 2)
+
+
+def _uniform_intervals(sample, numeric_cols, population_rows, z):
+    estimates = {}
+    for col in numeric_cols:
+        values = sample[col].dropna().to_numpy(dtype=np.float64)
+        n = len(values)
+        if n == 0:
+            estimates[col] = Estimate(float("nan"), float("nan"))
+            continue
+        mean = float(values.mean())
+        if n < 2:
+            estimates[col] = Estimate(mean, float("nan"))
+            continue
+        # Finite population correction: the interval shrinks to nothing as the sample approaches the file
+        fpc = math.sqrt(max(population_rows - n, 0) / max(population_rows - 1, 1))
+        estimates[col] = Estimate(mean, z * values.std(ddof=1) / math.sqrt(n) * fpc)
+    return estimates
+
+
+def _stratified_intervals(sample, numeric_cols, strata_codes, strata_sizes, z):
+    estimates = {}
+    for col in numeric_cols:
+        values = sample[col].to_numpy(dtype=np.float64, na_value=np.nan)
+        valid = ~np.isnan(values)
+        groups = pd.DataFrame({"code": strata_codes[valid], "value": values[valid]}).groupby("code")["value"]
+        stats = groups.agg(["mean", "var", "count"])
+        if stats.empty:
+            estimates[col] = Estimate(float("nan"), float("nan"))
+            continue
+        sizes = strata_sizes.reindex(stats.index).to_numpy(dtype=np.float64)
+        weights = sizes / sizes.sum()
+        n_h = stats["count"].to_numpy(dtype=np.float64)
+        var_h = np.nan_to_num(stats["var"].to_numpy(dtype=np.float64))
+        mean = float(np.dot(weights, stats["mean"].to_numpy(dtype=np.float64)))
+        variance = float(np.sum(weights ** 2 * var_h / n_h * np.clip(1 - n_h / sizes, 0, 1)))
+        estimates[col] = Estimate(mean, z * math.sqrt(variance))
+    return estimates
+
+
+def sample_frame(df, numeric_cols, sample_rows=APPROX_SAMPLE_ROWS, strata=None, confidence=APPROX_CONFIDENCE,
+                 seed=0):
+    """
+    Draw ``sample_rows`` rows without replacement and estimate every numeric mean with its interval.
+
+    With ``strata`` each value of that column (missing values included) gets
+    rows in proportion to its share of the file, at least one each. Means are
+    then the stratum-weighted means, with the stratified variance.
+    """
+    check_strata(df.columns, strata)
+    population_rows = len(df)
+    rng = np.random.default_rng(seed)
+    sample_rows = min(sample_rows, population_rows)
+    z = _z(confidence)
+    if strata is None:
+        index = np.sort(rng.choice(population_rows, size=sample_rows, replace=False))
+        sample = df.iloc[index]
+        estimates = _uniform_intervals(sample, numeric_cols, population_rows, z)
+        info = SampleInfo(population_rows, len(sample), "uniform", confidence, estimates=estimates)
+        return sample, info
+
+    codes, _ = pd.factorize(df[strata], use_na_sentinel=False)
+    sizes = np.bincount(codes)
+    allocation = np.maximum(np.round(sizes * sample_rows / population_rows), 1).astype(np.int64)
+    allocation = np.minimum(allocation, sizes)
+    # Shuffle within strata with random keys, then keep each stratum's first allocation rows
+    order = np.lexsort((rng.random(population_rows), codes))
+    starts = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+    rank = np.arange(population_rows) - np.repeat(starts, sizes)
+    index = np.sort(order[rank < np.repeat(allocation, sizes)])
+    sample = df.iloc[index]
+    estimates = _stratified_intervals(sample, numeric_cols, codes[index], pd.Series(sizes), z)
+    info = SampleInfo(population_rows, len(sample), "stratified", confidence, strata=strata, estimates=estimates)
+    return sample, info
+
+
+def scale_profile(profile, scale):
+    """Scale a sample's counts, histograms and value counts up to the population, in place."""
+    profile.n_rows = int(round(profile.n_rows * scale))
+    for column in profile:
+        column.scale = scale
+        column.count = int(round(column.count * scale))
+        column.null_count = int(round(column.null_count * scale))
+        if column.bin_counts is not None:
+            column.bin_counts = np.round(column.bin_counts * scale).astype(np.int64)
+        if column.value_counts is not None:
+            column.value_counts = (column.value_counts * scale).round().astype("int64")
+    return profile
@@ -0,0 +1,104 @@
+# serialization.py
+import datetime
+import gzip
+import os
+import re
+import uuid
+
+import numpy as np
+import orjson
+import pandas as pd
+
+try:
+    import zstandard
+except ImportError:  # zstd is offered only where the zstandard package is installed
+    zstandard = None
+
+# Bodies smaller than this are sent uncompressed; the headers would eat most of the saving
+COMPRESS_MIN_BYTES = int(os.getenv("RESPONSE_COMPRESS_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(os.getenv("RESPONSE_GZIP_LEVEL", "5"))
+ZSTD_LEVEL = int(os.getenv("RESPONSE_ZSTD_LEVEL", "3"))
+
+_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+
+class RawJSON:
+    """Text that is already JSON (e.g. ``fig.to_json()``), spliced into the output instead of re-encoded as a string."""
+
+    __slots__ = ("text",)
+
+    def __init__(self, text):
+        self.text = text
+
+
+def _default(raw_parts, marker):
+    def default(obj):
+        if isinstance(obj, RawJSON):
+            raw_parts.append(obj.text.encode("utf-8") if isinstance(obj.text, str) else obj.text)
+            return f"{marker}{len(raw_parts) - 1}"
+        if isinstance(obj, float):  # float subclasses such as sampling.Estimate
+            return float(obj)
+        if isinstance(obj, np.generic):
+            return obj.item()
+        if isinstance(obj, (pd.Series, pd.Index)):
+            return obj.tolist()
+        if isinstance(obj, pd.DataFrame):
+            return obj.to_dict(orient="records")
+        if isinstance(obj, (datetime.date, datetime.time, pd.Timestamp)):
+            return obj.isoformat()
+        if obj is pd.NA or obj is pd.NaT:
+            return None
+        from fastapi.encoders import jsonable_encoder
+        return jsonable_encoder(obj)
+    return default
+
+
+def dumps(content):
+    """
+    JSON bytes for ``content`` via orjson: numpy arrays and scalars natively,
+    NaN as null, and ``RawJSON`` values inserted verbatim.
+    """
+    raw_parts = []
+    marker = f"__raw_{uuid.uuid4().hex}_"
+    body = orjson.dumps(content, default=_default(raw_parts, marker), option=_OPTIONS)
+    if not raw_parts:
+        return body
+    # Each RawJSON was written as the string "<marker><index>"; the random marker cannot occur in user data
+    pattern = re.compile(b'"' + re.escape(marker.encode()) + rb'(\d+)"')
+    return pattern.sub(lambda match: raw_parts[int(match.group(1))], body)
+
+
+def supported_encodings():
+    return ("zstd", "gzip") if zstandard is not None else ("gzip",)
+
+
+def negotiate_encoding(accept_encoding):
+    """Best content coding the client accepts (zstd over gzip on ties), or None for identity."""
+    if not accept_encoding:
+        return None
+    weights = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        quality = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        weights[name.strip().lower()] = quality
+    best, best_quality = None, 0.0
+    for encoding in supported_encodings():
+        quality = weights.get(encoding, weights.get("*", 0.0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def compress(body, encoding):
+    if encoding == "gzip":
+        return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(body)
+    raise ValueError(f"Unsupported content coding {encoding!r}")
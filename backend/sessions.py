@@ -0,0 +1,231 @@
+# sessions.py
+import os
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from predictions import PredictionSketch
+from sketches import HyperLogLog, Moments, QuantileSketch, TopK, hash_values
+
+# Histogram bins in session charts (matches the profiler)
+SESSION_HISTOGRAM_BINS = 30
+SESSION_MAX_ENTRIES = int(os.getenv("SESSION_MAX_ENTRIES", "64"))
+SESSION_TTL_SECONDS = float(os.getenv("SESSION_TTL_SECONDS", "86400"))
+# Per-row predictions of sessions are appended to files here rather than kept in memory
+SESSION_PREDICTION_DIR = os.getenv("SESSION_PREDICTION_DIR",
+                                   os.path.join(tempfile.gettempdir(), "marketpulse_sessions"))
+
+
+class ColumnSketch:
+    """
+    Mergeable summary of one column: moments and a quantile sketch while it is
+    numeric, plus a HyperLogLog and heavy-hitter counters for every column.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.numeric = True
+        self.rows = 0
+        self.null_count = 0
+        self.moments = Moments()
+        self.quantiles = QuantileSketch()
+        self.distinct = HyperLogLog()
+        self.top = TopK()
+
+    def add_missing(self, rows):
+        """Rows appended without this column."""
+        self.rows += rows
+        self.null_count += rows
+
+    def update(self, series):
+        non_null = series.dropna()
+        self.rows += len(series)
+        self.null_count += len(series) - len(non_null)
+        if self.numeric and not pd.api.types.is_numeric_dtype(series) and len(non_null):
+            # Text arrived in a numeric column: it is categorical from now on
+            self.numeric = False
+            self.moments = Moments()
+            self.quantiles = QuantileSketch()
+        if self.numeric and len(non_null):
+            values = non_null.to_numpy(dtype=np.float64)
+            self.moments.update(values)
+            self.quantiles.update(values)
+        # Repeats cannot change a HyperLogLog, so only distinct values are hashed
+        self.distinct.update_hashes(hash_values(non_null.drop_duplicates()))
+        self.top.update(non_null)
+
+    @property
+    def count(self):
+        return self.rows - self.null_count
+
+    @property
+    def mean(self):
+        return self.moments.mean if self.numeric and self.moments.count else float("nan")
+
+    @property
+    def median(self):
+        return self.quantiles.quantile(0.5) if self.numeric else float("nan")
+
+    @property
+    def nunique(self):
+        # Exact while every distinct value still has its own counter
+        if self.top.exact:
+            return len(self.top.counts)
+        return max(self.distinct.estimate(), len(self.top.counts))
+
+    def histogram(self, nbins=SESSION_HISTOGRAM_BINS):
+        """``(bin_edges, counts)`` over the current range, or ``(None, None)`` for an empty column."""
+        if not self.numeric or self.moments.count == 0:
+            return None, None
+        low, high = self.moments.minimum, self.moments.maximum
+        if low == high:
+            low, high = low - 0.5, high + 0.5
+        edges = np.linspace(low, high, nbins + 1)
+        return edges, self.quantiles.histogram(edges)
+
+
+class PredictionRows:
+    """
+    Per-row predictions of a session in an append-only float64 file, read back
+    a page at a time. The file is created on the first append.
+    """
+
+    def __init__(self, directory=SESSION_PREDICTION_DIR):
+        self.directory = directory
+        self.path = None
+        self.count = 0
+
+    def append(self, values):
+        values = np.asarray(values, dtype="<f8")
+        if self.path is None:
+            os.makedirs(self.directory, exist_ok=True)
+            handle, self.path = tempfile.mkstemp(prefix="predictions-", suffix=".f8", dir=self.directory)
+            os.close(handle)
+        with open(self.path, "ab") as handle:
+            values.tofile(handle)
+        self.count += len(values)
+
+    def read(self, offset, limit):
+        """Rows ``offset`` up to ``offset + limit``; raises FileNotFoundError once the session is closed."""
+        rows = max(min(limit, self.count - offset), 0)
+        if rows == 0:
+            return np.empty(0)
+        if self.path is None:
+            raise FileNotFoundError("session predictions were removed")
+        return np.fromfile(self.path, dtype="<f8", count=rows, offset=offset * 8)
+
+    def close(self):
+        path, self.path = self.path, None
+        if path is not None:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+class DatasetSession:
+    """
+    Sketches for a dataset that grows by appended uploads.
+
+    ``append`` costs time in proportion to the new rows only. Everything the
+    report, recommendations and compact charts read is derived from the
+    sketches, so an append never revisits earlier rows. Predictions are
+    summarised by a ``PredictionSketch``; the per-row values go to disk and
+    are only read back a page at a time.
+    """
+
+    def __init__(self, session_id=None, prediction_dir=SESSION_PREDICTION_DIR):
+        self.session_id = session_id or str(uuid.uuid4())
+        self.columns = OrderedDict()
+        self.total_rows = 0
+        self.head = pd.DataFrame()
+        self.predictions = PredictionSketch()
+        self.prediction_rows = PredictionRows(prediction_dir)
+        self.uploads = 0
+        self.updated_at = time.time()
+        self.lock = threading.Lock()
+
+    def append(self, df, predictions=None):
+        if self.head.empty and len(df):
+            self.head = df.head(1).copy()
+        for name in df.columns:
+            if name not in self.columns:
+                self.columns[name] = ColumnSketch(name)
+                self.columns[name].add_missing(self.total_rows)
+        for name, sketch in self.columns.items():
+            if name in df.columns:
+                sketch.update(df[name])
+            else:
+                sketch.add_missing(len(df))
+        self.total_rows += len(df)
+        if predictions is not None:
+            self.predictions.update(predictions)
+            self.prediction_rows.append(predictions)
+        self.uploads += 1
+        self.updated_at = time.time()
+        return self
+
+    @property
+    def numeric_cols(self):
+        return [name for name, sketch in self.columns.items() if sketch.numeric]
+
+    @property
+    def categorical_cols(self):
+        return [name for name, sketch in self.columns.items() if not sketch.numeric]
+
+    def numeric_means(self):
+        return {name: self.columns[name].mean for name in self.numeric_cols}
+
+    def categorical_nunique(self):
+        return {name: self.columns[name].nunique for name in self.categorical_cols}
+
+    def close(self):
+        self.prediction_rows.close()
+
+
+class DatasetSessionStore:
+    """In-process LRU of sessions; idle sessions expire after ``ttl_seconds``."""
+
+    def __init__(self, max_entries=SESSION_MAX_ENTRIES, ttl_seconds=SESSION_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def create(self):
+        session = DatasetSession()
+        with self._lock:
+            self._sessions[session.session_id] = session
+            while len(self._sessions) > self.max_entries:
+                self._sessions.popitem(last=False)[1].close()
+        return session
+
+    def get(self, session_id):
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return None
+            if time.time() - session.updated_at > self.ttl_seconds:
+                del self._sessions[session_id]
+                session.close()
+                return None
+            self._sessions.move_to_end(session_id)
+            return session
+
+    def delete(self, session_id):
+        with self._lock:
+            session = self._sessions.pop(session_id, None)
+        if session is None:
+            return False
+        session.close()
+        return True
+
+    def stats(self):
+        with self._lock:
+            return {"sessions": len(self._sessions), "max_entries": self.max_entries,
+                    "ttl_seconds": self.ttl_seconds}
@@ -0,0 +1,221 @@
+# sketches.py
+import math
+
+import numpy as np
+import pandas as pd
+
+# Registers per HyperLogLog = 2**HLL_PRECISION; relative error about 1.04 / sqrt(registers)
+HLL_PRECISION = 12
+# KLL compactor size; rank error is roughly 1.7 / QUANTILE_K
+QUANTILE_K = 200
+# Counters kept per Misra-Gries summary
+TOPK_CAPACITY = 1000
+
+
+def hash_values(values):
+    """64-bit hashes that agree across uploads: numbers by value, everything else by its text."""
+    if isinstance(values, pd.Series):
+        values = values.to_numpy(dtype=np.float64) if pd.api.types.is_numeric_dtype(values) \
+            else values.astype(str).to_numpy(dtype=object)
+    return pd.util.hash_array(np.asarray(values), categorize=True)
+
+
+class Moments:
+    """Count, mean, M2, min and max, merged with Chan's parallel update (stable where sum-of-squares is not)."""
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.minimum = math.inf
+        self.maximum = -math.inf
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        if len(values) == 0:
+            return
+        other = Moments()
+        other.count = len(values)
+        other.mean = float(values.mean())
+        other.m2 = float(((values - other.mean) ** 2).sum())
+        other.minimum = float(values.min())
+        other.maximum = float(values.max())
+        self.merge(other)
+
+    def merge(self, other):
+        if other.count == 0:
+            return self
+        total = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / total
+        self.m2 += other.m2 + delta * delta * self.count * other.count / total
+        self.count = total
+        self.minimum = min(self.minimum, other.minimum)
+        self.maximum = max(self.maximum, other.maximum)
+        return self
+
+    @property
+    def sum(self):
+        return self.mean * self.count
+
+    @property
+    def variance(self):
+        return self.m2 / (self.count - 1) if self.count > 1 else float("nan")
+
+    @property
+    def std(self):
+        return math.sqrt(self.variance) if self.count > 1 else float("nan")
+
+
+class HyperLogLog:
+    """Distinct-count sketch; registers merge by element-wise max."""
+
+    def __init__(self, precision=HLL_PRECISION):
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+
+    def update_hashes(self, hashes):
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        if len(hashes) == 0:
+            return
+        p = self.precision
+        index = (hashes >> np.uint64(64 - p)).astype(np.int64)
+        rest = hashes & np.uint64((1 << (64 - p)) - 1)
+        # Rank = position of the leftmost 1-bit in the remaining 64 - p bits
+        bit_length = np.frexp(rest.astype(np.float64))[1]
+        rank = (64 - p - bit_length + 1).astype(np.uint8)
+        np.maximum.at(self.registers, index, rank)
+
+    def update(self, values):
+        self.update_hashes(hash_values(values))
+
+    def merge(self, other):
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    def estimate(self):
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / np.sum(np.ldexp(1.0, -self.registers.astype(np.int64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if raw <= 2.5 * m and zeros:
+            return int(round(m * math.log(m / zeros)))  # linear counting for small cardinalities
+        return int(round(raw))
+
+
+class QuantileSketch:
+    """
+    KLL quantile sketch over floats.
+
+    Level ``h`` holds items of weight ``2**h``. A full level is sorted and every
+    other item, from a random offset, is promoted, so memory stays O(k log n)
+    and two sketches merge by concatenating levels. Exact until the first
+    compaction.
+    """
+
+    def __init__(self, k=QUANTILE_K, seed=0):
+        self.k = k
+        self.levels = [np.empty(0)]
+        self.count = 0
+        self._rng = np.random.default_rng(seed)
+
+    def _capacity(self, level):
+        depth = len(self.levels) - level - 1
+        return max(int(math.ceil(self.k * (2 / 3) ** depth)), 2)
+
+    def _compress(self):
+        level = 0
+        while level < len(self.levels):
+            items = self.levels[level]
+            if len(items) > self._capacity(level):
+                if level + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+                items = np.sort(items)
+                # An odd item out stays behind so weights are conserved exactly
+                keep = items[:1] if len(items) % 2 else items[:0]
+                pairs = items[len(keep):]
+                promoted = pairs[int(self._rng.integers(2))::2]
+                self.levels[level] = keep
+                self.levels[level + 1] = np.concatenate([self.levels[level + 1], promoted])
+            level += 1
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return
+        self.count += len(values)
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self._compress()
+
+    def merge(self, other):
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0))
+        for level, items in enumerate(other.levels):
+            self.levels[level] = np.concatenate([self.levels[level], items])
+        self.count += other.count
+        self._compress()
+        return self
+
+    def weighted_items(self):
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(items_), 2.0 ** level) for level, items_ in enumerate(self.levels)])
+        order = np.argsort(items, kind="stable")
+        return items[order], weights[order]
+
+    def quantile(self, q):
+        if self.count == 0:
+            return float("nan")
+        items, weights = self.weighted_items()
+        cumulative = np.cumsum(weights)
+        target = q * cumulative[-1]
+        if q == 0.5 and len(self.levels) == 1:
+            return float(np.median(items))  # exact and matching pandas while nothing was compacted
+        return float(items[min(np.searchsorted(cumulative, target, side="left"), len(items) - 1)])
+
+    def histogram(self, bin_edges):
+        """Approximate counts per bin, scaled so they sum to ``count``."""
+        items, weights = self.weighted_items()
+        counts, _ = np.histogram(items, bins=bin_edges, weights=weights)
+        return np.round(counts).astype(np.int64)
+
+
+class TopK:
+    """
+    Misra-Gries heavy hitters. Counts are exact while at most ``capacity``
+    distinct values have been seen; afterwards each is an underestimate by at
+    most ``error``.
+    """
+
+    def __init__(self, capacity=TOPK_CAPACITY):
+        self.capacity = capacity
+        self.counts = pd.Series(dtype="int64")
+        self.error = 0
+
+    def _trim(self, counts):
+        if len(counts) > self.capacity:
+            cut = int(counts.nlargest(self.capacity + 1).iloc[-1])
+            counts = counts - cut
+            counts = counts[counts > 0]
+            self.error += cut
+        self.counts = counts.astype("int64")
+
+    def update(self, series):
+        chunk = series.dropna().value_counts(sort=False)
+        if isinstance(chunk.index, pd.CategoricalIndex):
+            chunk = chunk[chunk > 0]
+            chunk.index = chunk.index.astype(object)
+        self._trim(chunk if self.counts.empty else self.counts.add(chunk, fill_value=0))
+
+    def merge(self, other):
+        self.error += other.error
+        self._trim(self.counts.add(other.counts, fill_value=0) if len(self.counts) else other.counts)
+        return self
+
+    @property
+    def exact(self):
+        return self.error == 0
+
+    def top(self, n=None):
+        ranked = self.counts.sort_values(ascending=False, kind="stable")
+        return ranked if n is None else ranked.head(n)
@@ -0,0 +1,56 @@
+import pandas as pd
+
+from analysis_cache import AnalysisCache, content_digest, estimate_entry_size
+
+
+def _entry_args():
+    df = pd.DataFrame({'price': [1.0, 2.0, 3.0]})
+    return df, {'total_entries': 3}, {'price': '{"data": []}'}
+
+
+def test_content_digest_is_stable_and_content_addressed():
+    assert content_digest(b'a,b\n1,2\n') == content_digest(b'a,b\n1,2\n')
+    assert content_digest(b'a,b\n1,2\n') != content_digest(b'a,b\n1,3\n')
+
+
+def test_cache_hit_and_miss_counters():
+    cache = AnalysisCache()
+    assert cache.get('abc') is None
+    cache.put('abc', *_entry_args())
+    entry = cache.get('abc')
+    assert entry is not None and entry.report['total_entries'] == 3
+    stats = cache.stats()
+    assert stats['hits'] == 1
+    assert stats['misses'] == 1
+    assert stats['entries'] == 1
+
+
+def test_cache_evicts_least_recently_used_over_max_entries():
+    cache = AnalysisCache(max_entries=2)
+    cache.put('a', *_entry_args())
+    evicted = cache.put('b', *_entry_args())
+    assert evicted.cached
+    cache.get('a')
+    cache.put('c', *_entry_args())
+    assert not evicted.cached
+    assert cache.get('b') is None
+    assert cache.get('a') is not None
+    assert cache.stats()['evictions'] == 1
+
+
+def test_cache_respects_ttl_and_memory_budget():
+    expiring = AnalysisCache(ttl_seconds=0)
+    expiring.put('a', *_entry_args())
+    assert expiring.get('a') is None
+
+    tiny = AnalysisCache(max_bytes=1)
+    entry = tiny.put('a', *_entry_args())
+    assert not entry.cached
+    assert tiny.stats()['entries'] == 0
+    assert tiny.stats()['bytes'] == 0
+
+
+def test_entry_size_counts_predictions_without_walking_the_report():
+    df, _, charts = _entry_args()
+    base = estimate_entry_size(df, charts)
+    assert estimate_entry_size(df, charts, predictions=[0.5] * 1000) == base + 8000
@@ -0,0 +1,61 @@
+import asyncio
+import threading
+
+from auth_store import MemoryUserStore, PasswordHasher, SessionTokens, SQLiteUserStore
+from workers import WorkerPoolFull
+
+
+def test_sqlite_store_is_shared_between_instances(tmp_path):
+    path = str(tmp_path / "users.db")
+    first, second = SQLiteUserStore(path, pool_size=2), SQLiteUserStore(path, pool_size=2)
+    try:
+        assert first.create_user("ana", "hash-1")
+        assert not second.create_user("ana", "hash-2")
+        assert second.get_password_hash("ana") == "hash-1"
+        assert first.get_password_hash("bo") is None
+
+        threads = [threading.Thread(target=first.create_user, args=(f"user{i}", "h")) for i in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert all(second.get_password_hash(f"user{i}") == "h" for i in range(20))
+    finally:
+        first.close()
+        second.close()
+
+
+def test_tokens_resolve_from_cache_until_revoked(tmp_path):
+    store = SQLiteUserStore(str(tmp_path / "users.db"), pool_size=1)
+    tokens = SessionTokens(store, ttl_seconds=60, cache_seconds=30)
+    token = tokens.issue("ana")
+    assert tokens.resolve(token) == "ana" and tokens.hits == 1
+
+    # Another worker has no cached copy and falls back to the store once
+    other = SessionTokens(store)
+    assert other.resolve(token) == "ana" and other.misses == 1
+    assert other.resolve(token) == "ana" and other.hits == 1
+
+    tokens.revoke(token)
+    assert tokens.resolve(token) is None
+    assert tokens.resolve("never-issued") is None
+    store.close()
+
+
+def test_expired_tokens_are_rejected():
+    tokens = SessionTokens(MemoryUserStore(), ttl_seconds=-1)
+    assert tokens.resolve(tokens.issue("ana")) is None
+
+
+def test_hasher_round_trips_and_bounds_waiting_calls():
+    async def scenario():
+        hasher = PasswordHasher(max_workers=1, max_pending=1, rounds=4)
+        hashed = await hasher.hash("s3cret")
+        assert await hasher.verify("s3cret", hashed)
+        assert not await hasher.verify("wrong", hashed)
+        assert not await hasher.verify("s3cret", "not-a-bcrypt-hash")
+        results = await asyncio.gather(*(hasher.hash("x") for _ in range(3)), return_exceptions=True)
+        assert sum(isinstance(result, WorkerPoolFull) for result in results) == 1
+        hasher.shutdown()
+
+    asyncio.run(scenario())
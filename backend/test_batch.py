@@ -0,0 +1,103 @@
+import io
+import os
+import pickle
+import zipfile
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import batch
+from batch import BatchError, combine_member_stats, discard_batch, member_stats, split_batch
+from profiler import profile_dataframe
+
+
+def make_zip(files):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        for name, data in files.items():
+            archive.writestr(name, data)
+    return buffer.getvalue()
+
+
+def make_workbook(sheets):
+    buffer = io.BytesIO()
+    with pd.ExcelWriter(buffer) as writer:
+        for name, df in sheets.items():
+            df.to_excel(writer, sheet_name=name, index=False)
+    return buffer.getvalue()
+
+
+@pytest.fixture(autouse=True)
+def batch_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(batch, "BATCH_DIR", str(tmp_path))
+    return tmp_path
+
+
+def test_archive_members_skip_folders_and_expand_workbook_sheets():
+    workbook = make_workbook({"North": pd.DataFrame({"x": [1, 2]}), "South": pd.DataFrame({"x": [3]})})
+    contents = make_zip({"east.csv": "x\n4\n", "__MACOSX/._east.csv": "junk", "notes.md": "skip me",
+                         "west/regions.xlsx": workbook})
+    members = split_batch(contents)
+    assert [member.name for member in members] == ["east.csv", "west/regions.xlsx:North", "west/regions.xlsx:South"]
+    assert members[2].read()["x"].tolist() == [3]
+
+
+def test_workbook_splits_into_sheets_and_limits_apply():
+    workbook = make_workbook({"A": pd.DataFrame({"x": [1]}), "B": pd.DataFrame({"x": [2]})})
+    assert [member.sheet for member in split_batch(workbook)] == ["A", "B"]
+    with pytest.raises(BatchError):
+        split_batch(workbook, max_members=1)
+    with pytest.raises(BatchError):
+        split_batch(make_zip({"big.csv": "x\n" + "1\n" * 100}), max_member_bytes=10)
+    with pytest.raises(BatchError):
+        split_batch(b"x,y\n1,2\n")
+
+
+def test_archive_limits_are_checked_before_extraction_and_members_stay_lazy(monkeypatch):
+    archive = make_zip({"a.csv": "x\n" + "1\n" * 50, "b.csv": "x\n" + "2\n" * 50})
+    extracted = []
+    read = zipfile.ZipFile.read
+
+    def tracked_read(self, name, pwd=None):
+        extracted.append(name)
+        return read(self, name, pwd)
+
+    monkeypatch.setattr(zipfile.ZipFile, "read", tracked_read)
+    with pytest.raises(BatchError, match="at most 1"):
+        split_batch(archive, max_members=1)
+    with pytest.raises(BatchError, match="together"):
+        split_batch(archive, max_total_bytes=150)
+    members = split_batch(archive)
+    assert extracted == []
+    assert members[1].read()["x"].tolist() == [2] * 50
+    assert extracted == ["b.csv"]
+
+
+def test_members_are_sent_to_workers_as_a_path_and_the_file_is_discarded(batch_dir):
+    archive = make_zip({f"{name}.csv": "x\n" + "1\n" * 20000 for name in "abc"})
+    with pytest.raises(BatchError):
+        split_batch(archive, max_members=1)
+    assert os.listdir(batch_dir) == []
+    members = split_batch(archive)
+    assert all(len(pickle.dumps(member)) < 1000 < len(archive) for member in members)
+    assert len(pickle.loads(pickle.dumps(members[2])).read()) == 20000
+    discard_batch(members)
+    assert os.listdir(batch_dir) == []
+
+
+def test_combined_summary_pools_moments_exactly():
+    rng = np.random.default_rng(0)
+    north = pd.DataFrame({"amount": rng.normal(50, 5, 300), "region": "N"})
+    south = pd.DataFrame({"amount": rng.normal(80, 9, 200), "channel": rng.choice(["web", "store"], 200)})
+    south.loc[:9, "amount"] = np.nan
+    summary = combine_member_stats({"north": member_stats(profile_dataframe(north)),
+                                    "south": member_stats(profile_dataframe(south))})
+    combined = pd.concat([north, south], ignore_index=True)
+    amount = summary["numeric"]["amount"]
+    assert summary["total_rows"] == 500 and summary["common_columns"] == ["amount"]
+    assert amount["count"] == 490
+    assert np.isclose(amount["mean"], combined["amount"].mean())
+    assert np.isclose(amount["std"], combined["amount"].std())
+    assert amount["max"] == combined["amount"].max()
+    assert summary["categorical"]["channel"]["by_member"] == {"south": 2}
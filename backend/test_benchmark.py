@@ -0,0 +1,33 @@
+from benchmark import compare_to_baseline, generate_dataset, run_benchmark, save_baseline, load_baseline
+
+
+def test_generated_dataset_is_seeded_and_honours_the_spec():
+    df = generate_dataset(rows=2000, numeric_columns=3, categorical_columns=18, null_rate=0.1, cardinality=5, seed=7)
+    again = generate_dataset(rows=2000, numeric_columns=3, categorical_columns=18, null_rate=0.1, cardinality=5, seed=7)
+    assert df.equals(again)
+    assert df.shape == (2000, 1 + 3 + 18)
+    assert list(df.columns[:3]) == ["companyName", "Age", "Frequency_of_Purchase"]
+    assert df["Gender"].nunique() == 5
+    assert 0.05 < df["Age"].isna().mean() < 0.15
+    assert 0.05 < df["Category_17"].isna().mean() < 0.15
+    # Zipf-like: the first level is the most common
+    assert df["Gender"].value_counts().index[0] == "Gender_0"
+
+
+def test_benchmark_times_every_stage_and_flags_regressions(tmp_path):
+    result = run_benchmark(rows=500, numeric_columns=4, categorical_columns=3, repeat=1, charts=False)
+    assert {"parse", "identify_features", "preprocess_columns", "get_model_prediction",
+            "recommendations", "serialize"} <= set(result["stages_ms"])
+    assert "charts" not in result["stages_ms"]
+    assert result["response_bytes"] > 0
+    growth = result["stage_rss_growth_mb"]
+    assert set(growth) == set(result["stages_ms"])
+    assert all(mb is None or mb >= 0 for mb in growth.values())
+
+    path = save_baseline(result, str(tmp_path / "baseline.json"))
+    baseline = load_baseline(path)
+    assert compare_to_baseline(result, baseline) == {}
+
+    slower = {**result, "stages_ms": {**result["stages_ms"], "parse": result["stages_ms"]["parse"] * 2 + 10}}
+    assert set(compare_to_baseline(slower, baseline)) == {"parse"}
+    assert compare_to_baseline({**slower, "scenario": "other"}, baseline) == {}
@@ -0,0 +1,31 @@
+import numpy as np
+import pandas as pd
+
+from charts import bar_payload, compact_charts
+from profiler import profile_dataframe
+
+
+def test_compact_histogram_carries_bins_not_rows():
+    df = pd.DataFrame({'amount': np.arange(100_000, dtype=float)})
+    payload = compact_charts(profile_dataframe(df))['amount']
+    assert payload['type'] == 'histogram'
+    assert len(payload['bin_edges']) == 31
+    assert len(payload['counts']) == 30
+    assert sum(payload['counts']) == 100_000
+
+
+def test_bar_payload_folds_tail_into_other():
+    value_counts = pd.Series([50, 30, 10, 5, 5], index=['a', 'b', 'c', 'd', 'e'])
+    payload = bar_payload('segment', value_counts, top_n=2, null_count=4)
+    assert payload['categories'] == ['a', 'b']
+    assert payload['counts'] == [50, 30]
+    assert payload['other_count'] == 20
+    assert payload['other_categories'] == 3
+    assert payload['null_count'] == 4
+
+
+def test_compact_bar_counts_the_tail_the_profile_dropped():
+    df = pd.DataFrame({'segment': ['a'] * 40 + ['b'] * 30 + [f'x{i}' for i in range(30)]})
+    payload = compact_charts(profile_dataframe(df, top_values=5), top_n=2)['segment']
+    assert payload['counts'] == [40, 30]
+    assert payload['other_count'] == 30 and payload['other_categories'] == 30
@@ -0,0 +1,178 @@
+import asyncio
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from gemini_client import GeminiClient, GeminiError, TTLCache, extract_candidate_text, prompt_cache_key
+
+
+class StubGemini:
+    """Local stand-in for the generateContent endpoint."""
+
+    def __init__(self):
+        self.requests = []
+        self.failures = []  # status codes returned before succeeding
+        self.stream_tail = []  # extra chunks sent after the streamed tokens
+        handler = self._handler()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/models/stub:generateContent"
+        threading.Thread(target=self.server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True).start()
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                stub.requests.append((dict(self.headers), body))
+                if ":streamGenerateContent" in self.path and not stub.failures:
+                    self._stream(body["contents"][0]["parts"][0]["text"])
+                    return
+                if stub.failures:
+                    status, payload = stub.failures.pop(0), {"error": "busy"}
+                else:
+                    prompt = body["contents"][0]["parts"][0]["text"]
+                    status, payload = 200, {"candidates": [{"content": {"parts": [{"text": f"echo: {prompt}"}]}}]}
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _stream(self, prompt):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.end_headers()
+                chunks = [{"candidates": [{"content": {"parts": [{"text": token}]}}]} for token in ["echo:", " ", prompt]]
+                for chunk in chunks + stub.stream_tail:
+                    self.wfile.write(f"data: {json.dumps(chunk)}\r\n\r\n".encode())
+                    self.wfile.flush()
+                self.close_connection = True
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+@pytest.fixture
+def stub():
+    server = StubGemini()
+    yield server
+    server.server.shutdown()
+
+
+def _client(stub, **kwargs):
+    return GeminiClient(api_url=stub.url, backoff_base=0.01, **kwargs)
+
+
+def test_generate_sends_key_in_header_and_caches_answers(stub):
+    client = _client(stub)
+
+    async def scenario():
+        first = await client.generate("hello", "secret", cache_key="k")
+        second = await client.generate("hello", "secret", cache_key="k")
+        await client.aclose()
+        return first, second
+
+    assert asyncio.run(scenario()) == ("echo: hello", "echo: hello")
+    assert len(stub.requests) == 1
+    headers, _ = stub.requests[0]
+    assert headers["x-goog-api-key"] == "secret"
+    assert client.cache.stats()["hits"] == 1
+
+
+def test_client_from_a_finished_loop_is_closed_before_replacing_it(stub):
+    client = _client(stub)
+    assert asyncio.run(client.generate("first", "k")) == "echo: first"
+    stale = client._http
+    assert asyncio.run(client.generate("second", "k")) == "echo: second"
+    assert stale.is_closed and client._http is not stale
+    asyncio.run(client.aclose())
+
+
+def test_retries_transient_errors_then_gives_up(stub):
+    stub.failures = [503, 429]
+    client = _client(stub, max_retries=2)
+    assert asyncio.run(client.generate("retry me", "k")) == "echo: retry me"
+    assert len(stub.requests) == 3
+
+    stub.failures = [503] * 5
+    with pytest.raises(GeminiError):
+        asyncio.run(_client(stub, max_retries=1).generate("again", "k"))
+
+
+def test_client_errors_are_not_retried(stub):
+    stub.failures = [400]
+    with pytest.raises(GeminiError):
+        asyncio.run(_client(stub, max_retries=3).generate("bad", "k"))
+    assert len(stub.requests) == 1
+
+
+def test_prompt_cache_key_normalizes_request_fields():
+    key = prompt_cache_key("How  do I grow?", "ctx\nrows", ["Teens", "Adults"])
+    assert key == prompt_cache_key(" how do i grow? ", "ctx rows", ["adults", "teens"])
+    assert key != prompt_cache_key("How do I shrink?", "ctx rows", ["adults", "teens"])
+
+
+def test_ttl_cache_expires_and_evicts():
+    cache = TTLCache(max_entries=1, ttl_seconds=60)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") is None and cache.get("b") == 2
+    expired = TTLCache(ttl_seconds=0)
+    expired.put("a", 1)
+    assert expired.get("a") is None
+
+
+def test_extract_candidate_text_variants():
+    assert extract_candidate_text({"candidates": [{"parts": ["a", {"text": "b"}]}]}) == "a b"
+    assert extract_candidate_text({"candidates": []}) == "No response from Gemini AI"
+    assert extract_candidate_text({"candidates": [{"content": {"role": "model"}}]}).startswith("I'm sorry")
+    assert extract_candidate_text({"candidates": [{"content": {"parts": [{"text": "None"}]}}]}).startswith("I'm sorry")
+
+
+def test_stream_generate_yields_tokens_and_records_ttft(stub):
+    client = _client(stub)
+
+    async def collect():
+        chunks = [text async for text in client.stream_generate("hi", "k", cache_key="s")]
+        replay = [text async for text in client.stream_generate("hi", "k", cache_key="s")]
+        await client.aclose()
+        return chunks, replay
+
+    chunks, replay = asyncio.run(collect())
+    assert chunks == ["echo:", " ", "hi"]
+    assert replay == ["echo: hi"]
+    assert len(stub.requests) == 1
+    assert client.stream_stats()["streams"] == 1
+    assert client.stream_stats()["last_ttft_ms"] is not None
+
+
+def test_stream_skips_a_final_chunk_without_parts(stub):
+    stub.stream_tail = [{"candidates": [{"finishReason": "MAX_TOKENS", "content": {"role": "model"}}]}]
+    client = _client(stub)
+
+    async def collect():
+        chunks = [text async for text in client.stream_generate("hi", "k", cache_key="t")]
+        replay = [text async for text in client.stream_generate("hi", "k", cache_key="t")]
+        await client.aclose()
+        return chunks, replay
+
+    chunks, replay = asyncio.run(collect())
+    assert chunks == ["echo:", " ", "hi"]
+    assert replay == ["echo: hi"]
+
+
+def test_stream_retries_before_first_byte(stub):
+    stub.failures = [503]
+    client = _client(stub, max_retries=1)
+
+    async def collect():
+        return [text async for text in client.stream_generate("again", "k")]
+
+    assert "".join(asyncio.run(collect())) == "echo: again"
+    assert len(stub.requests) == 2
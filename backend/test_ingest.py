@@ -0,0 +1,119 @@
+import io
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from ingest import RunningColumnStats, compact_dtypes, detect_format, read_upload, stream_csv_histograms, stream_csv_statistics
+
+
+def _csv(df):
+    return io.BytesIO(df.to_csv(index=False).encode())
+
+
+def test_running_stats_match_pandas_across_chunks():
+    rng = np.random.default_rng(7)
+    df = pd.DataFrame({
+        'price': rng.normal(40, 5, 1000),
+        'region': rng.choice(['north', 'south', 'east'], 1000),
+    })
+    df.loc[::10, 'price'] = np.nan
+    dataset = stream_csv_statistics(_csv(df), chunk_rows=128)
+
+    assert dataset.total_rows == 1000
+    assert dataset.numeric_cols == ['price']
+    assert dataset.categorical_cols == ['region']
+    price = dataset.columns['price']
+    assert price.count == df['price'].count()
+    assert price.nulls == df['price'].isna().sum()
+    assert np.isclose(price.mean, df['price'].mean())
+    assert price.median_is_exact
+    assert np.isclose(price.median, df['price'].median())
+    region = dataset.columns['region']
+    assert region.nunique == 3
+    assert region.top_values().to_dict() == df['region'].value_counts().to_dict()
+
+
+def test_column_demoted_when_text_appears_in_later_chunk():
+    df = pd.DataFrame({'code': ['1'] * 50 + ['A7'] * 50})
+    dataset = stream_csv_statistics(_csv(df), chunk_rows=20)
+    assert dataset.categorical_cols == ['code']
+    assert np.isnan(dataset.columns['code'].mean)
+
+
+def test_value_counts_are_bounded():
+    stats = RunningColumnStats('id', max_tracked_values=10)
+    for start in range(0, 100, 25):
+        stats.update(pd.Series([f'user{i}' for i in range(start, start + 25)]))
+    assert stats.truncated
+    assert stats.nunique == 10
+    assert stats.count == 100
+
+
+def test_histogram_pass_bins_every_value():
+    df = pd.DataFrame({'amount': np.arange(300, dtype=float)})
+    source = _csv(df)
+    dataset = stream_csv_histograms(source, stream_csv_statistics(source, chunk_rows=64), nbins=30)
+    stats = dataset.columns['amount']
+    assert len(stats.bin_edges) == 31
+    assert stats.bin_counts.sum() == 300
+
+
+def test_detect_format_uses_magic_bytes():
+    df = pd.DataFrame({'a': [1, 2], 'b': ['x', None]})
+    parquet = io.BytesIO()
+    df.to_parquet(parquet)
+    assert detect_format(parquet.getvalue()[:8]) == 'parquet'
+    assert detect_format(b'ARROW1\x00\x00') == 'arrow'
+    assert detect_format(b'\xff\xff\xff\xff\x10\x00') == 'arrow_stream'
+    assert detect_format(b'PK\x03\x04rest') == 'xlsx'
+    assert detect_format(b'a,b\n1,2') == 'csv'
+
+
+def test_columnar_uploads_match_the_csv_reading():
+    csv = b"amount,region,when,note\n1.5,N,2024-01-01,\n2,,2024-02-01,hi\n,S,2024-03-01,yo\n"
+    expected = pd.read_csv(io.BytesIO(csv))
+    arrow_csv = read_upload(csv, csv_engine='arrow')
+    assert str(arrow_csv['region'].dtype) == 'string'
+    assert arrow_csv['when'].tolist() == ['2024-01-01', '2024-02-01', '2024-03-01']
+    pd.testing.assert_frame_equal(arrow_csv.astype(object).where(arrow_csv.notna(), None),
+                                  expected.astype(object).where(expected.notna(), None))
+
+    table = pa.Table.from_pandas(expected)
+    parquet = io.BytesIO()
+    pq.write_table(table, parquet)
+    ipc = io.BytesIO()
+    with pa.ipc.new_file(ipc, table.schema) as writer:
+        writer.write_table(table)
+    for contents in (parquet.getvalue(), ipc.getvalue()):
+        df = read_upload(contents)
+        assert df['amount'].equals(expected['amount'])
+        assert df['region'].isna().tolist() == [False, True, False]
+
+
+def test_csv_with_duplicate_headers_falls_back_to_pandas():
+    df = read_upload(b"a,a\n1,2\n", csv_engine='arrow')
+    assert list(df.columns) == ['a', 'a.1']
+
+
+def test_compact_dtypes_shrinks_without_changing_values():
+    df = pd.DataFrame({
+        'count':  [1, 2, 300, 4],
+        'rating': [1.5, np.nan, 2.25, 4.0],
+        'amount': [0.1, 0.2, 0.3, 0.4],
+        'region': ['N', 'N', 'N', None],
+        'id':     ['a', 'b', 'c', 'd'],
+        'mixed':  [1, 'x', None, 2.5],
+    })
+    original = df.copy()
+    compact = compact_dtypes(df)
+    assert compact is df
+    assert str(compact['count'].dtype) == 'int16'
+    assert str(compact['rating'].dtype) == 'float32'
+    assert str(compact['amount'].dtype) == 'float64'  # 0.1 is not exact in float32
+    assert str(compact['region'].dtype) == 'category'
+    assert compact['id'].dtype == object and compact['mixed'].dtype == object
+    for col in ('count', 'rating', 'amount'):
+        pd.testing.assert_series_equal(compact[col].astype('float64'), original[col].astype('float64'))
+    assert compact['region'].astype(object).where(compact['region'].notna(), None).tolist() == original['region'].tolist()
@@ -10,6 +10,16 @@ from main import (
     generate_column_specific_recommendations
 )
 
+@pytest.fixture
+def thread_pool(monkeypatch):
+    """Run analyses in the server's thread pool rather than spawning worker processes."""
+    import main
+    from workers import AnalysisWorkerPool
+
+    pool = AnalysisWorkerPool(max_workers=0, max_pending=2)
+    monkeypatch.setattr(main, "analysis_pool", pool)
+    return pool
+
 # A simple mock to replace your real XGBoost model
 class MockModel:
     def predict(self, X):
@@ -123,3 +133,573 @@ def test_generate_column_specific_recommendations_basic():
     assert any('rating' in k for k in recs)
     assert any('frequency' in k for k in recs)
     assert any('category' in k for k in recs)
+
+
+def test_analyze_upload_reuses_cached_analysis(monkeypatch, thread_pool):
+    """A repeat upload of the same bytes must not be parsed or analysed again."""
+    import asyncio
+    import main
+
+    main.analysis_cache.clear()
+    contents = b"price,category\n10,A\n20,B\n"
+    first = asyncio.run(main.analyze_upload(contents, "data.csv"))
+    assert {'parse', 'preprocess', 'predict', 'charts'} <= set(first.timings)
+
+    def fail(*args, **kwargs):
+        raise AssertionError("cached upload was re-analysed")
+
+    monkeypatch.setattr(main, "run_analysis_pipeline", fail)
+    second = asyncio.run(main.analyze_upload(contents, "data.csv"))
+    assert second is first
+    assert main.analysis_cache.stats()['hits'] >= 1
+
+
+def test_stream_consumer_report_matches_in_memory_report():
+    """Chunked analysis must agree with the in-memory report on summary and recommendations."""
+    import io
+    import main
+
+    df = pd.DataFrame({
+        'price':    np.linspace(10, 90, 200),
+        'rating':   np.tile([2.0, 4.0, 5.0, np.nan], 50),
+        'category': np.tile(['A', 'B', 'C', 'D'], 50),
+        'Frequency_of_Purchase': np.tile([1, 3, 8, 12], 50),
+    })
+    source = io.BytesIO(df.to_csv(index=False).encode())
+    streamed, _ = main.stream_consumer_report(source, chunk_rows=32)
+    expected = main.generate_consumer_report(pd.read_csv(io.BytesIO(source.getvalue())))
+
+    for key in ('total_entries', 'total_columns', 'general_summary', 'extended_context',
+                'column_specific_recommendations', 'company_name'):
+        assert streamed[key] == expected[key]
+    # Chunk boundaries must not change what the model sees
+    assert isinstance(expected['prediction'], list)
+    assert streamed['prediction'] == expected['prediction']
+
+
+def test_stream_consumer_report_skips_prediction_without_fitted_preprocessing(monkeypatch):
+    """Without raw-input model or artifact, chunks are not refitted and scored one by one."""
+    import io
+    import main
+
+    class FittedOnFeatures:
+        raw_input = False
+
+        def predict(self, frame):
+            raise AssertionError("streamed chunk was scored with per-chunk preprocessing")
+
+    monkeypatch.setattr(main, "current_model", lambda: FittedOnFeatures())
+    monkeypatch.setattr(main, "preprocessing_artifact", None)
+    df = pd.DataFrame({'price': np.linspace(10, 90, 100), 'category': np.tile(['A', 'B'], 50)})
+    streamed, _ = main.stream_consumer_report(io.BytesIO(df.to_csv(index=False).encode()), chunk_rows=32)
+
+    assert streamed['prediction'] == "No prediction available"
+    assert streamed['total_entries'] == 100
+
+
+def test_recommend_business_returns_503_when_workers_are_saturated(monkeypatch):
+    """A full analysis queue sheds load with 503 + Retry-After instead of queueing forever."""
+    from fastapi.testclient import TestClient
+    import main
+    from workers import AnalysisWorkerPool
+
+    pool = AnalysisWorkerPool(max_workers=0, max_pending=0, retry_after=7)
+    pool._active = pool.capacity
+    monkeypatch.setattr(main, "analysis_pool", pool)
+    main.analysis_cache.clear()
+
+    client = TestClient(main.app)
+    response = client.post("/recommend-business",
+                           files={"file": ("data.csv", b"price\n1\n2\n", "text/csv")})
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "7"
+
+
+def test_profile_drives_preprocessing_and_recommendations():
+    """Passing a profile must give the same results as profiling on the fly."""
+    from profiler import profile_dataframe
+
+    df = pd.DataFrame({
+        'price':    [10.0, np.nan, 30.0, 50.0],
+        'rating':   [2.0, 4.0, 5.0, 3.0],
+        'category': ['X', None, 'Y', 'X'],
+    })
+    profile = profile_dataframe(df)
+    assert profile.numeric_cols == ['price', 'rating']
+    assert profile['price'].median == df['price'].median()
+
+    with_profile, _, _ = preprocess_columns(df.copy(), profile)
+    without_profile, _, _ = preprocess_columns(df.copy())
+    pd.testing.assert_frame_equal(with_profile, without_profile)
+    assert generate_column_specific_recommendations(df, profile) == generate_column_specific_recommendations(df)
+
+
+def test_lazy_charts_are_served_per_column(thread_pool):
+    """charts=lazy skips figure building; each column is fetched from the cached analysis."""
+    import json
+    from fastapi.testclient import TestClient
+    import main
+
+    main.analysis_cache.clear()
+    client = TestClient(main.app)
+    body = client.post("/recommend-business?charts=lazy",
+                       files={"file": ("data.csv", b"price,region\n10,N\n20,S\n30,N\n", "text/csv")}).json()
+    assert "charts_by_column" not in body
+    assert body["chart_columns"] == ["price", "region"]
+    assert "charts" not in body["timings"]
+
+    compact = client.get(f"/charts/{body['analysis_id']}", params={"column": "region"}).json()
+    assert compact["categories"] == ["N", "S"] and compact["counts"] == [2, 1]
+    full = client.get(f"/charts/{body['analysis_id']}", params={"column": "price", "format": "full"})
+    assert full.status_code == 200
+    assert json.loads(full.text)["layout"]["title"]["text"] == "Distribution of price"
+    assert client.get("/charts/unknown", params={"column": "price"}).status_code == 404
+
+
+def test_lazy_charts_fall_back_to_inline_when_the_analysis_is_not_cached(monkeypatch, thread_pool):
+    """An analysis too big for the cache gets no id to fetch from; its charts come compact inline."""
+    from fastapi.testclient import TestClient
+    import main
+    from analysis_cache import AnalysisCache
+
+    monkeypatch.setattr(main, "analysis_cache", AnalysisCache(max_bytes=1))
+    client = TestClient(main.app)
+    body = client.post("/recommend-business?charts=lazy",
+                       files={"file": ("data.csv", b"price,region\n10,N\n20,S\n30,N\n", "text/csv")}).json()
+    assert "analysis_id" not in body and "chart_columns" not in body
+    assert body["charts_by_column"]["region"]["counts"] == [2, 1]
+
+
+def test_summary_predictions_are_sent_inline_when_the_analysis_is_not_cached(monkeypatch, thread_pool):
+    """Without a cached analysis there is nothing to page, so no predictions_url is advertised."""
+    from fastapi.testclient import TestClient
+    import main
+    from analysis_cache import AnalysisCache
+
+    monkeypatch.setattr(main, "analysis_cache", AnalysisCache(max_bytes=1))
+    client = TestClient(main.app)
+    contents = b"Age,Frequency_of_Purchase\n25,3\n40,8\n61,1\n"
+    body = client.post("/recommend-business?predictions=summary&charts=compact",
+                       files={"file": ("data.csv", contents, "text/csv")}).json()
+    assert "predictions_url" not in body
+    assert isinstance(body["consumer_report"]["prediction"], list)
+    full = client.post("/recommend-business?charts=compact", files={"file": ("data.csv", contents, "text/csv")}).json()
+    assert body["consumer_report"]["prediction"] == full["consumer_report"]["prediction"]
+
+
+def test_consumer_report_scores_raw_columns_with_registered_model():
+    """The bundled pipeline scores the raw upload without mutating it."""
+    import main
+
+    if main.current_model() is None:
+        pytest.skip("bundled model could not be loaded")
+    df = pd.DataFrame({
+        'Age':                   [25, 40, 61],
+        'Gender':                ['Female', 'Male', None],
+        'Frequency_of_Purchase': [2.0, 7.0, np.nan],
+    })
+    before = df.copy()
+    report = main.generate_consumer_report(df)
+    assert isinstance(report['prediction'], list)
+    assert len(report['prediction']) == 3
+    pd.testing.assert_frame_equal(df, before)
+
+
+def test_gemini_chatbot_answers_repeat_questions_from_cache(monkeypatch):
+    """The endpoint goes through the pooled client and serves repeats from its cache."""
+    from fastapi.testclient import TestClient
+    import main
+    from test_gemini_client import StubGemini
+    from gemini_client import GeminiClient
+
+    stub = StubGemini()
+    try:
+        monkeypatch.setenv("GEMINI_API_KEY", "test-key")
+        monkeypatch.setattr(main, "gemini_client", GeminiClient(api_url=stub.url))
+        client = TestClient(main.app)
+        body = {"query": "Grow sales?", "datasetContext": "Columns: price", "customerSegments": ["Teens"]}
+        first = client.post("/gemini-chatbot", json=body).json()
+        second = client.post("/gemini-chatbot", json={**body, "query": "grow  sales?"}).json()
+        assert first["response"].startswith("echo: Based on the detailed dataset")
+        assert second == first
+        assert len(stub.requests) == 1
+    finally:
+        stub.server.shutdown()
+
+
+def test_gemini_chatbot_stream_emits_sse_tokens(monkeypatch):
+    """The streaming endpoint relays upstream tokens as SSE and finishes with timing."""
+    import json
+    from fastapi.testclient import TestClient
+    import main
+    from test_gemini_client import StubGemini
+    from gemini_client import GeminiClient
+
+    stub = StubGemini()
+    try:
+        monkeypatch.setenv("GEMINI_API_KEY", "test-key")
+        monkeypatch.setattr(main, "gemini_client", GeminiClient(api_url=stub.url))
+        client = TestClient(main.app)
+        body = {"query": "Grow sales?", "datasetContext": "Columns: price", "customerSegments": []}
+        with client.stream("POST", "/gemini-chatbot/stream", json=body) as response:
+            assert response.headers["content-type"].startswith("text/event-stream")
+            raw = "".join(response.iter_text())
+        events = [block.split("\n") for block in raw.strip().split("\n\n")]
+        names = [lines[0].removeprefix("event: ") for lines in events]
+        payloads = [json.loads(lines[1].removeprefix("data: ")) for lines in events]
+        assert names[:-1] == ["token"] * (len(names) - 1) and names[-1] == "done"
+        assert "".join(p["text"] for p in payloads[:-1]).startswith("echo: Based on the detailed dataset")
+        assert payloads[-1]["ttft_ms"] is not None
+    finally:
+        stub.server.shutdown()
+
+
+def test_report_jobs_are_submitted_polled_and_downloaded(monkeypatch, tmp_path, thread_pool):
+    """POST /reports answers 202 at once; the finished PDF is served from the result store."""
+    import time
+    from fastapi.testclient import TestClient
+    import main
+    from report_jobs import ReportJobQueue
+    from test_report_jobs import fake_renderer
+
+    monkeypatch.setattr(main, "report_jobs",
+                        ReportJobQueue(result_dir=str(tmp_path / "reports"), renderer=fake_renderer(tmp_path)))
+    main.analysis_cache.clear()
+    upload = {"file": ("data.csv", b"price,region\n10,N\n20,S\n", "text/csv")}
+    with TestClient(main.app) as client:
+        submitted = client.post("/reports", files=upload)
+        assert submitted.status_code == 202
+        job_id = submitted.json()["job_id"]
+        deadline = time.time() + 10
+        status = client.get(f"/reports/{job_id}").json()
+        while status["status"] not in ("done", "failed") and time.time() < deadline:
+            time.sleep(0.02)
+            status = client.get(f"/reports/{job_id}").json()
+        assert status["status"] == "done", status
+        pdf = client.get(status["download_url"])
+        assert pdf.headers["content-type"] == "application/pdf"
+        assert pdf.content.startswith(b"%PDF") and b"Consumer Shopping Behaviour Report" in pdf.content
+        assert client.get("/reports/00000000-0000-0000-0000-000000000000").status_code == 404
+
+        direct = client.post("/download-report-pdf", files=upload)
+        assert direct.headers["content-type"] == "application/pdf"
+        assert "_Report.pdf" in direct.headers["content-disposition"]
+
+    # A full job queue sheds new reports with 503 + Retry-After
+    monkeypatch.setattr(main, "report_jobs", ReportJobQueue(result_dir=str(tmp_path / "reports"), max_pending=0,
+                                                            retry_after=4))
+    busy = TestClient(main.app).post("/reports", files=upload)
+    assert busy.status_code == 503 and busy.headers["Retry-After"] == "4"
+
+
+def test_metrics_endpoint_and_server_timing_header(thread_pool):
+    """Analysis stages reach the Server-Timing header on request and the /metrics histograms."""
+    from fastapi.testclient import TestClient
+    import main
+
+    main.analysis_cache.clear()
+    client = TestClient(main.app)
+    upload = {"file": ("data.csv", b"price,region\n10,N\n20,S\n30,N\n", "text/csv")}
+    response = client.post("/recommend-business?charts=compact", files=upload, headers={"X-Debug-Timing": "1"})
+    stages = [entry.split(";")[0] for entry in response.headers["Server-Timing"].split(", ")]
+    assert {"upload_read", "parse", "profile", "preprocess", "predict", "compact_charts", "serialize",
+            "total"} <= set(stages)
+    assert "Server-Timing" not in client.post("/recommend-business?charts=compact", files=upload).headers
+
+    metrics = client.get("/metrics")
+    assert metrics.headers["content-type"].startswith("text/plain")
+    assert 'marketpulse_stage_duration_seconds_count{stage="parse"}' in metrics.text
+    assert 'route="/recommend-business",status="200"' in metrics.text
+    assert 'marketpulse_upload_bytes_count{route="/recommend-business"} ' in metrics.text
+    assert "marketpulse_analysis_rows_per_second_count " in metrics.text
+
+
+def test_recommend_business_accepts_parquet_whatever_the_filename(thread_pool):
+    import io
+    from fastapi.testclient import TestClient
+    import main
+
+    main.analysis_cache.clear()
+    buffer = io.BytesIO()
+    pd.DataFrame({'price': [10.0, 20.0, 30.0], 'region': ['N', 'S', 'N']}).to_parquet(buffer)
+    body = TestClient(main.app).post("/recommend-business?charts=compact",
+                                     files={"file": ("export.bin", buffer.getvalue())}).json()
+    assert body["insights"] == {"total_entries": 3, "total_columns": 2}
+    assert body["charts_by_column"]["region"]["categories"] == ["N", "S"]
+
+
+def test_preprocessing_a_compacted_frame_matches_and_leaves_it_untouched():
+    from ingest import compact_dtypes
+
+    df = pd.DataFrame({
+        'price':    [10.0, np.nan, 30.0, 50.0, 10.0, 30.0],
+        'count':    [1, 2, 3, 4, 5, 6],
+        'category': ['X', None, 'X', 'X', 'X', 'Y'],
+        'segment':  ['b', 'a', 'b', 'a', 'b', 'a'],
+    })
+    compact = compact_dtypes(df.copy())
+    assert str(compact['category'].dtype) == 'category' and str(compact['count'].dtype) == 'int8'
+    before = compact.copy()
+    processed, encoders, _ = preprocess_columns(compact)
+    expected, expected_encoders, _ = preprocess_columns(df)
+    pd.testing.assert_frame_equal(processed, expected)
+    assert list(encoders['category'].classes_) == list(expected_encoders['category'].classes_)
+    pd.testing.assert_frame_equal(compact, before)
+
+
+def test_dataset_session_appends_only_the_new_rows(monkeypatch, thread_pool):
+    """An append updates the report from sketches without re-reading the first upload."""
+    from fastapi.testclient import TestClient
+    import main
+
+    client = TestClient(main.app)
+    created = client.post("/sessions", files={"file": ("day1.csv", b"price,region\n10,N\n20,S\n30,N\n")})
+    assert created.status_code == 201
+    session_id = created.json()["session_id"]
+
+    parsed = []
+    load = main.load_dataframe
+    monkeypatch.setattr(main, "load_dataframe", lambda contents, filename: parsed.append(filename) or load(contents, filename))
+    body = client.post(f"/sessions/{session_id}/append", files={"file": ("day2.csv", b"price,region\n60,E\n")}).json()
+    assert parsed == ["day2.csv"]
+    assert body["uploads"] == 2
+    assert body["insights"] == {"total_entries": 4, "total_columns": 2}
+    assert "average of numeric variables is 30.00" in body["consumer_report"]["general_summary"]
+    assert body["charts_by_column"]["region"]["categories"][0] == "N"
+    assert sum(body["charts_by_column"]["price"]["counts"]) == 4
+
+    assert client.get(f"/sessions/{session_id}").json()["uploads"] == 2
+    assert "predictions_url" not in body  # no model features in these uploads
+    assert client.delete(f"/sessions/{session_id}").status_code == 200
+    assert client.post(f"/sessions/{session_id}/append", files={"file": ("x.csv", b"price\n1\n")}).status_code == 404
+
+
+def test_session_predictions_are_summarised_and_paged(thread_pool):
+    """Session responses carry a prediction summary; the per-row values come from a paged endpoint."""
+    import io
+    from fastapi.testclient import TestClient
+    import main
+
+    if main.current_model() is None:
+        pytest.skip("bundled model could not be loaded")
+    client = TestClient(main.app)
+    first = "".join(f"{20 + i % 50},{1 + i % 9}\n" for i in range(300))
+    created = client.post("/sessions", files={"file": ("day1.csv", ("Age,Frequency_of_Purchase\n" + first).encode())})
+    session_id = created.json()["session_id"]
+    body = client.post(f"/sessions/{session_id}/append",
+                       files={"file": ("day2.csv", b"Age,Frequency_of_Purchase\n33,4\n51,2\n")}).json()
+    summary = body["consumer_report"]["prediction"]
+    assert summary["count"] == 302 and "quantiles" in summary
+    assert body["predictions_url"] == f"/sessions/{session_id}/predictions"
+
+    page = client.get(body["predictions_url"], params={"limit": 200}).json()
+    assert page["total"] == 302 and len(page["predictions"]) == 200
+    rest = client.get(page["next"]).json()
+    assert rest["offset"] == 200 and len(rest["predictions"]) == 102 and rest["next"] is None
+    npy = client.get(body["predictions_url"], params={"format": "npy", "offset": 300})
+    assert len(np.load(io.BytesIO(npy.content))) == 2
+    assert np.isclose(np.mean(page["predictions"] + rest["predictions"]), summary["mean"])
+
+    client.delete(f"/sessions/{session_id}")
+    assert client.get(body["predictions_url"]).status_code == 404
+
+
+def test_approximate_mode_samples_large_uploads_and_reports_intervals(monkeypatch, thread_pool):
+    from fastapi.testclient import TestClient
+    import main
+    from benchmark import generate_dataset
+
+    monkeypatch.setattr(main, "APPROX_SAMPLE_ABOVE_ROWS", 1000)
+    monkeypatch.setattr(main, "APPROX_SAMPLE_ROWS", 500)
+    main.analysis_cache.clear()
+    contents = generate_dataset(rows=3000, numeric_columns=11, categorical_columns=3, seed=5).to_csv(index=False).encode()
+    client = TestClient(main.app)
+    upload = {"file": ("big.csv", contents, "text/csv")}
+    body = client.post("/recommend-business?charts=compact&approx=true", files=upload).json()
+    report = body["consumer_report"]
+    assert body["insights"]["total_entries"] == 3000
+    assert report["approximation"]["sample_rows"] == 500
+    assert len(report["prediction"]) == 500
+    assert " ± " in report["general_summary"]
+    assert " ± " in report["column_specific_recommendations"]["Purchase_Amount"]
+    assert "sample" in body["timings"]
+    age = body["charts_by_column"]["Age"]
+    assert abs(sum(age["counts"]) + age["null_count"] - 3000) < 60
+
+    exact = client.post("/recommend-business?charts=compact", files=upload).json()
+    assert exact["analysis_id"] != body["analysis_id"]
+    assert "approximation" not in exact["consumer_report"] and len(exact["consumer_report"]["prediction"]) == 3000
+
+    unknown = client.post("/recommend-business?charts=compact&approx=true&strata=Regoin", files=upload)
+    assert unknown.status_code == 422 and "Regoin" in unknown.json()["detail"]
+
+
+def test_batch_endpoint_streams_members_then_summary(thread_pool):
+    """A zip of CSVs is answered with one NDJSON line per member and a combined summary."""
+    import json
+    from fastapi.testclient import TestClient
+    import main
+    from test_batch import make_zip
+
+    archive = make_zip({"north.csv": "price,region\n10,N\n20,N\n", "south.csv": "price,region\n30,S\n",
+                        "broken.parquet": "PAR1 not parquet"})
+    client = TestClient(main.app)
+    with client.stream("POST", "/recommend-business/batch",
+                       files={"file": ("regions.zip", archive, "application/zip")}) as response:
+        assert response.headers["content-type"] == "application/x-ndjson"
+        lines = [json.loads(line) for line in response.iter_lines() if line]
+    assert lines[0] == {"type": "start", "members": ["north.csv", "south.csv", "broken.parquet"]}
+    members = {line["member"]: line for line in lines if line["type"] == "member"}
+    assert members["north.csv"]["insights"]["total_entries"] == 2
+    assert members["south.csv"]["charts_by_column"]["region"]["categories"] == ["S"]
+    assert [line["member"] for line in lines if line["type"] == "error"] == ["broken.parquet"]
+    summary = lines[-1]
+    assert summary["type"] == "summary" and summary["failed"] == ["broken.parquet"]
+    assert summary["total_rows"] == 3 and summary["numeric"]["price"]["mean"] == 20
+    assert client.post("/recommend-business/batch",
+                       files={"file": ("data.csv", b"price\n1\n", "text/csv")}).status_code == 422
+
+
+def test_batch_members_wait_for_a_full_queue_instead_of_failing(monkeypatch, thread_pool):
+    """WorkerPoolFull from the shared queue delays a member; it is retried, not reported as failed."""
+    import json
+    from fastapi.testclient import TestClient
+    import main
+    from test_batch import make_zip
+    from workers import WorkerPoolFull
+
+    run, rejected = thread_pool.run, []
+
+    async def busy_once(fn, *args):
+        if not rejected:
+            rejected.append(args[0].name)
+            raise WorkerPoolFull(0)
+        return await run(fn, *args)
+
+    monkeypatch.setattr(thread_pool, "run", busy_once)
+    archive = make_zip({"north.csv": "price\n10\n", "south.csv": "price\n30\n"})
+    with TestClient(main.app).stream("POST", "/recommend-business/batch",
+                                     files={"file": ("regions.zip", archive, "application/zip")}) as response:
+        lines = [json.loads(line) for line in response.iter_lines() if line]
+    assert rejected == ["north.csv"]
+    assert sorted(line["member"] for line in lines if line["type"] == "member") == ["north.csv", "south.csv"]
+    assert lines[-1]["failed"] == [] and lines[-1]["total_rows"] == 2
+
+
+def test_summary_predictions_are_paged_and_compressed(thread_pool):
+    """predictions=summary keeps per-row values out of the response; they are served from /predictions."""
+    import io
+    from fastapi.testclient import TestClient
+    import main
+
+    if main.current_model() is None:
+        pytest.skip("bundled model could not be loaded")
+    main.analysis_cache.clear()
+    client = TestClient(main.app)
+    rows = "".join(f"{i % 90},{'NS'[i % 2]}\n" for i in range(500))
+    upload = {"file": ("data.csv", ("Age,region\n" + rows).encode(), "text/csv")}
+    response = client.post("/recommend-business?predictions=summary", files=upload,
+                           headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    body = response.json()
+    assert body["consumer_report"]["prediction"]["count"] == 500
+    assert body["charts_by_column"]["Age"]["layout"]["title"]["text"] == "Distribution of Age"
+
+    entry = main.analysis_cache.get(body["predictions_url"].rsplit("/", 1)[1])
+    assert isinstance(entry.predictions, np.ndarray) and len(entry.predictions) == 500
+    page = client.get(body["predictions_url"], params={"limit": 200}).json()
+    assert page["total"] == 500 and len(page["predictions"]) == 200
+    rest = client.get(page["next"]).json()
+    assert rest["offset"] == 200 and len(rest["predictions"]) == 200
+    npy = client.get(body["predictions_url"], params={"format": "npy", "offset": 490})
+    assert len(np.load(io.BytesIO(npy.content))) == 10
+
+
+def test_large_responses_are_serialised_and_compressed_off_the_event_loop(monkeypatch):
+    """dumps always runs in the thread pool; compress does once the body reaches the offload threshold."""
+    import asyncio
+    import gzip
+    import json
+    import threading
+    import main
+
+    threads = {}
+    real_dumps, real_compress = main.dumps, main.compress
+    monkeypatch.setattr(main, "dumps", lambda content: threads.setdefault("dumps", threading.get_ident())
+                        and real_dumps(content))
+    monkeypatch.setattr(main, "compress", lambda body, encoding: threads.setdefault("compress", threading.get_ident())
+                        and real_compress(body, encoding))
+    monkeypatch.setattr(main, "COMPRESS_OFFLOAD_MIN_BYTES", main.COMPRESS_MIN_BYTES)
+
+    async def respond():
+        threads["loop"] = threading.get_ident()
+        return await main.json_response({"values": list(range(5000))}, "/test", "gzip")
+
+    response = asyncio.run(respond())
+    assert response.headers["content-encoding"] == "gzip"
+    assert json.loads(gzip.decompress(response.body))["values"][-1] == 4999
+    assert threads["dumps"] != threads["loop"] and threads["compress"] != threads["loop"]
+
+
+def test_auth_routes_register_login_and_use_tokens(monkeypatch):
+    """The auth router is mounted on the app; a login token authenticates later calls without bcrypt."""
+    from fastapi.testclient import TestClient
+    import main
+    from auth_store import MemoryUserStore, PasswordHasher, SessionTokens
+    from routes import auth
+
+    store = MemoryUserStore()
+    monkeypatch.setattr(auth, "user_store", store)
+    monkeypatch.setattr(auth, "password_hasher", PasswordHasher(rounds=4))
+    monkeypatch.setattr(auth, "session_tokens", SessionTokens(store))
+    client = TestClient(main.app)
+    credentials = {"username": "ana", "password": "s3cret"}
+    assert client.post("/register", json=credentials).status_code == 200
+    assert client.post("/register", json=credentials).status_code == 400
+    assert client.post("/login", json={**credentials, "password": "nope"}).status_code == 400
+
+    token = client.post("/login", json=credentials).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    assert client.get("/me", headers=headers).json() == {"username": "ana"}
+    assert client.get("/me").status_code == 401
+    assert client.post("/logout", headers=headers).status_code == 200
+    assert client.get("/me", headers=headers).status_code == 401
+
+
+def test_importing_main_defers_heavy_dependencies():
+    """Plotly, scikit-learn, xgboost and the model wait for first use or the startup hook."""
+    import os
+    import subprocess
+    import sys
+
+    code = ("import sys, main; heavy = [m for m in ('plotly', 'sklearn', 'xgboost', 'httpx') if m in sys.modules]; "
+            "print(heavy, main.model)")
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True,
+                         cwd=os.path.dirname(os.path.abspath(__file__))).stdout
+    assert out.strip().splitlines()[-1] == "[] None"
+
+
+def test_health_and_readiness_endpoints(monkeypatch, thread_pool):
+    """/healthz answers while loading; /readyz waits for the artifacts, a usable model and the workers."""
+    from fastapi.testclient import TestClient
+    import main
+    from workers import AnalysisWorkerPool
+
+    client = TestClient(main.app)
+    health = client.get("/healthz").json()
+    assert health["status"] == "ok" and health["import_seconds"] > 0
+
+    monkeypatch.setattr(main, "artifacts_loaded", False)
+    assert client.get("/readyz").status_code == 503
+    monkeypatch.setattr(main, "artifacts_loaded", True)
+    monkeypatch.setattr(main, "model", None)
+    monkeypatch.setattr(main, "model_load_error", "missing file")
+    not_ready = client.get("/readyz")
+    assert not_ready.status_code == 503 and not_ready.json()["model_error"] == "missing file"
+    monkeypatch.setattr(main, "READY_WITHOUT_MODEL", True)
+    # Worker processes that have not been started yet keep the instance out of rotation
+    monkeypatch.setattr(main, "analysis_pool", AnalysisWorkerPool(max_workers=1, max_pending=1))
+    cold = client.get("/readyz")
+    assert cold.status_code == 503 and cold.json()["workers_ready"] is False
+    monkeypatch.setattr(main, "analysis_pool", thread_pool)
+    assert client.get("/readyz").json()["ready"] is True
@@ -0,0 +1,37 @@
+from metrics import MetricsRegistry, current_trace, end_trace, start_trace, trace_stage, record_stages
+
+
+def test_histogram_renders_cumulative_buckets():
+    registry = MetricsRegistry()
+    hist = registry.histogram("demo_seconds", "Demo.", ("stage",), buckets=(0.1, 1))
+    hist.observe(0.05, stage="parse")
+    hist.observe(0.5, stage="parse")
+    hist.observe(5, stage="parse")
+    text = registry.render()
+    assert '# TYPE demo_seconds histogram' in text
+    assert 'demo_seconds_bucket{stage="parse",le="0.1"} 1' in text
+    assert 'demo_seconds_bucket{stage="parse",le="1"} 2' in text
+    assert 'demo_seconds_bucket{stage="parse",le="+Inf"} 3' in text
+    assert 'demo_seconds_count{stage="parse"} 3' in text
+    assert hist.snapshot(stage="parse") == (3, 5.55)
+
+
+def test_counter_escapes_label_values():
+    registry = MetricsRegistry()
+    registry.counter("demo_total", "Demo.", ("handler",)).inc(handler='a"b')
+    assert 'demo_total{handler="a\\"b"} 1' in registry.render()
+
+
+def test_trace_collects_stages_for_the_current_request_only():
+    trace, token = start_trace()
+    try:
+        with trace_stage("parse"):
+            pass
+        record_stages({"predict": 2.5})
+        assert current_trace() is trace
+    finally:
+        end_trace(token)
+    assert current_trace() is None
+    assert set(trace.stages) == {"parse", "predict"}
+    header = trace.server_timing()
+    assert header.startswith("parse;dur=") and "predict;dur=2.500" in header and "total;dur=" in header
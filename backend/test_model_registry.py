@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+import pytest
+import xgboost as xgb
+
+from model_registry import load_model, resolve_model_path
+
+
+@pytest.fixture(scope="module")
+def bundled_model():
+    return load_model()
+
+
+def test_model_path_resolves_relative_to_module(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    assert resolve_model_path().endswith("backend/moneypulse_model_v2.joblib")
+    assert resolve_model_path("/abs/model.json") == "/abs/model.json"
+
+
+def test_bundled_pipeline_pins_training_feature_order(bundled_model):
+    assert bundled_model.raw_input
+    assert bundled_model.feature_names[:3] == ("Age", "Gender", "Income_Level")
+    assert bundled_model.warmup_ms is not None
+    assert bundled_model.stats()["load_seconds"] > 0
+
+
+def test_batched_inference_matches_pipeline_predict(bundled_model):
+    import joblib
+
+    pipeline = joblib.load(resolve_model_path())
+    rng = np.random.default_rng(1)
+    frame = pd.DataFrame({col: [bundled_model.feature_defaults.get(col, 0)] * 25
+                          for col in bundled_model.feature_names})
+    frame["Age"] = rng.integers(18, 70, 25)
+    frame["Gender"] = rng.choice(["Male", "Female"], 25)
+    expected = pipeline.predict(frame)
+    batched = bundled_model.predict(frame.sample(frac=1, axis=1, random_state=0), batch_size=7)
+    np.testing.assert_allclose(batched, expected, rtol=1e-6)
+    assert bundled_model.stats()["batches"] >= 4
+
+
+def test_native_booster_file(tmp_path):
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(64, 2)).astype(np.float32)
+    booster = xgb.train({"max_depth": 2}, xgb.DMatrix(X, label=X[:, 0], feature_names=["b", "a"]),
+                        num_boost_round=3)
+    path = tmp_path / "model.json"
+    booster.save_model(path)
+
+    registered = load_model(str(path))
+    assert registered.feature_names == ("b", "a")
+    assert not registered.raw_input
+    frame = pd.DataFrame({"a": X[:, 1], "b": X[:, 0], "extra": 1})
+    np.testing.assert_allclose(registered.predict(frame, batch_size=10),
+                               booster.inplace_predict(X), rtol=1e-6)
@@ -0,0 +1,43 @@
+import io
+
+import numpy as np
+import pyarrow.ipc as pa_ipc
+
+from predictions import PredictionSketch, encode_predictions, summarize_predictions
+
+
+def test_summary_reports_moments_quantiles_and_classes():
+    values = [0.0, 1.0, 1.0, 1.0, float("nan")]
+    summary = summarize_predictions(values)
+    assert summary["count"] == 5 and summary["missing"] == 1
+    assert summary["mean"] == 0.75 and summary["quantiles"]["p50"] == 1.0
+    assert summary["class_counts"] == {"0": 1, "1": 3}
+    assert "class_counts" not in summarize_predictions(np.linspace(0, 1, 100))
+    assert summarize_predictions("No prediction available") == {"count": 0}
+
+
+def test_sketch_matches_the_summary_of_all_batches():
+    rng = np.random.default_rng(5)
+    first, second = rng.integers(0, 3, 400).astype(float), rng.integers(1, 4, 300).astype(float)
+    second[:10] = np.nan
+    sketch = PredictionSketch().update(first).update(second)
+    expected = summarize_predictions(np.concatenate([first, second]))
+    summary = sketch.summary()
+    assert summary["count"] == expected["count"] and summary["missing"] == expected["missing"]
+    assert np.isclose(summary["mean"], expected["mean"]) and np.isclose(summary["std"], expected["std"])
+    assert summary["class_counts"] == expected["class_counts"]
+    assert summary["quantiles"]["p50"] == expected["quantiles"]["p50"]
+
+    merged = PredictionSketch().update(first).merge(PredictionSketch().update(second))
+    assert merged.summary()["class_counts"] == expected["class_counts"]
+    assert "class_counts" not in PredictionSketch().update(np.linspace(0, 1, 100)).summary()
+    assert PredictionSketch().update("No prediction available").summary() == {"count": 0}
+
+
+def test_binary_encodings_round_trip():
+    values = np.array([0.25, 1.0, 3.5])
+    body, media_type = encode_predictions(values, "npy")
+    assert media_type == "application/x-npy"
+    np.testing.assert_array_equal(np.load(io.BytesIO(body)), values)
+    body, _ = encode_predictions(values, "arrow")
+    assert pa_ipc.open_stream(body).read_all().column("prediction").to_pylist() == values.tolist()
@@ -0,0 +1,53 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from preprocessing import ARTIFACT_VERSION, PreprocessingArtifact, load_preprocessing_artifact
+
+
+@pytest.fixture
+def reference():
+    return pd.DataFrame({
+        'amount': [10.0, np.nan, 30.0, 50.0],
+        'region': ['north', None, 'south', 'north'],
+    })
+
+
+def test_transform_uses_fitted_statistics_not_the_batch(reference):
+    artifact = PreprocessingArtifact.fit(reference)
+    assert artifact.vocabularies['region'] == ['Unknown', 'north', 'south']
+
+    fitted = artifact.transform(reference)
+    assert fitted['amount'].mean() == pytest.approx(0.0)
+    assert fitted['amount'].std(ddof=0) == pytest.approx(1.0)
+
+    # A later upload is scaled by the reference statistics, not its own
+    batch = pd.DataFrame({'amount': [30.0, 30.0], 'region': ['south', 'east']})
+    out = artifact.transform(batch)
+    expected = (30.0 - artifact.means[0]) / artifact.scales[0]
+    assert out['amount'].tolist() == pytest.approx([expected, expected])
+    assert out['region'].tolist() == [2, artifact.unknown_code('region')]
+
+
+def test_transform_leaves_input_untouched_and_fills_absent_columns(reference):
+    artifact = PreprocessingArtifact.fit(reference)
+    batch = pd.DataFrame({'region': ['north', None], 'extra': [1, 2]})
+    before = batch.copy()
+    out = artifact.transform(batch)
+    pd.testing.assert_frame_equal(batch, before)
+    assert list(out.columns) == ['region', 'amount']
+    assert out['region'].tolist() == [1, 0]
+    assert out['amount'].tolist() == pytest.approx([(30.0 - artifact.means[0]) / artifact.scales[0]] * 2)
+
+
+def test_artifact_round_trips_and_checks_version(reference, tmp_path):
+    path = tmp_path / 'artifact.json'
+    PreprocessingArtifact.fit(reference).save(str(path))
+    loaded = load_preprocessing_artifact(str(path))
+    pd.testing.assert_frame_equal(loaded.transform(reference), PreprocessingArtifact.fit(reference).transform(reference))
+    assert load_preprocessing_artifact(str(tmp_path / 'missing.json')) is None
+
+    stale = loaded.to_dict()
+    stale['version'] = ARTIFACT_VERSION + 1
+    with pytest.raises(ValueError):
+        PreprocessingArtifact.from_dict(stale)
@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from profiler import profile_dataframe
+
+
+@pytest.fixture
+def mixed_df():
+    rng = np.random.default_rng(3)
+    df = pd.DataFrame({
+        'amount':  rng.normal(100, 20, 500),
+        'visits':  rng.integers(0, 8, 500),
+        'segment': rng.choice(['retail', 'online', None], 500),
+        'empty':   np.full(500, np.nan),
+    })
+    df.loc[::9, 'amount'] = np.nan
+    return df
+
+
+def test_numeric_profile_matches_pandas(mixed_df):
+    profile = profile_dataframe(mixed_df)
+    assert profile.numeric_cols == ['amount', 'visits', 'empty']
+    for col in ('amount', 'visits'):
+        column, series = profile[col], mixed_df[col]
+        assert column.count == series.count()
+        assert column.null_count == series.isna().sum()
+        assert column.nunique == series.nunique()
+        assert column.mean == pytest.approx(series.mean())
+        assert column.median == pytest.approx(series.median())
+        assert column.std == pytest.approx(series.std())
+        assert column.minimum == series.min() and column.maximum == series.max()
+
+
+def test_histogram_matches_numpy(mixed_df):
+    column = profile_dataframe(mixed_df)['amount']
+    counts, edges = np.histogram(mixed_df['amount'].dropna(), bins=30)
+    np.testing.assert_allclose(column.bin_edges, edges)
+    np.testing.assert_array_equal(column.bin_counts, counts)
+
+
+def test_categorical_and_all_null_columns(mixed_df):
+    profile = profile_dataframe(mixed_df)
+    segment = profile['segment']
+    assert segment.kind == 'categorical'
+    assert segment.top_values().to_dict() == mixed_df['segment'].value_counts().to_dict()
+    assert segment.null_count == mixed_df['segment'].isna().sum()
+    empty = profile['empty']
+    assert empty.count == 0 and empty.nunique == 0
+    assert np.isnan(empty.mean) and empty.bin_counts is None
+
+
+def test_high_cardinality_columns_keep_only_top_values():
+    ids = pd.Series([f"id{i}" for i in range(1000)] + ["common"] * 50, name="customer")
+    column = profile_dataframe(ids.to_frame(), top_values=10)['customer']
+    assert column.nunique == 1001 and len(column.top_values()) == 10
+    assert column.top_values().index[0] == "common" and column.other_count == 1050 - 50 - 9
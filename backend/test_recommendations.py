@@ -0,0 +1,38 @@
+import os
+import subprocess
+import sys
+
+from recommendations import RULES, RuleEngine
+from sampling import Estimate
+
+
+def test_first_matching_rule_and_thresholds_apply():
+    engine = RuleEngine()
+    recs = engine.recommend({'price_count': 10.0, 'rating': 4.0, 'score': float('nan'), 'age': 30.0},
+                            {'region': 11, 'segment': 10, 'name': 3})
+    revenue, _, rating, segment = RULES
+    assert recs['price_count'] in [t.format(col='price_count', mean=10.0) for t in revenue.below]
+    assert recs['rating'] in [t.format(col='rating', mean=4.0) for t in rating.above]
+    assert recs['region'] in [t.format(col='region') for t in segment.above]
+    assert recs['segment'] in [t.format(col='segment') for t in segment.below]
+    assert list(recs) == ['price_count', 'rating', 'region', 'segment']
+
+
+def test_classification_is_cached_per_schema_and_keeps_intervals():
+    engine = RuleEngine()
+    engine.recommend({'Amount': 10.0}, {})
+    recs = engine.recommend({'Amount': Estimate(12.0, 0.5)}, {})
+    assert engine.classify.cache_info().hits == 1
+    assert '12.00 ± 0.50' in recs['Amount']
+
+
+def test_variants_do_not_depend_on_the_hash_seed():
+    code = ("from recommendations import rule_engine; "
+            "print(sorted(rule_engine.recommend({f'price_{i}': 10.0 for i in range(50)}, {}).items()))")
+    outputs = {
+        subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True,
+                       cwd=os.path.dirname(os.path.abspath(__file__)),
+                       env={**os.environ, "PYTHONHASHSEED": seed}).stdout
+        for seed in ("1", "2")
+    }
+    assert len(outputs) == 1
@@ -0,0 +1,159 @@
+import asyncio
+import os
+import stat
+import sys
+import time
+
+import pytest
+
+from report_jobs import ReportJob, ReportJobQueue, WkhtmltopdfRenderer
+from workers import WorkerPoolFull
+
+
+def fake_renderer(tmp_path):
+    """Stands in for wkhtmltopdf: copies stdin to the output path behind a PDF header."""
+    script = tmp_path / "fake-wkhtmltopdf"
+    script.write_text(
+        f"#!{sys.executable}\n"
+        "import sys\n"
+        "html = sys.stdin.read()\n"
+        "open(sys.argv[-1], 'w').write('%PDF-1.4\\n' + html)\n"
+    )
+    script.chmod(script.stat().st_mode | stat.S_IEXEC)
+    return WkhtmltopdfRenderer(binary=str(script))
+
+
+def test_job_runs_to_done_and_result_is_stored(tmp_path):
+    queue = ReportJobQueue(result_dir=str(tmp_path / "results"), renderer=fake_renderer(tmp_path))
+
+    async def produce():
+        return "<html>report</html>", "Acme_Report.pdf"
+
+    async def scenario():
+        job = queue.submit(produce)
+        assert queue.get(job.job_id).status in ("queued", "analyzing")
+        return await queue.wait(job.job_id)
+
+    job = asyncio.run(scenario())
+    assert job.status == "done" and job.progress == 100
+    assert job.download_name == "Acme_Report.pdf"
+    with open(queue.result_path(job.job_id)) as handle:
+        assert handle.read() == "%PDF-1.4\n<html>report</html>"
+
+
+def test_failed_jobs_record_the_error(tmp_path):
+    queue = ReportJobQueue(result_dir=str(tmp_path),
+                           renderer=WkhtmltopdfRenderer(binary=str(tmp_path / "missing-binary")))
+
+    async def produce():
+        return "<html></html>", "x.pdf"
+
+    async def scenario():
+        return await queue.wait(queue.submit(produce).job_id)
+
+    job = asyncio.run(scenario())
+    assert job.status == "failed"
+    assert "PDF renderer not found" in job.error
+    assert not os.path.exists(queue.result_path(job.job_id))
+
+
+def test_renderers_are_bounded(tmp_path):
+    queue = ReportJobQueue(result_dir=str(tmp_path), max_renderers=2)
+    active, peak = 0, 0
+
+    class SlowRenderer:
+        binary = "slow"
+
+        async def render(self, html_content, output_path):
+            nonlocal active, peak
+            active += 1
+            peak = max(peak, active)
+            await asyncio.sleep(0.01)
+            active -= 1
+            open(output_path, "w").write("%PDF")
+
+    queue.renderer = SlowRenderer()
+
+    async def produce():
+        return "<html></html>", "x.pdf"
+
+    async def scenario():
+        jobs = [queue.submit(produce) for _ in range(6)]
+        return [await queue.wait(job.job_id) for job in jobs]
+
+    assert all(job.status == "done" for job in asyncio.run(scenario()))
+    assert peak == 2
+
+
+def test_finished_jobs_expire(tmp_path):
+    queue = ReportJobQueue(result_dir=str(tmp_path), ttl_seconds=60, renderer=fake_renderer(tmp_path))
+
+    async def produce():
+        return "<html></html>", "x.pdf"
+
+    async def scenario():
+        return await queue.wait(queue.submit(produce).job_id)
+
+    job = asyncio.run(scenario())
+    job.finished_at = time.time() - 120
+    queue._save(job)
+    assert queue.purge_expired() == 1
+    assert queue.get(job.job_id) is None
+    assert not os.path.exists(queue.result_path(job.job_id))
+    assert queue.get("../etc/passwd") is None
+
+
+def test_unfinished_jobs_expire_after_max_age(tmp_path):
+    queue = ReportJobQueue(result_dir=str(tmp_path), max_age_seconds=60)
+    stuck = ReportJob("0f8fad5b-d9cb-469f-a165-70867728950e", status="rendering", progress=60,
+                      created_at=time.time() - 120)
+    queue._save(stuck)
+    fresh = ReportJob("7c9e6679-7425-40de-944b-e07fc1f90ae7", status="analyzing")
+    queue._save(fresh)
+
+    assert queue.purge_expired() == 1
+    assert queue.get(stuck.job_id) is None
+    assert queue.get(fresh.job_id).status == "analyzing"
+
+
+def test_submit_rejects_jobs_beyond_max_pending(tmp_path):
+    queue = ReportJobQueue(result_dir=str(tmp_path), renderer=fake_renderer(tmp_path), max_pending=1,
+                           retry_after=9)
+
+    async def scenario():
+        release = asyncio.Event()
+
+        async def produce():
+            await release.wait()
+            return "<html></html>", "x.pdf"
+
+        job = queue.submit(produce)
+        with pytest.raises(WorkerPoolFull) as excinfo:
+            queue.submit(produce)
+        release.set()
+        await queue.wait(job.job_id)
+        return excinfo.value
+
+    assert asyncio.run(scenario()).retry_after == 9
+    assert queue.stats()["rejected"] == 1
+
+
+def test_expired_jobs_are_purged_on_a_timer(tmp_path):
+    queue = ReportJobQueue(result_dir=str(tmp_path), ttl_seconds=60, purge_interval=0.01,
+                           renderer=fake_renderer(tmp_path))
+
+    async def produce():
+        return "<html></html>", "x.pdf"
+
+    async def scenario():
+        job = await queue.wait(queue.submit(produce).job_id)
+        job.finished_at = time.time() - 120
+        queue._save(job)
+        purger = asyncio.create_task(queue.purge_periodically())
+        await asyncio.sleep(0.1)
+        purger.cancel()
+        return job
+
+    job = asyncio.run(scenario())
+    assert not os.path.exists(queue.result_path(job.job_id))
+    assert os.listdir(tmp_path) == ["fake-wkhtmltopdf"]
@@ -0,0 +1,62 @@
+import math
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from profiler import profile_dataframe
+from sampling import Estimate, SamplingError, sample_frame, scale_profile
+
+
+def _population(rows=200_000, seed=4):
+    rng = np.random.default_rng(seed)
+    region = rng.choice(['N', 'S', 'E'], size=rows, p=[0.7, 0.2, 0.1])
+    offset = pd.Series(region).map({'N': 0.0, 'S': 50.0, 'E': 200.0}).to_numpy()
+    return pd.DataFrame({'amount': rng.normal(100, 20, rows) + offset, 'region': region})
+
+
+def test_estimate_behaves_like_a_float_but_prints_its_interval():
+    estimate = Estimate(41.2, 0.349)
+    assert estimate < 50 and estimate + 1 == 42.2
+    assert f"{estimate:.2f}" == "41.20 ± 0.35"
+    assert f"{Estimate(3.0, float('nan')):.1f}" == "3.0"
+
+
+def test_uniform_sample_intervals_have_their_stated_coverage():
+    df = _population(rows=50_000)
+    sample, info = sample_frame(df, ['amount'], sample_rows=2000, seed=0)
+    assert len(sample) == info.sample_rows == 2000 and info.method == "uniform"
+    assert sample.index.is_monotonic_increasing
+    true_mean = df['amount'].mean()
+    covered = 0
+    for seed in range(200):
+        low, high = sample_frame(df, ['amount'], sample_rows=2000, seed=seed)[1].estimates['amount'].interval()
+        covered += low <= true_mean <= high
+    assert 0.89 <= covered / 200 <= 0.99
+
+
+def test_stratified_sample_keeps_stratum_shares_and_tightens_the_interval():
+    df = _population()
+    uniform = sample_frame(df, ['amount'], sample_rows=3000, seed=2)[1].estimates['amount']
+    sample, info = sample_frame(df, ['amount'], sample_rows=3000, strata='region', seed=2)
+    shares = sample['region'].value_counts(normalize=True)
+    assert abs(shares['E'] - 0.1) < 0.01
+    estimate = info.estimates['amount']
+    low, high = estimate.interval()
+    assert low <= df['amount'].mean() <= high
+    assert estimate.half_width < uniform.half_width
+
+
+def test_unknown_strata_column_is_rejected():
+    with pytest.raises(SamplingError, match="'nope'"):
+        sample_frame(_population(), ['amount'], sample_rows=100, strata='nope')
+
+
+def test_scaled_profile_counts_estimate_the_population():
+    df = _population()
+    sample, info = sample_frame(df, ['amount'], sample_rows=20_000, seed=3)
+    profile = scale_profile(profile_dataframe(sample), info.scale)
+    assert profile.n_rows == len(df)
+    assert abs(profile['amount'].bin_counts.sum() - len(df)) < 100
+    assert abs(profile['region'].value_counts['N'] - (df['region'] == 'N').sum()) < 0.02 * len(df)
+    assert math.isclose(profile['amount'].scale, 10.0)
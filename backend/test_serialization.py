@@ -0,0 +1,28 @@
+import gzip
+import json
+
+import numpy as np
+import pytest
+
+import serialization
+from serialization import RawJSON, compress, dumps, negotiate_encoding
+
+
+def test_raw_json_is_spliced_not_reencoded():
+    figure = '{"data": [{"x": [1, 2]}], "layout": {"title": {"text": "a \\"quoted\\" title"}}}'
+    body = dumps({"charts": {"price": RawJSON(figure), "note": "__raw_0"}, "values": np.array([1.5, np.nan])})
+    decoded = json.loads(body)
+    assert decoded["charts"]["price"] == json.loads(figure)
+    assert decoded["charts"]["note"] == "__raw_0"
+    assert decoded["values"] == [1.5, None]
+
+
+def test_encoding_negotiation_honours_quality(monkeypatch):
+    monkeypatch.setattr(serialization, "zstandard", None)
+    assert negotiate_encoding("gzip, deflate, br") == "gzip"
+    assert negotiate_encoding("gzip;q=0, *;q=0.5") is None
+    assert negotiate_encoding("identity") is None
+    assert negotiate_encoding(None) is None
+    assert gzip.decompress(compress(b"{}" * 100, "gzip")) == b"{}" * 100
+    with pytest.raises(ValueError):
+        compress(b"{}", "br")
@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+
+from sessions import DatasetSession, DatasetSessionStore
+
+
+def test_appends_match_statistics_of_the_combined_frame():
+    rng = np.random.default_rng(3)
+    base = pd.DataFrame({'amount': rng.normal(50, 10, 5000), 'region': rng.choice(['N', 'S', 'E'], 5000)})
+    delta = pd.DataFrame({'amount': rng.normal(80, 10, 500), 'region': rng.choice(['N', 'W'], 500),
+                          'rating': rng.integers(1, 6, 500).astype(float)})
+    session = DatasetSession().append(base).append(delta)
+    combined = pd.concat([base, delta], ignore_index=True)
+
+    assert session.total_rows == len(combined) and session.uploads == 2
+    assert np.isclose(session.numeric_means()['amount'], combined['amount'].mean())
+    assert session.categorical_nunique() == {'region': 4}
+    rating = session.columns['rating']
+    assert rating.null_count == len(base) and np.isclose(rating.mean, delta['rating'].mean())
+    assert abs(session.columns['amount'].median - combined['amount'].median()) < 1.0
+    edges, counts = session.columns['amount'].histogram()
+    assert len(edges) == 31 and abs(counts.sum() - len(combined)) <= 30
+
+
+def test_text_turns_a_numeric_column_categorical():
+    session = DatasetSession().append(pd.DataFrame({'code': [1, 2]})).append(pd.DataFrame({'code': ['x', 'y']}))
+    assert session.categorical_cols == ['code']
+    assert np.isnan(session.columns['code'].mean)
+
+
+def test_store_expires_idle_sessions():
+    store = DatasetSessionStore(max_entries=2, ttl_seconds=60)
+    first, second, third = store.create(), store.create(), store.create()
+    assert store.get(first.session_id) is None  # evicted
+    third.updated_at -= 120
+    assert store.get(third.session_id) is None
+    assert store.get(second.session_id) is second
+    assert store.delete(second.session_id) and not store.delete(second.session_id)
+
+
+def test_predictions_are_summarised_and_paged_from_disk(tmp_path):
+    session = DatasetSession(prediction_dir=str(tmp_path))
+    frame = pd.DataFrame({'amount': [1.0, 2.0, 3.0]})
+    session.append(frame, [0.0, 1.0, 1.0]).append(frame, np.array([2.0, 2.0, 2.0]))
+
+    assert session.predictions.summary()["class_counts"] == {"0": 1, "1": 2, "2": 3}
+    assert session.prediction_rows.count == 6
+    np.testing.assert_array_equal(session.prediction_rows.read(2, 3), [1.0, 2.0, 2.0])
+    assert len(session.prediction_rows.read(5, 10)) == 1
+    session.close()
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,65 @@
+import numpy as np
+import pandas as pd
+
+from sketches import HyperLogLog, Moments, QuantileSketch, TopK
+
+
+def test_moments_merge_matches_numpy():
+    rng = np.random.default_rng(1)
+    values = rng.normal(1e6, 3.0, size=10_000)
+    merged = Moments()
+    for part in np.array_split(values, 7):
+        piece = Moments()
+        piece.update(part)
+        merged.merge(piece)
+    assert merged.count == len(values)
+    assert np.isclose(merged.mean, values.mean())
+    assert np.isclose(merged.std, values.std(ddof=1), rtol=1e-9)
+    assert merged.minimum == values.min() and merged.maximum == values.max()
+
+
+def test_hyperloglog_estimates_and_merges():
+    left, right = HyperLogLog(), HyperLogLog()
+    left.update(pd.Series([f"user-{i}" for i in range(60_000)]))
+    right.update(pd.Series([f"user-{i}" for i in range(40_000, 100_000)]))
+    assert abs(left.merge(right).estimate() - 100_000) / 100_000 < 0.05
+    small = HyperLogLog()
+    small.update(pd.Series(["a", "b", "c", "a"]))
+    assert small.estimate() == 3
+
+
+def test_quantile_sketch_is_exact_when_small_and_close_when_large():
+    small = QuantileSketch(k=200)
+    small.update([5.0, 1.0, np.nan, 3.0, 2.0])
+    assert small.quantile(0.5) == 2.5
+
+    rng = np.random.default_rng(2)
+    values = rng.lognormal(3, 1, size=200_000)
+    sketch = QuantileSketch(k=200)
+    for part in np.array_split(values, 20):
+        sketch.update(part)
+    assert sketch.count == len(values)
+    assert sum(len(level) for level in sketch.levels) < 2_000
+    for q in (0.1, 0.5, 0.9):
+        rank = (values < sketch.quantile(q)).mean()
+        assert abs(rank - q) < 0.02
+    edges = np.linspace(values.min(), values.max(), 31)
+    counts = sketch.histogram(edges)
+    exact, _ = np.histogram(values, bins=edges)
+    assert abs(counts.sum() - len(values)) <= 30
+    assert np.abs(counts - exact).max() < 0.02 * len(values)
+
+
+def test_topk_is_exact_within_capacity_and_bounded_beyond():
+    top = TopK(capacity=3)
+    top.update(pd.Series(["a", "b", "a", None, "c"]))
+    assert top.exact and top.top().to_dict() == {"a": 2, "b": 1, "c": 1}
+
+    stream = pd.Series(["hot"] * 500 + [f"cold-{i}" for i in range(1000)])
+    bounded = TopK(capacity=10)
+    shuffled = stream.sample(frac=1, random_state=0)
+    for start in range(0, len(shuffled), 300):
+        bounded.update(shuffled.iloc[start:start + 300])
+    assert not bounded.exact
+    assert bounded.top().index[0] == "hot"
+    assert 500 - bounded.error <= bounded.top().iloc[0] <= 500
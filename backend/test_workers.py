@@ -0,0 +1,101 @@
+import asyncio
+import os
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+from workers import AnalysisWorkerPool, StageTimer, WorkerPoolFull
+
+
+def test_stage_timer_accumulates_named_stages():
+    timer = StageTimer()
+    with timer.stage('parse'):
+        pass
+    with timer.stage('parse'):
+        pass
+    assert set(timer.timings) == {'parse'}
+    assert timer.timings['parse'] >= 0
+
+
+def test_pool_runs_jobs_in_worker_processes():
+    pool = AnalysisWorkerPool(max_workers=1, max_pending=1)
+    try:
+        assert asyncio.run(pool.run(pow, 2, 10)) == 1024
+    finally:
+        pool.shutdown()
+    assert pool.stats()['completed'] == 1
+
+
+INITIALISED_IN = None
+
+
+def mark_initialised():
+    global INITIALISED_IN
+    INITIALISED_IN = os.getpid()
+
+
+def initialised_in():
+    return INITIALISED_IN
+
+
+def test_pool_start_spawns_workers_and_runs_initializer():
+    pool = AnalysisWorkerPool(max_workers=1, max_pending=1, initializer=mark_initialised)
+    assert not pool.ready
+
+    async def scenario():
+        await pool.start()
+        return await pool.run(initialised_in)
+
+    try:
+        pid = asyncio.run(scenario())
+    finally:
+        pool.shutdown()
+    assert pid is not None and pid != os.getpid()
+    assert pool.stats()['ready'] is False  # shut down again
+
+
+def crash():
+    os._exit(1)
+
+
+def test_pool_replaces_an_executor_broken_by_a_dead_worker():
+    pool = AnalysisWorkerPool(max_workers=1, max_pending=1)
+
+    async def scenario():
+        await pool.start()
+        with pytest.raises(BrokenProcessPool):
+            await pool.run(crash)
+        assert not pool.ready
+        await pool._restart_task
+        assert pool.ready
+        return await pool.run(pow, 2, 3)
+
+    try:
+        assert asyncio.run(scenario()) == 8
+    finally:
+        pool.shutdown()
+    assert pool.stats()['restarts'] == 1
+
+
+def test_pool_rejects_work_beyond_queue_depth():
+    pool = AnalysisWorkerPool(max_workers=0, max_pending=1, retry_after=3)
+
+    async def scenario():
+        release = asyncio.Event()
+
+        async def hold():
+            with pool.slot():
+                await release.wait()
+
+        holders = [asyncio.create_task(hold()) for _ in range(pool.capacity)]
+        await asyncio.sleep(0)
+        with pytest.raises(WorkerPoolFull) as excinfo:
+            await pool.run(pow, 2, 2)
+        release.set()
+        await asyncio.gather(*holders)
+        return excinfo.value
+
+    error = asyncio.run(scenario())
+    assert error.retry_after == 3
+    assert pool.stats()['rejected'] == 1
+    assert asyncio.run(pool.run(pow, 2, 2)) == 4
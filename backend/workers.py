@@ -0,0 +1,173 @@
+# workers.py
+import asyncio
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+
+from starlette.concurrency import run_in_threadpool
+
+
+class WorkerPoolFull(Exception):
+    """Raised when the analysis tier already has as much work as it will queue."""
+
+    def __init__(self, retry_after):
+        super().__init__(f"Analysis workers are busy; retry in {retry_after}s")
+        self.retry_after = retry_after
+
+
+class StageTimer:
+    """Collects wall-clock milliseconds per named pipeline stage."""
+
+    def __init__(self):
+        self.timings = {}
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            self.timings[name] = round(self.timings.get(name, 0.0) + elapsed_ms, 3)
+
+
+def worker_pid():
+    """No-op job used to make the executor spawn its processes."""
+    return os.getpid()
+
+
+class AnalysisWorkerPool:
+    """
+    Process pool for CPU-bound analysis with bounded queue depth.
+
+    At most ``max_workers`` jobs run at once and ``max_pending`` more may wait;
+    further submissions raise ``WorkerPoolFull`` immediately instead of piling up.
+    With ``max_workers=0`` jobs run in the server's thread pool, which keeps the
+    event loop free without forking (handy for tests and single-core boxes).
+
+    ``initializer`` (a picklable top-level function) runs once in every worker
+    process as it starts; ``start()`` spawns the processes up front so that
+    happens before the first job rather than during it.
+    """
+
+    def __init__(self, max_workers, max_pending, retry_after=5, start_method="spawn", initializer=None):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.retry_after = retry_after
+        self.start_method = start_method
+        self.initializer = initializer
+        self.ready = max_workers == 0  # the thread pool has nothing to start
+        self._executor = None
+        self._restart_task = None
+        self._lock = threading.Lock()
+        self._active = 0
+        self.completed = 0
+        self.rejected = 0
+        self.restarts = 0
+
+    @property
+    def capacity(self):
+        return max(self.max_workers, 1) + self.max_pending
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context(self.start_method),
+                    initializer=self.initializer,
+                )
+            return self._executor
+
+    async def start(self):
+        """
+        Spawn every worker process now. Each runs ``initializer`` before it
+        takes a job, so once one no-op job per worker has come back the pool
+        is marked ready.
+        """
+        if self.max_workers > 0:
+            loop = asyncio.get_running_loop()
+            executor = self._get_executor()
+            await asyncio.gather(*(loop.run_in_executor(executor, worker_pid) for _ in range(self.max_workers)))
+        self.ready = True
+
+    @contextmanager
+    def slot(self):
+        with self._lock:
+            if self._active >= self.capacity:
+                self.rejected += 1
+                raise WorkerPoolFull(self.retry_after)
+            self._active += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._active -= 1
+                self.completed += 1
+
+    def _discard(self, executor):
+        """Forget a broken executor so the next job builds a fresh one; False if another job already did."""
+        with self._lock:
+            if self._executor is not executor:
+                return False
+            self._executor = None
+            self.ready = False
+            self.restarts += 1
+        executor.shutdown(wait=False, cancel_futures=True)
+        return True
+
+    async def _restart(self):
+        try:
+            await self.start()
+        except Exception as e:
+            print("Analysis workers failed to restart:", e)
+
+    async def run(self, fn, *args):
+        """
+        Run a picklable top-level function in a worker process.
+
+        A worker that dies (e.g. OOM-killed) breaks the whole executor; the job
+        then raises ``BrokenProcessPool``, the executor is dropped and a fresh
+        one is started in the background, with ``ready`` false until it is up.
+        """
+        with self.slot():
+            if self.max_workers == 0:
+                return await run_in_threadpool(fn, *args)
+            loop = asyncio.get_running_loop()
+            executor = self._get_executor()
+            try:
+                return await loop.run_in_executor(executor, fn, *args)
+            except BrokenProcessPool:
+                if self._discard(executor):
+                    print("An analysis worker died; restarting the pool")
+                    self._restart_task = loop.create_task(self._restart())
+                raise
+
+    async def run_in_thread(self, fn, *args):
+        """Admission-controlled thread offload for work that cannot cross a process boundary."""
+        with self.slot():
+            return await run_in_threadpool(fn, *args)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "max_pending": self.max_pending,
+                "active": min(self._active, max(self.max_workers, 1)),
+                "queued": max(self._active - max(self.max_workers, 1), 0),
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "restarts": self.restarts,
+                "ready": self.ready,
+            }
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+            self.ready = self.max_workers == 0
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
@@ -11,6 +11,9 @@ import "./index.css";
 
 const API_BASE_URL = process.env.REACT_APP_API_BASE_URL || "http://localhost:8000";
 
+// Figures arrive as JSON objects; older API versions sent them as JSON strings
+const chartFigure = (chart) => (typeof chart === "string" ? JSON.parse(chart) : chart);
+
 // ------------------ PredictionChart Component ------------------
 function PredictionChart({ predictions }) {
   if (
@@ -772,8 +775,8 @@ function Dashboard() {
                 <FilteredChart col={col} originalData={uploadedData} />
               ) : (
                 <Plot
-                  data={JSON.parse(chartsByColumn[col]).data}
-                  layout={JSON.parse(chartsByColumn[col]).layout}
+                  data={chartFigure(chartsByColumn[col]).data}
+                  layout={chartFigure(chartsByColumn[col]).layout}
                   config={{
                     displayModeBar: true,
                     toImageButtonOptions: {